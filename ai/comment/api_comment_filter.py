@@ -1,14 +1,167 @@
-from flask import Flask, request, jsonify
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import json
+import os
+import queue
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
 # import engine từ file cùng thư mục
 from comment_filter_engine import CommentFilterEngine
+from moderation_jobs import ModerationJobQueue, QueueFullError, JobTooLargeError
+
+# Micro-batching: gom các request 1 câu đến gần nhau rồi encode chung 1 lần
+# - COMMENT_BATCH_MAX_SIZE: số câu tối đa mỗi batch
+# - COMMENT_BATCH_WAIT_MS : thời gian chờ gom thêm câu sau câu đầu tiên (ms)
+BATCH_MAX_SIZE = int(os.getenv("COMMENT_BATCH_MAX_SIZE", "32"))
+BATCH_WAIT_MS = float(os.getenv("COMMENT_BATCH_WAIT_MS", "5"))
+REQUEST_TIMEOUT_SECONDS = 30
+BUSY_RETRY_AFTER_SECONDS = 5  # quá REQUEST_TIMEOUT_SECONDS -> 503 + Retry-After
+
+# Cache kết quả kiểm duyệt cho câu trùng / gần trùng (0 = tắt)
+CACHE_SIZE = int(os.getenv("COMMENT_CACHE_SIZE", "10000"))
+
+# Cascade: tầng nhanh (char n-gram + linear) trước transformer
+# - COMMENT_CASCADE=0 để tắt
+# - COMMENT_CASCADE_ACCEPT / COMMENT_CASCADE_REJECT: ngưỡng tự tin (mặc định theo file model)
+CASCADE = os.getenv("COMMENT_CASCADE", "1").lower() in {"1", "true", "yes"}
+CASCADE_ACCEPT = float(os.environ["COMMENT_CASCADE_ACCEPT"]) if os.getenv("COMMENT_CASCADE_ACCEPT") else None
+CASCADE_REJECT = float(os.environ["COMMENT_CASCADE_REJECT"]) if os.getenv("COMMENT_CASCADE_REJECT") else None
+
+# Ngưỡng is_toxic theo xác suất (chỉnh theo kết quả benchmark_moderation.py)
+TOXIC_THRESHOLD = float(os.getenv("COMMENT_TOXIC_THRESHOLD", "0.8"))
+SPAM_THRESHOLD = float(os.getenv("COMMENT_SPAM_THRESHOLD", "0.40"))
+
+# Spam copy-paste: cụm gần trùng từ >= COMMENT_NEAR_DUP_MIN_CLUSTER tác giả khác nhau trong
+# COMMENT_NEAR_DUP_WINDOW_SECONDS giây gần nhất -> spam, không encode (0 = tắt, mặc định).
+# Chỉ bình luận mới đăng (mode single) được ghi nhận, batch / stream / async thì không
+NEAR_DUP_WINDOW_SECONDS = float(os.getenv("COMMENT_NEAR_DUP_WINDOW_SECONDS", "0"))
+NEAR_DUP_MIN_CLUSTER = int(os.getenv("COMMENT_NEAR_DUP_MIN_CLUSTER", "3"))
+
+# Kiểm duyệt bất đồng bộ (POST /api/moderate/async -> job_id, kết quả lấy sau / callback)
+# - COMMENT_ASYNC_QUEUE_SIZE : số bình luận tối đa đang chờ, vượt -> 429 (backpressure),
+#                              1 job lớn hơn cả giá trị này -> 413
+# - COMMENT_ASYNC_WORKERS    : số worker xử lý hàng đợi
+# - COMMENT_ASYNC_BATCH_SIZE : số câu tối đa mỗi lần encode
+# - COMMENT_ASYNC_JOB_TTL_SECONDS: giữ kết quả job đã xong bao lâu
+# - COMMENT_ASYNC_MAX_FINISHED_JOBS: số job đã xong giữ lại tối đa (cũ nhất bị xoá trước)
+# - COMMENT_ASYNC_CALLBACK_HOSTS: host được nhận callback, cách nhau dấu phẩy ("backend,backend:5000");
+#                                 rỗng (mặc định) = tắt callback, mọi callback_url -> 400
+ASYNC_QUEUE_SIZE = int(os.getenv("COMMENT_ASYNC_QUEUE_SIZE", "1000"))
+ASYNC_WORKERS = int(os.getenv("COMMENT_ASYNC_WORKERS", "2"))
+ASYNC_BATCH_SIZE = int(os.getenv("COMMENT_ASYNC_BATCH_SIZE", "64"))
+ASYNC_JOB_TTL_SECONDS = float(os.getenv("COMMENT_ASYNC_JOB_TTL_SECONDS", "3600"))
+ASYNC_MAX_FINISHED_JOBS = int(os.getenv("COMMENT_ASYNC_MAX_FINISHED_JOBS", "10000"))
+ASYNC_CALLBACK_HOSTS = [h for h in os.getenv("COMMENT_ASYNC_CALLBACK_HOSTS", "").split(",") if h.strip()]
+ASYNC_RETRY_AFTER_SECONDS = 1
+
+# Streaming NDJSON: số dòng gom lại mỗi lần chấm + trả về (?chunk_size= ghi đè, tối đa STREAM_MAX_CHUNK_SIZE)
+STREAM_CHUNK_SIZE = int(os.getenv("COMMENT_STREAM_CHUNK_SIZE", "64"))
+STREAM_MAX_CHUNK_SIZE = 1024
 
 app = Flask(__name__)
 CORS(app)  # Cho phép frontend / backend khác port gọi tới
 
 # Khởi tạo engine (load model 1 lần)
-engine = CommentFilterEngine()
+engine = CommentFilterEngine(
+    cache_size=CACHE_SIZE,
+    cascade=CASCADE,
+    accept_threshold=CASCADE_ACCEPT,
+    reject_threshold=CASCADE_REJECT,
+    toxic_threshold=TOXIC_THRESHOLD,
+    spam_threshold=SPAM_THRESHOLD,
+    near_duplicate_window=NEAR_DUP_WINDOW_SECONDS,
+    near_duplicate_min_cluster=NEAR_DUP_MIN_CLUSTER,
+)
+
+
+class MicroBatcher:
+    """
+    Gom các câu được submit đồng thời (mỗi request 1 thread) thành batch:
+
+    - Thread nền lấy câu đầu tiên trong hàng đợi, chờ thêm tối đa max_wait_ms
+      hoặc tới khi đủ max_batch_size câu
+    - Gọi predict_fn 1 lần cho cả batch (1 encoder.encode + 1 predict_proba)
+    - Trả kết quả riêng cho từng request qua Future
+    """
+
+    def __init__(self, predict_fn, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_seen_batch = 0
+
+        self._worker = threading.Thread(target=self._run, name="moderation-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                results = self.predict_fn(texts)
+            except Exception as exc:  # lỗi model -> báo cho từng request
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.max_seen_batch = max(self.max_seen_batch, len(batch))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "max_batch_size_seen": self.max_seen_batch,
+                "queued": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+            }
+
+
+batcher = MicroBatcher(engine.predict_texts, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_WAIT_MS)
+
+jobs = ModerationJobQueue(
+    engine.predict_texts,
+    max_queue_size=ASYNC_QUEUE_SIZE,
+    workers=ASYNC_WORKERS,
+    batch_size=ASYNC_BATCH_SIZE,
+    job_ttl_seconds=ASYNC_JOB_TTL_SECONDS,
+    max_finished_jobs=ASYNC_MAX_FINISHED_JOBS,
+    callback_hosts=ASYNC_CALLBACK_HOSTS,
+)
 
 
 @app.post("/api/moderate")
@@ -19,6 +172,10 @@ def moderate_comment():
     Body JSON có thể là:
     - {"text": "một câu bình luận"}        -> mode: single
     - {"texts": ["cmt 1", "cmt 2", ...]}   -> mode: batch
+
+    mode single = bình luận vừa đăng: nếu bật COMMENT_NEAR_DUP_WINDOW_SECONDS thì được ghi nhận
+    vào bộ phát hiện spam copy-paste, kèm "user_id" (tác giả) / "comment_id" (tuỳ chọn)
+    để cụm chỉ tính tác giả khác nhau và gửi lại cùng bình luận không bị đếm 2 lần.
     """
     data = request.get_json(silent=True) or {}
 
@@ -40,13 +197,163 @@ def moderate_comment():
     if not text:
         return jsonify({"error": "Thiếu 'text' hoặc 'texts' trong body"}), 400
 
-    result = engine.predict_one(text)
+    user_id = data.get("user_id")
+    comment_id = data.get("comment_id")
+    result = engine.observe_new_comment(
+        text,
+        source=None if user_id is None else str(user_id),
+        comment_id=None if comment_id is None else str(comment_id),
+    )
+    if result is None:
+        # đi qua micro-batcher: các request đồng thời được encode chung 1 lần
+        try:
+            result = batcher.submit(text).result(timeout=REQUEST_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            # model đang quá tải: báo thử lại sau thay vì lỗi 500
+            resp = jsonify({"error": f"Kiểm duyệt quá {REQUEST_TIMEOUT_SECONDS}s, vui lòng thử lại sau"})
+            resp.headers["Retry-After"] = str(BUSY_RETRY_AFTER_SECONDS)
+            return resp, 503
     return jsonify({
         "mode": "single",
         "result": result
     })
 
 
+@app.post("/api/moderate/async")
+def moderate_comment_async():
+    """
+    Kiểm duyệt bất đồng bộ: nhận job rồi trả 202 + job_id ngay, không chờ model.
+
+    Body JSON:
+    - {"text": "..."} hoặc {"texts": ["...", ...]}
+    - "callback_url" (tuỳ chọn): job xong thì POST kết quả (JSON) tới URL này,
+      chỉ host trong COMMENT_ASYNC_CALLBACK_HOSTS (không cấu hình -> 400)
+
+    Kết quả: GET /api/moderate/jobs/<job_id>. Hàng đợi đầy -> 429 + Retry-After,
+    job nhiều câu hơn cả sức chứa hàng đợi -> 413 (chia nhỏ rồi gửi lại).
+    """
+    data = request.get_json(silent=True) or {}
+
+    if "texts" in data:
+        texts = data.get("texts", [])
+        if not isinstance(texts, list) or not texts:
+            return jsonify({"error": "Trường 'texts' phải là list và không được rỗng"}), 400
+        # lỗi dữ liệu phải trả về ngay, không để worker làm hỏng cả job khác chung batch
+        bad = [i for i, t in enumerate(texts) if not isinstance(t, str)]
+        if bad:
+            return jsonify({"error": "Mọi phần tử của 'texts' phải là chuỗi", "invalid_indexes": bad[:20]}), 400
+    else:
+        text = data.get("text", "")
+        if not isinstance(text, str) or not text.strip():
+            return jsonify({"error": "Thiếu 'text' hoặc 'texts' trong body"}), 400
+        texts = [text.strip()]
+
+    callback_url = data.get("callback_url")
+    if callback_url is not None and not jobs.callback_allowed(callback_url):
+        if not jobs.callback_hosts:
+            return jsonify({"error": "Callback đang tắt (chưa cấu hình COMMENT_ASYNC_CALLBACK_HOSTS)"}), 400
+        return jsonify({"error": "'callback_url' phải là URL http(s) tới host được phép"}), 400
+
+    try:
+        job = jobs.submit(texts, callback_url=callback_url)
+    except JobTooLargeError as exc:
+        return jsonify({"error": str(exc), "count": exc.count, "max_queue_size": exc.max_size}), 413
+    except QueueFullError as exc:
+        resp = jsonify({"error": str(exc), "queue_depth": exc.depth, "max_queue_size": exc.max_size})
+        resp.headers["Retry-After"] = str(ASYNC_RETRY_AFTER_SECONDS)
+        return resp, 429
+
+    return jsonify({
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "count": job["count"],
+        "status_url": f"/api/moderate/jobs/{job['job_id']}",
+    }), 202
+
+
+@app.get("/api/moderate/jobs/<job_id>")
+def moderate_job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Không tìm thấy job (sai id hoặc đã hết hạn)"}), 404
+    return jsonify(job)
+
+
+def _parse_ndjson_line(raw: bytes):
+    """
+    1 dòng NDJSON -> (id, text): chấp nhận "câu" hoặc {"text": "...", "id": ...}.
+    """
+    item = json.loads(raw)
+    if isinstance(item, str):
+        return None, item
+    if isinstance(item, dict) and isinstance(item.get("text"), str):
+        return item.get("id"), item["text"]
+    raise ValueError("mỗi dòng phải là chuỗi JSON hoặc object có 'text'")
+
+
+@app.post("/api/moderate/stream")
+def moderate_comment_stream():
+    """
+    Kiểm duyệt lượng lớn bình luận theo luồng (NDJSON vào, NDJSON ra, chunked):
+
+    - Body: mỗi dòng 1 bình luận, "câu" hoặc {"text": "...", "id": ...}
+    - Đọc từng dòng, đủ chunk_size dòng thì chấm 1 lần và trả luôn kết quả chunk đó
+    - ?fields=label,is_toxic : chỉ trả các trường này (bỏ text / probs cho nhẹ), luôn kèm "line" + "id"
+    - Dòng lỗi -> {"line": n, "error": "..."} rồi chấm tiếp các dòng sau
+    """
+    fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()]
+    try:
+        chunk_size = int(request.args.get("chunk_size", STREAM_CHUNK_SIZE))
+    except ValueError:
+        return jsonify({"error": "'chunk_size' phải là số nguyên"}), 400
+    chunk_size = max(1, min(chunk_size, STREAM_MAX_CHUNK_SIZE))
+
+    def render(line_no, item_id, result):
+        if fields:
+            result = {k: result[k] for k in fields if k in result}
+        row = {"line": line_no, **result}
+        if item_id is not None:
+            row["id"] = item_id
+        return json.dumps(row, ensure_ascii=False) + "\n"
+
+    def flush(pending):
+        results = engine.predict_texts([text for _, _, text in pending])
+        return "".join(render(line_no, item_id, result) for (line_no, item_id, _), result in zip(pending, results))
+
+    def generate():
+        pending = []
+        errors = []
+        for line_no, raw in enumerate(request.stream, start=1):
+            if not raw.strip():
+                continue
+            try:
+                item_id, text = _parse_ndjson_line(raw)
+            except ValueError as exc:  # JSONDecodeError cũng là ValueError
+                errors.append(json.dumps({"line": line_no, "error": str(exc)}, ensure_ascii=False) + "\n")
+                continue
+
+            pending.append((line_no, item_id, text))
+            if len(pending) >= chunk_size:
+                yield "".join(errors) + flush(pending)
+                pending, errors = [], []
+
+        if pending or errors:
+            yield "".join(errors) + (flush(pending) if pending else "")
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.get("/api/moderate/stats")
+def moderate_stats():
+    return jsonify({
+        "batcher": batcher.stats(),
+        "cache": engine.cache.stats(),
+        "tiers": engine.tier_stats(),
+        "async": jobs.stats(),
+        "near_duplicates": engine.near_duplicates.stats() if engine.near_duplicates else None,
+    })
+
+
 if __name__ == "__main__":
     print("🚀 Comment Filter API đang chạy tại http://127.0.0.1:5002/api/moderate")
-    app.run(host="0.0.0.0", port=5002, debug=True)
+    app.run(host="0.0.0.0", port=5002, debug=True, threaded=True)
@@ -0,0 +1,206 @@
+"""
+Benchmark độ trễ + hiệu chỉnh ngưỡng cho CommentFilterEngine trên tập bình luận có nhãn.
+
+- Độ trễ: phát lại tập dữ liệu qua predict_one (nhiều thread) và predict_texts theo batch
+  (nhiều batch size x số thread), báo p50 / p99 và throughput
+- Hiệu chỉnh: quét ngưỡng xác suất toxic / spam -> precision / recall / F1 cho từng nhãn,
+  và lưới (toxic_threshold, spam_threshold) cho cờ is_toxic cuối cùng
+
+Cache kết quả bị tắt để đo đúng chi phí model.
+
+Ví dụ:
+    python ai/comment/benchmark_moderation.py --data data/comments_train.csv --output data/moderation_benchmark.json
+    python ai/comment/benchmark_moderation.py --limit 2000 --batch-sizes 1,16,64 --threads 1,4 --no-cascade
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from comment_filter_engine import CommentFilterEngine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_list(value, cast):
+    return [cast(v) for v in str(value).split(",") if v.strip()]
+
+
+def latency_summary(latencies_ms, n_items: int, wall_seconds: float):
+    latencies_ms = np.asarray(latencies_ms, dtype=float)
+    return {
+        "calls": int(len(latencies_ms)),
+        "items": n_items,
+        "p50_ms": float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+        "p99_ms": float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+        "mean_ms": float(latencies_ms.mean()) if len(latencies_ms) else None,
+        "items_per_second": n_items / wall_seconds if wall_seconds else None,
+        "wall_seconds": wall_seconds,
+    }
+
+
+def timed_calls(fn, payloads, threads: int):
+    """
+    Gọi fn(payload) cho từng payload trên `threads` thread, trả (latency ms từng lần gọi, wall time).
+    """
+    def one(payload):
+        started = time.perf_counter()
+        fn(payload)
+        return (time.perf_counter() - started) * 1000.0
+
+    started = time.perf_counter()
+    if threads <= 1:
+        latencies = [one(p) for p in payloads]
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = list(pool.map(one, payloads))
+    return latencies, time.perf_counter() - started
+
+
+def bench_latency(engine: CommentFilterEngine, texts, batch_sizes, thread_counts):
+    report = {"predict_one": [], "predict_batch": []}
+
+    # warm-up: lần encode đầu chậm hơn hẳn (khởi tạo kernel / cấp phát)
+    engine.predict_texts(texts[:8])
+
+    for threads in thread_counts:
+        latencies, wall = timed_calls(engine.predict_one, texts, threads)
+        report["predict_one"].append({"threads": threads, **latency_summary(latencies, len(texts), wall)})
+        print(f"   predict_one   threads={threads:<3} p50={report['predict_one'][-1]['p50_ms']:.2f}ms")
+
+    for batch_size in batch_sizes:
+        chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        for threads in thread_counts:
+            latencies, wall = timed_calls(
+                lambda chunk: engine.predict_texts(chunk, batch_size=batch_size), chunks, threads
+            )
+            row = {"batch_size": batch_size, "threads": threads, **latency_summary(latencies, len(texts), wall)}
+            report["predict_batch"].append(row)
+            print(
+                f"   predict_batch batch={batch_size:<4} threads={threads:<3} "
+                f"p50={row['p50_ms']:.2f}ms {row['items_per_second']:.0f} câu/s"
+            )
+    return report
+
+
+def precision_recall(pred, truth):
+    pred = np.asarray(pred, dtype=bool)
+    truth = np.asarray(truth, dtype=bool)
+    tp = int((pred & truth).sum())
+    fp = int((pred & ~truth).sum())
+    fn = int((~pred & truth).sum())
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1, "tp": tp, "fp": fp, "fn": fn}
+
+
+def model_probs(engine: CommentFilterEngine, texts, batch_size: int = 64):
+    """
+    Xác suất của transformer + LogisticRegression (bỏ qua từ khóa / cascade) để quét ngưỡng.
+    """
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    emb_sorted = engine.encoder.encode([texts[i] for i in order], batch_size=batch_size, show_progress_bar=False)
+    emb = np.empty_like(emb_sorted)
+    emb[order] = emb_sorted
+    return np.asarray(engine.clf.predict_proba(emb), dtype=float)
+
+
+def calibrate(engine: CommentFilterEngine, texts, labels, thresholds):
+    probs = model_probs(engine, texts)
+    label_names = [engine.id2label[i] for i in range(probs.shape[1])]
+    labels = np.asarray([str(l).lower() for l in labels])
+
+    # 1. Đường precision / recall cho từng nhãn theo ngưỡng P(nhãn)
+    curves = {}
+    for col, name in enumerate(label_names):
+        truth = labels == name.lower()
+        curves[name] = [
+            {"threshold": t, **precision_recall(probs[:, col] >= t, truth)}
+            for t in thresholds
+        ]
+
+    # 2. Cờ is_toxic cuối cùng (nhãn != clean) trên lưới (toxic_threshold, spam_threshold)
+    truth_toxic = ~np.isin(labels, list(engine.clean_labels))
+    grid = []
+    for toxic_t in thresholds:
+        for spam_t in thresholds:
+            _, _, rules = engine.decide(probs, toxic_threshold=toxic_t, spam_threshold=spam_t)
+            grid.append({"toxic_threshold": toxic_t, "spam_threshold": spam_t, **precision_recall(rules != "", truth_toxic)})
+
+    _, _, current_rules = engine.decide(probs)
+    return {
+        "label_curves": curves,
+        "is_toxic_grid": grid,
+        "is_toxic_current": {
+            "toxic_threshold": engine.toxic_threshold,
+            "spam_threshold": engine.spam_threshold,
+            **precision_recall(current_rules != "", truth_toxic),
+        },
+        "is_toxic_best_f1": max(grid, key=lambda row: row["f1"]) if grid else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark độ trễ + hiệu chỉnh ngưỡng cho bộ lọc bình luận")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data", "comments_train.csv"), help="CSV text;label")
+    parser.add_argument("--model", default="models/comment_filter.joblib")
+    parser.add_argument("--limit", type=int, default=5000, help="Số câu tối đa (0 = tất cả)")
+    parser.add_argument("--batch-sizes", default="1,8,32,64,128")
+    parser.add_argument("--threads", default="1,2,4")
+    parser.add_argument("--thresholds", default=",".join(f"{t:.2f}" for t in np.arange(0.05, 1.0, 0.05)))
+    parser.add_argument("--no-cascade", action="store_true", help="Đo riêng transformer (tắt tầng nhanh)")
+    parser.add_argument("--skip-latency", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="File JSON kết quả (mặc định in ra màn hình)")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data, sep=";").dropna(subset=["text", "label"])
+    if args.limit and len(df) > args.limit:
+        df = df.sample(n=args.limit, random_state=args.seed)
+    texts = df["text"].astype(str).tolist()
+    labels = df["label"].astype(str).tolist()
+    print(f"🔹 {len(texts)} bình luận từ {args.data}")
+
+    engine = CommentFilterEngine(model_path=args.model, cache_size=0, cascade=not args.no_cascade)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "dataset": {"source": args.data, "rows": len(texts), "labels": df["label"].astype(str).value_counts().to_dict()},
+        "model": {"path": engine.model_full_path, "version": engine.model_version, "base_model_name": engine.base_model_name},
+        "cascade": engine.tier_stats()["cascade"],
+    }
+
+    if not args.skip_latency:
+        print("🔹 Đo độ trễ ...")
+        report["latency"] = bench_latency(
+            engine, texts, parse_list(args.batch_sizes, int), parse_list(args.threads, int)
+        )
+        report["tiers"] = engine.tier_stats()
+
+    print("🔹 Quét ngưỡng ...")
+    report["calibration"] = calibrate(engine, texts, labels, parse_list(args.thresholds, float))
+    best = report["calibration"]["is_toxic_best_f1"]
+    current = report["calibration"]["is_toxic_current"]
+    print(
+        f"📊 is_toxic hiện tại F1={current['f1']:.4f} | tốt nhất F1={best['f1']:.4f} "
+        f"(toxic={best['toxic_threshold']}, spam={best['spam_threshold']})"
+    )
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Đã ghi kết quả vào {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.pipeline import make_pipeline
+
+# Ngưỡng mặc định của tầng nhanh (ghi kèm vào comment_filter.joblib lúc train)
+# - accept: P(clean) >= accept  -> kết luận sạch luôn
+# - reject: P(nhãn xấu) >= reject -> kết luận toxic / spam luôn
+# - còn lại                      -> chuyển sang sentence-transformer + LogisticRegression
+DEFAULT_ACCEPT_THRESHOLD = 0.95
+DEFAULT_REJECT_THRESHOLD = 0.95
+
+
+def build_fast_classifier(incremental: bool = False):
+    """
+    Tầng 1 của cascade: char n-gram (2-4, trong phạm vi từ) băm vào 2^18 chiều
+    + LogisticRegression. Không cần vocab, không cần GPU, vài chục µs / câu.
+
+    incremental=True: SGDClassifier(log_loss) thay cho LogisticRegression để cập nhật
+    bằng partial_fit (HashingVectorizer không cần fit nên cả pipeline học tiếp được).
+    """
+    if incremental:
+        classifier = SGDClassifier(loss="log_loss", alpha=1e-5, max_iter=50, tol=1e-4, random_state=42)
+    else:
+        classifier = LogisticRegression(max_iter=2000, C=4.0)
+    return make_pipeline(
+        HashingVectorizer(
+            analyzer="char_wb",
+            ngram_range=(2, 4),
+            n_features=2 ** 18,
+            alternate_sign=False,
+            lowercase=True,
+            norm="l2",
+        ),
+        classifier,
+    )
+
+
+def route_fast(fast_probs, clean_id: int, accept: float, reject: float):
+    """
+    Mask các câu tầng nhanh tự quyết được (đủ tự tin), shape (n_texts,).
+    """
+    fast_probs = np.asarray(fast_probs, dtype=float)
+    if fast_probs.size == 0:
+        return np.zeros(0, dtype=bool)
+
+    clean_prob = fast_probs[:, clean_id]
+    bad_probs = np.delete(fast_probs, clean_id, axis=1)
+    bad_max = bad_probs.max(axis=1) if bad_probs.shape[1] else np.zeros(len(fast_probs))
+
+    return (clean_prob >= accept) | (bad_max >= reject)
+
+
+def cascade_report(fast_probs, slow_pred, y_true, clean_id: int, accept: float, reject: float):
+    """
+    Đánh giá cascade trên tập test: tỉ lệ câu mỗi tầng xử lý + accuracy so với
+    chỉ dùng transformer.
+    """
+    fast_probs = np.asarray(fast_probs, dtype=float)
+    slow_pred = np.asarray(slow_pred)
+    y_true = np.asarray(y_true)
+
+    decided = route_fast(fast_probs, clean_id, accept, reject)
+    fast_pred = fast_probs.argmax(axis=1)
+    cascade_pred = np.where(decided, fast_pred, slow_pred)
+
+    slow_acc = float((slow_pred == y_true).mean()) if len(y_true) else 0.0
+    cascade_acc = float((cascade_pred == y_true).mean()) if len(y_true) else 0.0
+    return {
+        "accept": accept,
+        "reject": reject,
+        "fast_share": float(decided.mean()) if len(decided) else 0.0,
+        "transformer_share": float(1.0 - decided.mean()) if len(decided) else 0.0,
+        "fast_tier_accuracy": float((fast_pred[decided] == y_true[decided]).mean()) if decided.any() else None,
+        "transformer_accuracy": slow_acc,
+        "cascade_accuracy": cascade_acc,
+        "accuracy_delta": cascade_acc - slow_acc,
+    }
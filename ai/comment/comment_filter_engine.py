@@ -1,110 +1,416 @@
 from sentence_transformers import SentenceTransformer
+from collections import Counter
 import numpy as np
 import joblib
 import os
+import threading
+import time
+
+from cascade import route_fast, DEFAULT_ACCEPT_THRESHOLD, DEFAULT_REJECT_THRESHOLD
+from keyword_filter import KeywordFilter
+from moderation_cache import ModerationCache, text_key
+from near_duplicate import NearDuplicateDetector
+
+
+class LoadedModel:
+    """
+    Mọi thứ đọc từ 1 file comment_filter.joblib. Load xong toàn bộ mới gán vào engine
+    bằng 1 phép gán: request đang chạy dùng trọn 1 bản (cũ hoặc mới), không lẫn 2 bản.
+    """
+
+    __slots__ = (
+        "version", "clf", "label2id", "id2label", "base_model_name", "encoder",
+        "fast_clf", "accept_threshold", "reject_threshold", "clean_id",
+    )
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
 
 class CommentFilterEngine:
-    def __init__(self, model_path="models/comment_filter.joblib"):
+    # chu kỳ kiểm tra file model có bị train lại / thay thế không (giây)
+    RELOAD_CHECK_SECONDS = 5.0
+
+    def __init__(
+        self,
+        model_path="models/comment_filter.joblib",
+        cache_size=10000,
+        keywords_path="data/moderation_keywords.json",
+        cascade=True,
+        accept_threshold=None,
+        reject_threshold=None,
+        toxic_threshold=0.8,
+        spam_threshold=0.40,
+        near_duplicate_window=0,
+        near_duplicate_min_cluster=3,
+    ):
         # Xác định đường dẫn tuyệt đối tới file model
         base_dir = os.path.dirname(os.path.abspath(__file__))
-        model_full_path = os.path.join(base_dir, model_path)
+        self.model_full_path = os.path.join(base_dir, model_path)
+
+        self._model = None
+        self._reload_lock = threading.Lock()
+        self._last_reload_check = 0.0
+        self._failed_version = None  # version file đã load lỗi (không thử lại tới khi file đổi)
+
+        # Cascade: bật nếu file model có tầng nhanh; ngưỡng None = lấy theo file model
+        self.cascade = cascade
+        self._accept_override = accept_threshold
+        self._reject_override = reject_threshold
+        self.tier_counts = Counter()
+        self._stats_lock = threading.Lock()
+
+        # Cache kết quả theo câu đã chuẩn hoá (0 = tắt)
+        self.cache = ModerationCache(max_size=cache_size)
+
+        # Bộ lọc từ khóa (Aho-Corasick) chạy trước encoder, build 1 lần
+        self.keywords = KeywordFilter.from_file(os.path.join(base_dir, keywords_path))
 
+        # Phát hiện spam copy-paste (MinHash + LSH) trong near_duplicate_window giây gần nhất (0 = tắt)
+        self.near_duplicates = (
+            NearDuplicateDetector(window_seconds=near_duplicate_window, min_cluster_size=near_duplicate_min_cluster)
+            if near_duplicate_window > 0 else None
+        )
+
+        self._model = self._read_model()
+        self.cache.set_model_version(self._model.version)
+
+        # ⚠️ Chỉ 3 nhãn model: toxic | clean | spam
+        self.clean_labels = {"clean"}
+        self.toxic_labels = {"toxic", "spam"}
+
+        # Ngưỡng xác suất bật is_toxic dù nhãn argmax là clean (chỉnh theo benchmark_moderation.py)
+        self.toxic_threshold = float(toxic_threshold)
+        self.spam_threshold = float(spam_threshold)
+
+    def _file_version(self):
+        stat = os.stat(self.model_full_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _read_model(self) -> LoadedModel:
+        """
+        Đọc file model vào 1 LoadedModel mới (không đụng model đang phục vụ).
+        File thiếu / hỏng / đang ghi dở -> raise.
+        """
+        model_full_path = self.model_full_path
         print(f"🔹 Load comment filter model từ: {model_full_path}")
 
         if not os.path.isfile(model_full_path):
             raise FileNotFoundError(f"❌ Không tìm thấy model: {model_full_path}")
 
+        version = self._file_version()
+
         # Load dữ liệu model
         data = joblib.load(model_full_path)
-
-        self.clf = data["clf"]
-        self.label2id = data["label2id"]
-        self.id2label = data["id2label"]
+        id2label = data["id2label"]
         base_model_name = data["base_model_name"]
 
-        # Load encoder
-        print(f"🔹 Load sentence-transformer base model: {base_model_name}")
-        self.encoder = SentenceTransformer(base_model_name)
+        # Load encoder (chỉ load lại khi đổi base model)
+        current = self._model
+        if current is not None and current.base_model_name == base_model_name:
+            encoder = current.encoder
+        else:
+            print(f"🔹 Load sentence-transformer base model: {base_model_name}")
+            encoder = SentenceTransformer(base_model_name)
 
-        # ⚠️ Chỉ 3 nhãn model: toxic | clean | spam
-        self.clean_labels = {"clean"}
-        self.toxic_labels = {"toxic", "spam"}
+        # Tầng nhanh cho cascade (model train trước khi có cascade thì không có)
+        thresholds = data.get("cascade_thresholds", {})
+        return LoadedModel(
+            version=version,
+            clf=data["clf"],
+            label2id=data["label2id"],
+            id2label=id2label,
+            base_model_name=base_model_name,
+            encoder=encoder,
+            fast_clf=data.get("fast_clf"),
+            accept_threshold=float(
+                self._accept_override if self._accept_override is not None
+                else thresholds.get("accept", DEFAULT_ACCEPT_THRESHOLD)
+            ),
+            reject_threshold=float(
+                self._reject_override if self._reject_override is not None
+                else thresholds.get("reject", DEFAULT_REJECT_THRESHOLD)
+            ),
+            clean_id=next((i for i, lab in id2label.items() if str(lab).lower() == "clean"), 0),
+        )
+
+    # thuộc tính của model đang phục vụ (script / benchmark dùng trực tiếp)
+    model_version = property(lambda self: self._model.version)
+    clf = property(lambda self: self._model.clf)
+    label2id = property(lambda self: self._model.label2id)
+    id2label = property(lambda self: self._model.id2label)
+    base_model_name = property(lambda self: self._model.base_model_name)
+    encoder = property(lambda self: self._model.encoder)
+    fast_clf = property(lambda self: self._model.fast_clf)
+    accept_threshold = property(lambda self: self._model.accept_threshold)
+    reject_threshold = property(lambda self: self._model.reject_threshold)
+
+    def reload_if_changed(self):
+        """
+        comment_filter.joblib bị ghi đè (train lại) -> load model mới + bỏ cache.
+        Chỉ stat file tối đa 1 lần / RELOAD_CHECK_SECONDS.
+        File mới lỗi (ghi dở, hỏng) -> giữ model cũ, log lỗi, thử lại khi file đổi tiếp.
+        """
+        now = time.monotonic()
+        if now - self._last_reload_check < self.RELOAD_CHECK_SECONDS:
+            return
+        with self._reload_lock:
+            if now - self._last_reload_check < self.RELOAD_CHECK_SECONDS:
+                return
+            self._last_reload_check = now
+            try:
+                version = self._file_version()
+            except OSError:
+                return  # file đang được ghi lại, để lần sau
+            if version == self._model.version or version == self._failed_version:
+                return
+
+            print("🔁 comment_filter.joblib đã thay đổi → load lại model, xoá cache")
+            try:
+                model = self._read_model()
+            except Exception as exc:
+                self._failed_version = version
+                print(f"⚠️ Load model mới lỗi, giữ model cũ ({self._model.version}): {exc}")
+                return
 
-    def _predict_proba(self, emb):
-        return self.clf.predict_proba(emb)
+            # model đổi -> kết quả cache cũ không còn đúng
+            self._model = model
+            self._failed_version = None
+            self.cache.set_model_version(model.version)
+
+    def _use_cascade(self, model=None):
+        model = model or self._model
+        return bool(self.cascade) and model.fast_clf is not None
+
+    def tier_stats(self):
+        with self._stats_lock:
+            total = sum(self.tier_counts.values())
+            return {
+                "cascade": self._use_cascade(),
+                "accept_threshold": self.accept_threshold,
+                "reject_threshold": self.reject_threshold,
+                "counts": dict(self.tier_counts),
+                "share": {tier: n / total for tier, n in self.tier_counts.items()} if total else {},
+            }
+
+    def _predict_proba(self, emb, model=None):
+        return (model or self._model).clf.predict_proba(emb)
+
+    def observe_new_comment(self, text: str, source=None, comment_id=None):
+        """
+        Ghi nhận 1 bình luận VỪA ĐĂNG vào bộ phát hiện cụm gần trùng (nếu bật near_duplicate_window).
+        Chỉ gọi lúc đăng: kiểm duyệt lại (batch / stream / async / script) không được làm cụm lớn thêm.
+
+        Thuộc chiến dịch spam copy-paste -> kết quả spam (không cần encode), ngược lại None.
+        """
+        if self.near_duplicates is None:
+            return None
+        hits = self.keywords.match(text)
+        if self.keywords.short_circuit(hits) is not None:
+            return None  # từ khóa đã tự kết luận được
+
+        cluster_size = self.near_duplicates.observe(text, source=source, comment_id=comment_id)
+        if not self.near_duplicates.is_campaign(cluster_size):
+            return None
+        with self._stats_lock:
+            self.tier_counts["near_duplicate"] += 1
+        return self._rule_result(text, hits, "spam", "near_duplicate", "near_duplicate", cluster_size=cluster_size)
 
     def predict_one(self, text: str):
         """
         Phân loại 1 bình luận và trả thêm is_toxic (kết hợp model + rule)
         """
-        # 1. Encode và lấy xác suất
-        emb = self.encoder.encode([text])
-        probs = self._predict_proba(emb)[0]
-        label_id = int(np.argmax(probs))
-        label_name = self.id2label[label_id].lower()
-
-        # 2. Đưa probs về dict cho dễ xài
-        probs_dict = {self.id2label[i]: float(p) for i, p in enumerate(probs)}
-        toxic_prob = probs_dict.get("toxic", 0.0)
-        spam_prob = probs_dict.get("spam", 0.0)
-
-        # 3. Luật từ khóa thủ công (cho mấy câu kiểu "phim rẻ tiền")
-        text_lower = text.lower()
-        manual_blacklist = [
-            "rẻ tiền",
-            "phim rác",
-            "rác phẩm",
-            "phim như c",
-            "phim như cc",
-            "như hạch",
-            "như cứt",
-        ]
-        rule_hit = any(kw in text_lower for kw in manual_blacklist)
-
-        # 4. Logic quyết định is_toxic
-        #    - nếu label != clean  -> toxic
-        #    - hoặc prob toxic >= 0.30
-        #    - hoặc prob spam  >= 0.30
-        #    - hoặc trúng từ khóa blacklist
-        is_toxic = (
-            label_name != "clean"
-            or toxic_prob >= 0.8
-            or spam_prob >= 0.40
-            or rule_hit
-        )
+        return self.predict_texts([text])[0]
 
-        return {
-            "text": text,
-            "label": label_name,           # clean / toxic / spam
-            "confidence": float(probs[label_id]),
-            "is_toxic": bool(is_toxic),    # ✅ cờ cuối cùng dùng cho frontend
-            "probs": probs_dict,
-        }
+    def predict_texts(self, texts, batch_size: int = 32):
+        """
+        Phân loại nhiều bình luận với CÙNG logic của predict_one:
+        - spam / blacklist rõ ràng (bộ lọc từ khóa) -> kết luận luôn, không encode
+        - câu trùng (sau chuẩn hoá) với câu đã kiểm duyệt -> lấy từ cache, không encode
+        - phần còn lại: encode 1 lần cho cả list, câu sắp theo độ dài (batch ít padding hơn)
+        - cascade (nếu bật): tầng nhanh quyết các câu đủ tự tin, chỉ câu khó mới encode
+        - predict_proba 1 lần
+        - quyết định is_toxic cho cả batch bằng _build_results
+        """
+        texts = list(texts)
+        if not texts:
+            return []
 
+        self.reload_if_changed()
+        # cả lần gọi dùng 1 bản model; model bị load lại giữa chừng thì không ghi cache
+        model = self._model
+        model_version = model.version
 
-    def predict_batch(self, texts):
+        results = [None] * len(texts)
+        keyword_hits = [self.keywords.match(t) for t in texts]
+
+        # câu chưa có trong cache, mỗi key chỉ tính 1 lần
+        pending = {}
+        for i, text in enumerate(texts):
+            # 0. Lọc từ khóa trước: spam / blacklist rõ ràng -> kết luận luôn, không encode
+            fired = self.keywords.short_circuit(keyword_hits[i])
+            if fired is not None:
+                results[i] = self._keyword_result(text, keyword_hits[i], *fired, model=model)
+                with self._stats_lock:
+                    self.tier_counts["keyword"] += 1
+                continue
+
+            key = text_key(text)
+            cached = self.cache.get(key) if key not in pending else None
+            if cached is not None:
+                results[i] = {**cached, "text": text, "probs": dict(cached["probs"])}
+            else:
+                pending.setdefault(key, []).append(i)
+
+        if pending:
+            todo = [texts[rows[0]] for rows in pending.values()]
+            todo_hits = [keyword_hits[rows[0]] for rows in pending.values()]
+            todo_results = [None] * len(todo)
+            slow_rows = list(range(len(todo)))
+
+            # 1. Cascade: tầng nhanh (char n-gram + linear) tự quyết các câu đủ tự tin
+            if self._use_cascade(model):
+                fast_probs = model.fast_clf.predict_proba(todo)
+                decided = route_fast(fast_probs, model.clean_id, model.accept_threshold, model.reject_threshold)
+                fast_rows = np.flatnonzero(decided).tolist()
+                fast_results = self._build_results(
+                    [todo[r] for r in fast_rows], fast_probs[decided], [todo_hits[r] for r in fast_rows],
+                    tier="fast", model=model,
+                )
+                for row, result in zip(fast_rows, fast_results):
+                    todo_results[row] = result
+                slow_rows = np.flatnonzero(~decided).tolist()
+
+            # 2. Câu còn lại: sentence-transformer + LogisticRegression
+            if slow_rows:
+                slow_texts = [todo[r] for r in slow_rows]
+
+                # Encode theo thứ tự độ dài rồi trả về đúng thứ tự ban đầu
+                order = np.argsort([len(t) for t in slow_texts], kind="stable")
+                emb_sorted = model.encoder.encode(
+                    [slow_texts[i] for i in order],
+                    batch_size=batch_size,
+                    show_progress_bar=False,
+                )
+                emb = np.empty_like(emb_sorted)
+                emb[order] = emb_sorted
+
+                # Lấy xác suất cho cả batch
+                probs_all = self._predict_proba(emb, model)
+
+                slow_results = self._build_results(
+                    slow_texts, probs_all, [todo_hits[r] for r in slow_rows], tier="transformer", model=model
+                )
+                for row, result in zip(slow_rows, slow_results):
+                    todo_results[row] = result
+
+            with self._stats_lock:
+                self.tier_counts["fast"] += len(todo) - len(slow_rows)
+                self.tier_counts["transformer"] += len(slow_rows)
+
+            for (key, rows), result in zip(pending.items(), todo_results):
+                self.cache.set(key, result, model_version)
+                for i in rows:
+                    results[i] = {**result, "text": texts[i], "probs": dict(result["probs"])}
+
+        return results
+
+    def _build_results(self, texts, probs_all, keyword_hits, tier="transformer", model=None):
         """
-        Phân loại list bình luận (ít dùng)
+        Quyết định cho cả batch trên ma trận probs_all (n_texts, n_labels) bằng numpy,
+        dùng chung cho predict_one / predict_batch / micro-batch nên kết quả luôn giống nhau.
         """
-        emb = self.encoder.encode(texts, show_progress_bar=False)
-        probs_all = self._predict_proba(emb)
+        model = model or self._model
+        probs_all = np.asarray(probs_all, dtype=float)
+        label_names = [model.id2label[i] for i in range(probs_all.shape[1])]
+        label_ids, confidences, rules = self.decide(probs_all, model=model)
 
+        # Dựng kết quả 1 lượt (tolist() -> float Python, giống float(p))
         results = []
-        for text, probs in zip(texts, probs_all):
-            label_id = int(np.argmax(probs))
-            label_name = self.id2label[label_id].lower()
-            is_toxic = label_name not in self.clean_labels
-
+        for text, label_id, confidence, probs, rule, hits in zip(
+            texts, label_ids.tolist(), confidences.tolist(), probs_all.tolist(), rules.tolist(), keyword_hits
+        ):
             results.append({
                 "text": text,
-                "label": label_name,
-                "confidence": float(probs[label_id]),
-                "is_toxic": is_toxic,
-                "probs": {self.id2label[i]: float(p) for i, p in enumerate(probs)},
+                "label": label_names[label_id].lower(),  # clean / toxic / spam
+                "confidence": confidence,
+                "is_toxic": bool(rule),                  # ✅ cờ cuối cùng dùng cho frontend
+                "probs": dict(zip(label_names, probs)),
+                "rule": rule or None,                    # luật nào quyết định is_toxic (None = sạch)
+                "keywords": hits or {},
+                "tier": tier,                            # fast / transformer
             })
-
         return results
 
+    def decide(self, probs_all, toxic_threshold=None, spam_threshold=None, model=None):
+        """
+        Quyết định vector hoá trên ma trận probs_all (n_texts, n_labels):
+        (label_ids, confidences, rules) với rules[i] = "" nếu câu sạch.
+        Ngưỡng None = ngưỡng của engine (benchmark_moderation.py truyền ngưỡng khác để quét).
+        """
+        toxic_threshold = self.toxic_threshold if toxic_threshold is None else toxic_threshold
+        spam_threshold = self.spam_threshold if spam_threshold is None else spam_threshold
+
+        probs_all = np.asarray(probs_all, dtype=float)
+        n_labels = probs_all.shape[1]
+        label_names = [(model or self._model).id2label[i] for i in range(n_labels)]
+
+        # 1. Nhãn có xác suất cao nhất
+        label_ids = probs_all.argmax(axis=1)
+        confidences = probs_all[np.arange(len(probs_all)), label_ids]
+
+        # 2. Xác suất toxic / spam theo cột (model thiếu nhãn -> 0)
+        zeros = np.zeros(len(probs_all))
+        toxic_prob = probs_all[:, label_names.index("toxic")] if "toxic" in label_names else zeros
+        spam_prob = probs_all[:, label_names.index("spam")] if "spam" in label_names else zeros
+
+        # 3. Logic quyết định is_toxic (blacklist từ khóa đã xử lý ở bước lọc trước encode)
+        #    - nếu label != clean  -> toxic
+        #    - hoặc prob toxic >= toxic_threshold (mặc định 0.8)
+        #    - hoặc prob spam  >= spam_threshold  (mặc định 0.40)
+        not_clean = np.asarray([label_names[i].lower() != "clean" for i in range(n_labels)])[label_ids]
+        rules = np.select(
+            [not_clean, toxic_prob >= toxic_threshold, spam_prob >= spam_threshold],
+            ["model_label", "toxic_prob", "spam_prob"],
+            default="",
+        )
+        return label_ids, confidences, rules
+
+    def _keyword_result(self, text: str, keyword_hits, group: str, keyword: str, model=None):
+        """
+        Kết quả khi bộ lọc từ khóa kết luận luôn (không chạy model):
+        spam -> nhãn spam, blacklist -> nhãn toxic.
+        """
+        label_name = "spam" if group == "spam" else "toxic"
+        return self._rule_result(
+            text, keyword_hits, label_name, f"keyword:{group}", "keyword", model=model, keyword=keyword
+        )
+
+    def _rule_result(self, text: str, keyword_hits, label_name: str, rule: str, tier: str, model=None, **extra):
+        """
+        Kết quả do luật quyết định trước encoder (từ khóa, cụm gần trùng).
+        """
+        return {
+            "text": text,
+            "label": label_name,
+            "confidence": 1.0,
+            "is_toxic": True,
+            "probs": {lab: 1.0 if lab == label_name else 0.0 for lab in (model or self._model).id2label.values()},
+            "rule": rule,
+            **extra,
+            "keywords": keyword_hits,
+            "tier": tier,
+        }
+
+
+    def predict_batch(self, texts):
+        """
+        Phân loại list bình luận (vd cả trang bình luận): cùng pipeline và cùng kết quả
+        với predict_one (lọc từ khóa, cache, encode 1 lần, quyết định vector hoá).
+        """
+        return self.predict_texts(texts)
+
 
 if __name__ == "__main__":
     engine = CommentFilterEngine()
@@ -1,20 +1,30 @@
 from sentence_transformers import SentenceTransformer
 import pandas as pd
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
+import argparse
 import joblib
+import numpy as np
 import os
 from collections import Counter
 
+from cascade import (
+    build_fast_classifier,
+    cascade_report,
+    DEFAULT_ACCEPT_THRESHOLD,
+    DEFAULT_REJECT_THRESHOLD,
+)
+from embedding_cache import EmbeddingCache
+
 BASE_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 
-def load_data():
-    # Dùng đường dẫn tuyệt đối tới thư mục comment/
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    #csv_path = os.path.join(base_dir, "data", "comments_train.csv")
-    csv_path = os.path.join(base_dir, "data", "comments_train.csv")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "models", "comment_filter.joblib")
+# Cache embedding theo (base model, hash câu): train lại chỉ encode câu mới
+EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, "data", "embedding_cache")
 
+def read_labeled_csv(csv_path):
     print(f"🔹 Load data bình luận từ {csv_path} ...")
 
     # sep=";" vì file dùng dấu ; để ngăn cột
@@ -29,8 +39,14 @@ def load_data():
     if after < before:
         print(f"⚠️ Đã loại {before - after} dòng thiếu text/label.")
 
-    labels_str = df["label"].astype(str).tolist()
-    texts = df["text"].astype(str).tolist()
+    return df["text"].astype(str).tolist(), df["label"].astype(str).tolist()
+
+def load_data():
+    # Dùng đường dẫn tuyệt đối tới thư mục comment/
+    #csv_path = os.path.join(base_dir, "data", "comments_train.csv")
+    csv_path = os.path.join(BASE_DIR, "data", "comments_train.csv")
+
+    texts, labels_str = read_labeled_csv(csv_path)
 
     counts = Counter(labels_str)
     print("🔹 Số mẫu theo nhãn:", dict(counts))
@@ -42,16 +58,37 @@ def load_data():
     y = [label2id[l] for l in labels_str]
     return texts, y, label2id, id2label
 
-def main():
+def encode_texts(texts, use_cache=True):
+    """
+    Encode comment thành vector; có cache thì chỉ encode câu chưa gặp với BASE_MODEL_NAME.
+    """
+    model = None
+
+    def get_encoder():
+        nonlocal model
+        if model is None:
+            print(f"🔹 Load base model: {BASE_MODEL_NAME}")
+            model = SentenceTransformer(BASE_MODEL_NAME)
+        return model
+
+    print("🔹 Đang encode comment thành vector (embeddings)...")
+    if not use_cache:
+        return get_encoder().encode(texts, show_progress_bar=True)
+    cache = EmbeddingCache(EMBEDDING_CACHE_DIR, BASE_MODEL_NAME)
+    return cache.encode(texts, get_encoder, show_progress_bar=True)
+
+def build_classifier(kind):
+    # "sgd": cập nhật tiếp được bằng partial_fit (train_incremental)
+    if kind == "sgd":
+        return SGDClassifier(loss="log_loss", alpha=1e-4, max_iter=50, tol=1e-4, random_state=42)
+    return LogisticRegression(max_iter=1000)
+
+def train_full(classifier="logreg", use_cache=True):
     texts, y, label2id, id2label = load_data()
 
     print(f"✅ Số mẫu: {len(texts)}, số nhãn: {len(label2id)} ({label2id})")
 
-    print(f"🔹 Load base model: {BASE_MODEL_NAME}")
-    model = SentenceTransformer(BASE_MODEL_NAME)
-
-    print("🔹 Đang encode comment thành vector (embeddings)...")
-    X = model.encode(texts, show_progress_bar=True)
+    X = encode_texts(texts, use_cache=use_cache)
 
     counts = Counter(y)
     min_count = min(counts.values())
@@ -62,12 +99,12 @@ def main():
         stratify = None
         print(f"⚠️ Không dùng stratify (min_count={min_count}).")
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=stratify
+    X_train, X_test, y_train, y_test, texts_train, texts_test = train_test_split(
+        X, y, texts, test_size=0.2, random_state=42, stratify=stratify
     )
 
-    print("🔹 Train LogisticRegression classifier...")
-    clf = LogisticRegression(max_iter=1000)
+    clf = build_classifier(classifier)
+    print(f"🔹 Train {type(clf).__name__} classifier...")
     clf.fit(X_train, y_train)
 
     print("🔹 Đánh giá sơ bộ trên tập test:")
@@ -75,11 +112,28 @@ def main():
     y_pred = clf.predict(X_test)
     print(classification_report(y_test, y_pred, target_names=target_names))
 
+    # Tầng nhanh cho cascade: char n-gram băm + linear, train trên cùng dữ liệu
+    fast_clf = build_fast_classifier(incremental=classifier == "sgd")
+    print(f"🔹 Train tầng nhanh (hashed char n-gram + {type(fast_clf[-1]).__name__}) cho cascade...")
+    fast_clf.fit(texts_train, y_train)
+    fast_probs = fast_clf.predict_proba(texts_test)
+
+    clean_id = label2id.get("clean", 0)
+    print("🔹 Cascade trên tập test (tỉ lệ câu mỗi tầng + chênh lệch accuracy so với chỉ dùng transformer):")
+    for threshold in (0.80, 0.90, 0.95, 0.98):
+        report = cascade_report(fast_probs, y_pred, y_test, clean_id, threshold, threshold)
+        fast_acc = report["fast_tier_accuracy"]
+        print(
+            f"   ngưỡng {threshold:.2f}: tầng nhanh {report['fast_share']:.1%} "
+            f"(acc {fast_acc if fast_acc is None else round(fast_acc, 4)}), "
+            f"transformer {report['transformer_share']:.1%} | "
+            f"accuracy {report['cascade_accuracy']:.4f} "
+            f"(delta {report['accuracy_delta']:+.4f})"
+        )
+
     # Lưu model + mapping
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    models_dir = os.path.join(base_dir, "models")
-    os.makedirs(models_dir, exist_ok=True)
-    out_path = os.path.join(models_dir, "comment_filter.joblib")
+    out_path = MODEL_PATH
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
 
     joblib.dump(
         {
@@ -87,10 +141,80 @@ def main():
             "label2id": label2id,
             "id2label": id2label,
             "base_model_name": BASE_MODEL_NAME,
+            # cascade: tầng nhanh + ngưỡng mặc định (chỉnh lại lúc chạy bằng env)
+            "fast_clf": fast_clf,
+            "cascade_thresholds": {
+                "accept": DEFAULT_ACCEPT_THRESHOLD,
+                "reject": DEFAULT_REJECT_THRESHOLD,
+            },
         },
         out_path,
     )
     print(f"🎉 Đã lưu model lọc bình luận tại: {out_path}")
 
+def train_incremental(csv_path, epochs=5, use_cache=True):
+    """
+    Cập nhật model hiện tại bằng dữ liệu mới gán nhãn (partial_fit), không fit lại toàn bộ.
+    Cần model đã train với --classifier sgd.
+    """
+    data = joblib.load(MODEL_PATH)
+    clf = data["clf"]
+    label2id = data["label2id"]
+
+    if not hasattr(clf, "partial_fit"):
+        raise SystemExit(
+            f"❌ Model hiện tại ({type(clf).__name__}) không hỗ trợ partial_fit. "
+            "Train lại đầy đủ 1 lần với --classifier sgd."
+        )
+    if data["base_model_name"] != BASE_MODEL_NAME:
+        raise SystemExit(f"❌ Model train với base model {data['base_model_name']}, cần train lại đầy đủ.")
+
+    texts, labels_str = read_labeled_csv(csv_path)
+    unknown = sorted(set(labels_str) - set(label2id))
+    if unknown:
+        raise SystemExit(f"❌ Nhãn mới {unknown} chưa có trong model {label2id}, cần train lại đầy đủ.")
+    y = np.asarray([label2id[l] for l in labels_str])
+    classes = np.asarray(sorted(label2id.values()))
+
+    print(f"✅ Dữ liệu mới: {len(texts)} mẫu ({dict(Counter(labels_str))})")
+    X = encode_texts(texts, use_cache=use_cache)
+
+    fast_clf = data.get("fast_clf")
+    fast_incremental = fast_clf is not None and hasattr(fast_clf[-1], "partial_fit")
+    if fast_clf is not None and not fast_incremental:
+        print("⚠️ Tầng nhanh của cascade không hỗ trợ partial_fit → giữ nguyên")
+    X_fast = fast_clf[:-1].transform(texts) if fast_incremental else None
+
+    before = float((clf.predict(X) == y).mean())
+    rng = np.random.default_rng(42)
+    print(f"🔹 partial_fit {epochs} epoch ...")
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        clf.partial_fit(X[order], y[order], classes=classes)
+        if fast_incremental:
+            fast_clf[-1].partial_fit(X_fast[order], y[order], classes=classes)
+    after = float((clf.predict(X) == y).mean())
+    print(f"📊 Accuracy trên dữ liệu mới: {before:.4f} → {after:.4f}")
+
+    data["clf"] = clf
+    joblib.dump(data, MODEL_PATH)
+    print(f"🎉 Đã cập nhật model lọc bình luận tại: {MODEL_PATH}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train model lọc bình luận")
+    parser.add_argument("--classifier", default="logreg", choices=["logreg", "sgd"],
+                        help="sgd: cho phép cập nhật tiếp bằng --incremental")
+    parser.add_argument("--incremental", default=None, metavar="CSV",
+                        help="File text;label mới gán nhãn: partial_fit vào model hiện tại thay vì train lại")
+    parser.add_argument("--epochs", type=int, default=5, help="Số lượt partial_fit khi --incremental")
+    parser.add_argument("--no-embedding-cache", action="store_true", help="Encode lại toàn bộ, không dùng cache")
+    args = parser.parse_args()
+
+    use_cache = not args.no_embedding_cache
+    if args.incremental:
+        train_incremental(args.incremental, epochs=args.epochs, use_cache=use_cache)
+    else:
+        train_full(classifier=args.classifier, use_cache=use_cache)
+
 if __name__ == "__main__":
     main()
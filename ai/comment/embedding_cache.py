@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+import numpy as np
+
+# sha1 hex (40 ký tự) + "\n"
+KEY_LINE_BYTES = 41
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache embedding trên đĩa theo (base model, hash câu), dùng lại giữa các lần train:
+
+        <cache_dir>/<base model>/
+            embeddings.f32   # float32 (n_rows, dim), ghi nối tiếp, đọc bằng np.memmap
+            keys.txt         # dòng i = sha1 của câu ở hàng i
+            meta.json        # {"base_model_name", "dim", "count"}
+
+    meta.count là số hàng hợp lệ: lần ghi bị ngắt giữa chừng thì phần thừa bị bỏ qua.
+    """
+
+    def __init__(self, cache_dir: str, base_model_name: str):
+        safe_name = re.sub(r"[^A-Za-z0-9._-]+", "__", base_model_name)
+        self.dir = os.path.join(cache_dir, safe_name)
+        self.base_model_name = base_model_name
+        self.emb_path = os.path.join(self.dir, "embeddings.f32")
+        self.keys_path = os.path.join(self.dir, "keys.txt")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+
+        self.dim = None
+        self.index = {}
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.isfile(self.meta_path):
+            return
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.dim = int(meta["dim"])
+        count = int(meta["count"])
+
+        with open(self.keys_path, "r", encoding="utf-8") as f:
+            for row, line in enumerate(f):
+                if row >= count:
+                    break
+                self.index[line.strip()] = row
+        print(f"🔹 Embedding cache: {len(self.index)} câu đã encode ({self.dir})")
+
+    def __len__(self):
+        return len(self.index)
+
+    def _rows(self):
+        # memmap mở lại sau mỗi lần ghi thêm (chỉ đọc, không load cả file vào RAM)
+        if self._matrix is None or len(self._matrix) != len(self.index):
+            self._matrix = np.memmap(self.emb_path, dtype=np.float32, mode="r", shape=(len(self.index), self.dim))
+        return self._matrix
+
+    def _append(self, keys, emb):
+        os.makedirs(self.dir, exist_ok=True)
+        emb = np.ascontiguousarray(emb, dtype=np.float32)
+        if self.dim is None:
+            self.dim = int(emb.shape[1])
+
+        start = len(self.index)
+        with open(self.emb_path, "r+b" if os.path.isfile(self.emb_path) else "wb") as f:
+            f.seek(start * self.dim * 4)
+            f.write(emb.tobytes())
+            f.truncate()
+        # mỗi dòng keys.txt đúng KEY_LINE_BYTES byte -> cắt phần thừa theo offset
+        with open(self.keys_path, "r+b" if os.path.isfile(self.keys_path) else "wb") as f:
+            f.seek(start * KEY_LINE_BYTES)
+            f.write("".join(k + "\n" for k in keys).encode("ascii"))
+            f.truncate()
+
+        # meta ghi sau cùng -> count chỉ tăng khi embeddings + keys đã ghi xong
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"base_model_name": self.base_model_name, "dim": self.dim, "count": start + len(keys)}, f)
+        os.replace(tmp_path, self.meta_path)
+
+        for offset, key in enumerate(keys):
+            self.index[key] = start + offset
+
+    def encode(self, texts, get_encoder, batch_size: int = 64, show_progress_bar: bool = False):
+        """
+        Embedding (n_texts, dim) float32 cho list câu: câu đã có trong cache lấy từ đĩa,
+        chỉ encode câu mới (mỗi câu 1 lần, sắp theo độ dài) rồi ghi thêm vào cache.
+
+        get_encoder: hàm trả về SentenceTransformer, chỉ gọi khi có câu mới
+        (cache đủ thì không cần load base model).
+        """
+        keys = [_text_hash(t) for t in texts]
+
+        with self._lock:
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in self.index and key not in missing:
+                    missing[key] = text
+
+            if missing:
+                new_texts = list(missing.values())
+                print(f"🔹 Encode {len(new_texts)} câu mới ({len(texts) - len(new_texts)} câu lấy từ cache)")
+                order = np.argsort([len(t) for t in new_texts], kind="stable")
+                emb_sorted = get_encoder().encode(
+                    [new_texts[i] for i in order],
+                    batch_size=batch_size,
+                    show_progress_bar=show_progress_bar,
+                )
+                emb = np.empty_like(emb_sorted)
+                emb[order] = emb_sorted
+                self._append(list(missing.keys()), emb)
+
+            if not keys:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            rows = np.fromiter((self.index[k] for k in keys), dtype=np.int64, count=len(keys))
+            return np.asarray(self._rows()[rows])
@@ -0,0 +1,170 @@
+from collections import deque
+import json
+import os
+import unicodedata
+
+# ====== TỪ KHÓA MẶC ĐỊNH ======
+# blacklist: chê phim kiểu "phim rẻ tiền" (trước đây nằm trong predict_one).
+# Khớp nguyên từ: "phim như c" không khớp "phim như cuộc sống"
+DEFAULT_BLACKLIST = [
+    "rẻ tiền",
+    "phim rác",
+    "rác phẩm",
+    "phim như c",
+    "phim như cc",
+    "như hạch",
+    "như cứt",
+]
+
+# spam rõ ràng: link, mời vào nhóm zalo / telegram -> kết luận luôn.
+# Khớp theo ranh giới từ ở đầu / cuối là chữ / số ("www." không khớp "awww.", "fb.com" không khớp "xfb.com")
+DEFAULT_SPAM_KEYWORDS = [
+    "http://", "https://", "www.", "facebook.com", "fb.com", "bit.ly", "t.me/", "zalo.me/",
+    "vào nhóm zalo", "vô nhóm zalo", "vào nhóm tele", "vô nhóm tele",
+]
+
+# dấu hiệu spam mơ hồ: chỉ báo cáo như toxic, để model quyết
+# ("cảm ơn ad đã vietsub cho phim", "ai có link này không", "đã share cho bạn qua zalo")
+DEFAULT_SPAM_HINT_KEYWORDS = [
+    "zalo", "vào nhóm", "vô nhóm", "kiếm tiền onl", "kiếm tiền online",
+    "ib mình", "inbox mình", "like page", "đăng ký kênh", "sub cho", "link này",
+]
+
+# từ tục / xúc phạm: chỉ khớp nguyên từ ("ngu" không khớp "nguyễn"),
+# chỉ báo cáo chứ không tự quyết định (dễ nhầm: "lon bia", "rác thải")
+DEFAULT_TOXIC_KEYWORDS = [
+    "ngu", "óc chó", "óc cho", "đần", "địt", "đéo", "deo", "cút",
+    "cmm", "clm", "đm", "dm", "vcl", "cặc", "cac", "lồn", "lon",
+    "đụ", "rác", "rác rưởi", "trash",
+]
+
+# nhóm nào khớp thì bỏ qua model luôn (theo thứ tự ưu tiên)
+SHORT_CIRCUIT_GROUPS = ("spam", "blacklist")
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text or "").lower()
+
+
+class AhoCorasick:
+    """
+    Automaton Aho-Corasick: build 1 lần từ nhiều pattern, quét text 1 lượt
+    O(len(text) + số lần khớp) thay vì thử từng keyword với `kw in text`.
+    """
+
+    def __init__(self, patterns):
+        # patterns: list (pattern, payload)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = nxt
+            self.output[node].append((pattern, payload))
+
+        # BFS dựng fail link, gộp output theo fail link
+        todo = deque(self.goto[0].values())
+        while todo:
+            node = todo.popleft()
+            for ch, nxt in self.goto[node].items():
+                todo.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(ch, 0)
+                # con trực tiếp của root: fail về root
+                self.fail[nxt] = target if target != nxt else 0
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """
+        Sinh (vị trí bắt đầu, pattern, payload) cho mọi lần khớp.
+        """
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for pattern, payload in self.output[node]:
+                yield i - len(pattern) + 1, pattern, payload
+
+
+class KeywordFilter:
+    """
+    Lọc từ khóa trước khi encode:
+
+    - blacklist / spam : khớp nguyên từ -> kết luận luôn, không cần model
+    - toxic / spam_hint: khớp nguyên từ -> chỉ báo cáo (để model quyết)
+
+    Từ khóa lấy từ file JSON {"blacklist": [...], "spam": [...], "spam_hint": [...], "toxic": [...]}
+    nếu có (nhóm nào thiếu thì dùng mặc định).
+    """
+
+    def __init__(self, blacklist=None, spam=None, toxic=None, spam_hint=None):
+        self.groups = {
+            "blacklist": list(DEFAULT_BLACKLIST if blacklist is None else blacklist),
+            "spam": list(DEFAULT_SPAM_KEYWORDS if spam is None else spam),
+            "spam_hint": list(DEFAULT_SPAM_HINT_KEYWORDS if spam_hint is None else spam_hint),
+            "toxic": list(DEFAULT_TOXIC_KEYWORDS if toxic is None else toxic),
+        }
+        self.whole_word = set(self.groups)  # mọi nhóm khớp nguyên từ
+        self.automaton = AhoCorasick(
+            (_normalize(kw), group)
+            for group, keywords in self.groups.items()
+            for kw in keywords
+        )
+
+    @classmethod
+    def from_file(cls, path=None):
+        if path and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            print(f"🔹 Load từ khóa lọc bình luận từ: {path}")
+            return cls(
+                blacklist=config.get("blacklist"),
+                spam=config.get("spam"),
+                toxic=config.get("toxic"),
+                spam_hint=config.get("spam_hint"),
+            )
+        return cls()
+
+    @staticmethod
+    def _is_word_boundary(text: str, start: int, end: int) -> bool:
+        # chỉ xét phía keyword kết thúc bằng chữ / số: "https://" vẫn khớp "https://abc"
+        before = text[start - 1] if start > 0 and text[start].isalnum() else " "
+        after = text[end] if end < len(text) and text[end - 1].isalnum() else " "
+        return not before.isalnum() and not after.isalnum()
+
+    def match(self, text: str):
+        """
+        {nhóm: [keyword đã khớp, theo thứ tự xuất hiện]}, chỉ gồm nhóm có khớp.
+        """
+        text = _normalize(text)
+        hits = {}
+        for start, pattern, group in self.automaton.iter_matches(text):
+            if group in self.whole_word and not self._is_word_boundary(text, start, start + len(pattern)):
+                continue
+            found = hits.setdefault(group, [])
+            if pattern not in found:
+                found.append(pattern)
+        return hits
+
+    def short_circuit(self, hits):
+        """
+        (nhóm, keyword) nếu kết luận được ngay không cần model, ngược lại None.
+        """
+        for group in SHORT_CIRCUIT_GROUPS:
+            if hits.get(group):
+                return group, hits[group][0]
+        return None
@@ -0,0 +1,195 @@
+"""
+Kiểm duyệt lại hàng loạt bình luận đã lưu trong Mongo (collection comments của backend)
+bằng comment_filter.joblib hiện tại, ví dụ sau khi train lại model.
+
+- Đọc comments theo _id tăng dần bằng cursor có batch_size (không load hết vào RAM)
+- Mỗi chunk đi qua CommentFilterEngine.predict_texts (lọc từ khóa, cache, cascade, encode theo batch lớn)
+  trên pool worker, số chunk đang xử lý bị giới hạn -> RAM không tăng theo số bình luận
+- Ghi kết quả vào field "moderation" bằng bulk_write(ordered=False)
+- Lưu checkpoint _id cuối cùng đã ghi -> chạy lại là tiếp tục từ chỗ dừng
+
+Ví dụ:
+    python ai/comment/moderate_comments.py
+    python ai/comment/moderate_comments.py --chunk-size 4096 --workers 4
+    python ai/comment/moderate_comments.py --reset              # bỏ checkpoint, chạy lại từ đầu
+    python ai/comment/moderate_comments.py --dry-run --limit 10000
+"""
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import json
+import os
+import time
+
+from bson import ObjectId
+from pymongo import MongoClient, UpdateOne
+
+from comment_filter_engine import CommentFilterEngine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "lumi_ai")
+
+
+# -------------------- CHECKPOINT --------------------
+def load_checkpoint(path: str):
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, last_id, model_version: str, processed: int) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    state = {
+        "last_id": str(last_id),
+        "last_id_type": "objectid" if isinstance(last_id, ObjectId) else "str",
+        "model_version": model_version,
+        "processed": processed,
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    # ghi file tạm rồi rename -> không bao giờ để checkpoint ghi dở
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def checkpoint_last_id(state):
+    if state["last_id_type"] == "objectid":
+        return ObjectId(state["last_id"])
+    return state["last_id"]
+
+
+# -------------------- STREAM + MODERATE --------------------
+def iter_chunks(collection, query, text_field: str, chunk_size: int, limit: int = 0):
+    """
+    Sinh list [(_id, text)] dài tối đa chunk_size, theo _id tăng dần.
+    """
+    cursor = (
+        collection.find(query, {text_field: 1})
+        .sort("_id", 1)
+        .batch_size(chunk_size)
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+
+    chunk = []
+    for doc in cursor:
+        text = doc.get(text_field)
+        chunk.append((doc["_id"], "" if text is None else str(text)))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def moderate_chunk(engine: CommentFilterEngine, chunk, encode_batch_size: int):
+    texts = [text for _, text in chunk]
+    return chunk, engine.predict_texts(texts, batch_size=encode_batch_size)
+
+
+def build_updates(chunk, results, field: str, model_version: str, moderated_at):
+    updates = []
+    for (doc_id, _), result in zip(chunk, results):
+        updates.append(UpdateOne(
+            {"_id": doc_id},
+            {"$set": {field: {
+                "label": result["label"],
+                "is_toxic": result["is_toxic"],
+                "confidence": result["confidence"],
+                "rule": result.get("rule"),
+                "tier": result.get("tier"),
+                "model_version": model_version,
+                "moderated_at": moderated_at,
+            }}},
+        ))
+    return updates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Kiểm duyệt lại toàn bộ bình luận trong Mongo")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--db", default=MONGO_DB_NAME)
+    parser.add_argument("--collection", default="comments")
+    parser.add_argument("--text-field", default="content")
+    parser.add_argument("--field", default="moderation", help="Field lưu kết quả kiểm duyệt")
+    parser.add_argument("--model", default="models/comment_filter.joblib")
+    parser.add_argument("--chunk-size", type=int, default=2048, help="Số bình luận mỗi chunk (= batch cursor + 1 lần bulk_write)")
+    parser.add_argument("--encode-batch-size", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=2, help="Số chunk xử lý song song")
+    parser.add_argument("--cache-size", type=int, default=100000)
+    parser.add_argument("--checkpoint", default=os.path.join(BASE_DIR, "data", "moderate_comments.checkpoint.json"))
+    parser.add_argument("--reset", action="store_true", help="Bỏ checkpoint, chạy lại từ đầu")
+    parser.add_argument("--skip-current", action="store_true", help="Bỏ qua bình luận đã kiểm duyệt bằng đúng model hiện tại")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ chấm, không ghi Mongo / checkpoint")
+    args = parser.parse_args()
+
+    engine = CommentFilterEngine(model_path=args.model, cache_size=args.cache_size)
+    model_version = engine.model_version
+
+    collection = MongoClient(args.mongo_uri)[args.db][args.collection]
+
+    # 1. Điểm bắt đầu: checkpoint (nếu cùng model), ngược lại từ đầu
+    query = {}
+    processed = 0
+    state = None if args.reset else load_checkpoint(args.checkpoint)
+    if state and state.get("model_version") == model_version:
+        query["_id"] = {"$gt": checkpoint_last_id(state)}
+        processed = int(state.get("processed", 0))
+        print(f"🔁 Tiếp tục từ checkpoint: _id > {state['last_id']} ({processed} bình luận đã xử lý)")
+    elif state:
+        print("⚠️ Checkpoint thuộc model cũ → chạy lại từ đầu")
+    if args.skip_current:
+        query[f"{args.field}.model_version"] = {"$ne": model_version}
+
+    print(
+        f"🔹 Kiểm duyệt {args.db}.{args.collection} (model {model_version}, "
+        f"chunk={args.chunk_size}, workers={args.workers}, dry_run={args.dry_run})"
+    )
+
+    labels = Counter()
+    written = 0
+    started = time.perf_counter()
+    moderated_at = datetime.now(timezone.utc)
+
+    def finish(future):
+        nonlocal processed, written
+        chunk, results = future.result()
+        if not args.dry_run:
+            updates = build_updates(chunk, results, args.field, model_version, moderated_at)
+            res = collection.bulk_write(updates, ordered=False)
+            written += res.modified_count
+            processed += len(chunk)
+            save_checkpoint(args.checkpoint, chunk[-1][0], model_version, processed)
+        else:
+            processed += len(chunk)
+        labels.update(r["label"] for r in results)
+
+        elapsed = time.perf_counter() - started
+        print(f"   ✅ {processed} bình luận ({processed / elapsed if elapsed else 0:.0f}/s)", flush=True)
+
+    # 2. Pool worker; chỉ giữ tối đa workers * 2 chunk trong RAM.
+    #    Chunk được ghi + checkpoint theo đúng thứ tự _id -> resume không sót bình luận
+    in_flight = deque()
+    max_in_flight = max(1, args.workers) * 2
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for chunk in iter_chunks(collection, query, args.text_field, args.chunk_size, args.limit):
+            in_flight.append(pool.submit(moderate_chunk, engine, chunk, args.encode_batch_size))
+            if len(in_flight) >= max_in_flight:
+                finish(in_flight.popleft())
+        while in_flight:
+            finish(in_flight.popleft())
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Xong trong {elapsed:.1f}s: {processed} bình luận, cập nhật {written} document")
+    print("📊 Thống kê nhãn:", dict(labels))
+    print("📊 Tầng xử lý:", engine.tier_stats()["counts"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import unicodedata
+
+# ký tự "vô hình" hay đi kèm emoji: variation selector, zero-width joiner / space
+_INVISIBLE_RE = re.compile("[\u200b-\u200d\u2060\ufe0e\ufe0f]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _is_emoji(ch: str) -> bool:
+    # emoji / ký hiệu hình (So) + modifier màu da (Sk)
+    return unicodedata.category(ch) in {"So", "Sk"}
+
+
+def normalize_text(text: str) -> str:
+    """
+    Chuẩn hoá bình luận để các câu trùng / gần trùng dùng chung 1 key:
+    - Unicode NFC (dấu tiếng Việt gõ kiểu tổ hợp vs dựng sẵn)
+    - chữ thường, gộp khoảng trắng
+    - bỏ ký tự vô hình, gộp chuỗi emoji lặp ("hay quá 😍😍😍" == "hay quá 😍")
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    text = _INVISIBLE_RE.sub("", text).lower()
+
+    chars = []
+    for ch in text:
+        if _is_emoji(ch) and chars and chars[-1] == ch:
+            continue
+        chars.append(ch)
+
+    return _SPACE_RE.sub(" ", "".join(chars)).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class ModerationCache:
+    """
+    LRU kết quả kiểm duyệt theo hash câu đã chuẩn hoá, gắn với model_version:
+    model đổi -> toàn bộ entry cũ bị bỏ.
+
+    Thread-safe (nhiều request Flask + micro-batcher dùng chung).
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max(0, int(max_size))
+        self.model_version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_sets = 0
+
+    def set_model_version(self, version: str) -> None:
+        with self._lock:
+            if version != self.model_version:
+                if self.model_version is not None:
+                    self.invalidations += 1
+                self.model_version = version
+                self._data.clear()
+
+    def get(self, key: str):
+        with self._lock:
+            result = self._data.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def set(self, key: str, result, model_version=None) -> None:
+        """
+        model_version: version của model đã tính ra result. Model đã được load lại
+        trong lúc tính (khác self.model_version) -> bỏ, không ghi kết quả cũ vào cache mới.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if model_version is not None and model_version != self.model_version:
+                self.stale_sets += 1
+                return
+            self._data[key] = result
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "stale_sets": self.stale_sets,
+                "model_version": self.model_version,
+            }
@@ -0,0 +1,303 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, OrderedDict
+import json
+import queue
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # callback chỉ đi tới host đã duyệt: redirect sang host khác bị coi là lỗi
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+class QueueFullError(Exception):
+    """
+    Hàng đợi không còn chỗ cho job mới (backpressure) -> API trả 429.
+    """
+
+    def __init__(self, depth: int, max_size: int):
+        super().__init__(f"Hàng đợi kiểm duyệt đầy ({depth}/{max_size} bình luận)")
+        self.depth = depth
+        self.max_size = max_size
+
+
+class JobTooLargeError(Exception):
+    """
+    Job nhiều câu hơn cả sức chứa hàng đợi: thử lại cũng không bao giờ vừa -> API trả 413.
+    """
+
+    def __init__(self, count: int, max_size: int):
+        super().__init__(f"Job có {count} bình luận, vượt sức chứa hàng đợi ({max_size}), hãy chia nhỏ")
+        self.count = count
+        self.max_size = max_size
+
+
+class ModerationJobQueue:
+    """
+    Kiểm duyệt bất đồng bộ trong process:
+
+    - submit(texts) đưa từng câu vào hàng đợi có giới hạn, trả job_id ngay
+      (hết chỗ -> QueueFullError, backend thử lại sau; job lớn hơn cả hàng đợi -> JobTooLargeError)
+    - Pool worker lấy tối đa batch_size câu / lần (có thể thuộc nhiều job khác nhau)
+      và gọi predict_fn 1 lần cho cả batch; batch lỗi -> chạy lại theo từng job,
+      chỉ job gây lỗi bị failed
+    - Job xong -> kết quả lấy qua get(job_id), hoặc POST JSON tới callback_url nếu có
+      (chỉ host trong callback_hosts; rỗng = tắt callback, tránh bị dùng làm proxy gọi vào mạng nội bộ)
+    - Job đã xong được giữ job_ttl_seconds rồi bị xoá, tối đa max_finished_jobs job
+      (nhiều hơn -> xoá job xong sớm nhất, RAM không tăng theo số job nhỏ bị dội vào)
+    """
+
+    def __init__(
+        self,
+        predict_fn,
+        max_queue_size: int = 1000,
+        workers: int = 2,
+        batch_size: int = 64,
+        job_ttl_seconds: float = 3600.0,
+        callback_timeout: float = 5.0,
+        max_finished_jobs: int = 10000,
+        callback_hosts=(),
+    ):
+        self.predict_fn = predict_fn
+        self.max_queue_size = max(1, max_queue_size)
+        self.batch_size = max(1, batch_size)
+        self.job_ttl_seconds = job_ttl_seconds
+        self.callback_timeout = callback_timeout
+        self.max_finished_jobs = max(1, max_finished_jobs)
+        self.callback_hosts = {h.strip().lower() for h in callback_hosts if h and h.strip()}
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._jobs = OrderedDict()
+        self._finished = deque()  # job_id theo thứ tự xong -> xoá job cũ nhất trước
+        self._lock = threading.Lock()
+        self._depth = 0  # số câu đang chờ (đã nhận, chưa xử lý)
+
+        self.submitted_jobs = 0
+        self.rejected_jobs = 0
+        self.processed_items = 0
+        self.failed_items = 0
+        self.batches = 0
+        self.callbacks_ok = 0
+        self.callbacks_failed = 0
+        self._waits_ms = deque(maxlen=1000)  # thời gian chờ trong hàng đợi của các câu gần nhất
+
+        self._callbacks = ThreadPoolExecutor(max_workers=2, thread_name_prefix="moderation-callback")
+        self._workers = [
+            threading.Thread(target=self._run, name=f"moderation-async-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    # -------------------- SUBMIT / STATUS --------------------
+    def callback_allowed(self, callback_url) -> bool:
+        """
+        URL http(s) có host (hoặc host:port) nằm trong callback_hosts.
+        """
+        if not isinstance(callback_url, str):
+            return False
+        try:
+            parts = urllib.parse.urlsplit(callback_url)
+            port = parts.port
+        except ValueError:
+            return False
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            return False
+        host = parts.hostname.lower()
+        return host in self.callback_hosts or (port is not None and f"{host}:{port}" in self.callback_hosts)
+
+    def submit(self, texts, callback_url=None):
+        texts = list(texts)
+        if callback_url is not None and not self.callback_allowed(callback_url):
+            raise ValueError("'callback_url' không nằm trong danh sách host được phép (COMMENT_ASYNC_CALLBACK_HOSTS)")
+        now = time.time()
+        if len(texts) > self.max_queue_size:
+            with self._lock:
+                self.rejected_jobs += 1
+            raise JobTooLargeError(len(texts), self.max_queue_size)
+
+        with self._lock:
+            self._evict_expired(now)
+            if self._depth + len(texts) > self.max_queue_size:
+                self.rejected_jobs += 1
+                raise QueueFullError(self._depth, self.max_queue_size)
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "count": len(texts),
+                "remaining": len(texts),
+                "created_at": now,
+                "finished_at": None,
+                "callback_url": callback_url,
+                "callback_status": None,
+                "results": [None] * len(texts),
+                "error": None,
+            }
+            self._jobs[job_id] = job
+            self._depth += len(texts)
+            self.submitted_jobs += 1
+
+        enqueued_at = time.perf_counter()
+        for index, text in enumerate(texts):
+            self._queue.put((job_id, index, text, enqueued_at))
+        return self._snapshot(job)
+
+    def get(self, job_id: str):
+        with self._lock:
+            self._evict_expired(time.time())
+            job = self._jobs.get(job_id)
+            return None if job is None else self._snapshot(job)
+
+    @staticmethod
+    def _snapshot(job):
+        snapshot = {k: v for k, v in job.items() if k not in {"results", "remaining"}}
+        snapshot["processed"] = job["count"] - job["remaining"]
+        if job["status"] in {"done", "failed"}:
+            snapshot["results"] = list(job["results"])
+        return snapshot
+
+    def _evict_expired(self, now: float) -> None:
+        # gọi khi đang giữ self._lock; _finished xếp theo finished_at tăng dần
+        while self._finished and (
+            len(self._finished) > self.max_finished_jobs
+            or now - self._jobs[self._finished[0]]["finished_at"] > self.job_ttl_seconds
+        ):
+            del self._jobs[self._finished.popleft()]
+
+    # -------------------- WORKER --------------------
+    def _collect(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _predict_per_job(self, batch):
+        """
+        Batch gộp nhiều job bị lỗi -> gọi lại predict_fn cho từng job,
+        trả (results, errors) theo thứ tự batch: 1 câu hỏng chỉ làm hỏng job chứa nó.
+        """
+        results = [None] * len(batch)
+        errors = [None] * len(batch)
+        rows_by_job = OrderedDict()
+        for row, (job_id, _, _, _) in enumerate(batch):
+            rows_by_job.setdefault(job_id, []).append(row)
+
+        for rows in rows_by_job.values():
+            try:
+                job_results = self.predict_fn([batch[row][2] for row in rows])
+            except Exception as exc:
+                for row in rows:
+                    errors[row] = str(exc)
+                continue
+            for row, result in zip(rows, job_results):
+                results[row] = result
+        return results, errors
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.predict_fn([text for _, _, text, _ in batch])
+                errors = [None] * len(batch)
+            except Exception as exc:  # lỗi model / dữ liệu -> tách theo job để tìm job gây lỗi
+                if len({job_id for job_id, _, _, _ in batch}) > 1:
+                    results, errors = self._predict_per_job(batch)
+                else:
+                    results, errors = [None] * len(batch), [str(exc)] * len(batch)
+
+            finished_jobs = []
+            with self._lock:
+                self._depth -= len(batch)
+                self.batches += 1
+                n_failed = sum(error is not None for error in errors)
+                self.processed_items += len(batch) - n_failed
+                self.failed_items += n_failed
+
+                for (job_id, index, _, enqueued_at), result, error in zip(batch, results, errors):
+                    self._waits_ms.append((started - enqueued_at) * 1000.0)
+                    job = self._jobs.get(job_id)
+                    if job is None:
+                        continue
+                    job["results"][index] = result
+                    job["remaining"] -= 1
+                    if error is not None:
+                        job["error"] = error
+                    if job["status"] == "queued":
+                        job["status"] = "running"
+                    if job["remaining"] == 0:
+                        job["status"] = "failed" if job["error"] else "done"
+                        job["finished_at"] = time.time()
+                        self._finished.append(job_id)
+                        finished_jobs.append(job)
+                self._evict_expired(time.time())
+
+            for job in finished_jobs:
+                if job["callback_url"]:
+                    self._callbacks.submit(self._send_callback, job)
+
+    def _send_callback(self, job) -> None:
+        with self._lock:
+            payload = self._snapshot(job)
+        payload.pop("callback_url", None)
+        payload.pop("callback_status", None)
+
+        request = urllib.request.Request(
+            job["callback_url"],
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with _callback_opener.open(request, timeout=self.callback_timeout) as resp:
+                status = resp.status
+        except Exception as exc:
+            print(f"⚠️ Callback job {job['job_id']} lỗi: {exc}")
+            status = None
+
+        with self._lock:
+            job["callback_status"] = status
+            if status is not None and 200 <= status < 300:
+                self.callbacks_ok += 1
+            else:
+                self.callbacks_failed += 1
+
+    # -------------------- METRICS --------------------
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job["status"]] = statuses.get(job["status"], 0) + 1
+            return {
+                "queue_depth": self._depth,
+                "max_queue_size": self.max_queue_size,
+                "utilization": self._depth / self.max_queue_size,
+                "workers": len(self._workers),
+                "batch_size": self.batch_size,
+                "jobs": statuses,
+                "submitted_jobs": self.submitted_jobs,
+                "rejected_jobs": self.rejected_jobs,
+                "processed_items": self.processed_items,
+                "failed_items": self.failed_items,
+                "batches": self.batches,
+                "avg_batch_size": (self.processed_items + self.failed_items) / self.batches if self.batches else 0.0,
+                "queue_wait_ms": {
+                    "p50": waits[len(waits) // 2] if waits else None,
+                    "p99": waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else None,
+                },
+                "callbacks": {"ok": self.callbacks_ok, "failed": self.callbacks_failed},
+            }
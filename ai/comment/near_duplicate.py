@@ -0,0 +1,172 @@
+from collections import deque
+import hashlib
+import itertools
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from moderation_cache import normalize_text
+
+# MinHash: NUM_PERM hàm băm, LSH chia thành BANDS band x ROWS hàng
+# -> 2 câu có Jaccard 0.5 chung ít nhất 1 bucket với xác suất ~93%, Jaccard 0.2 chỉ ~15%
+NUM_PERM = 60
+BANDS = 20
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text: str, size: int = 4):
+    """
+    Tập char n-gram của câu đã chuẩn hoá (bỏ khoảng trắng để "k i ế m" ~ "kiếm").
+    """
+    text = normalize_text(text).replace(" ", "")
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash(shingle_set) -> np.ndarray:
+    """
+    Chữ ký MinHash (NUM_PERM,) uint64: min_(s) (a * crc32(s) + b) mod p cho từng hoán vị.
+    """
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in shingle_set), dtype=np.uint64)
+    return ((_PERM_A[:, None] * x[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+class NearDuplicateDetector:
+    """
+    Phát hiện chiến dịch spam copy-paste (câu giống nhau, chỉ sửa vài ký tự):
+
+    - Mỗi bình luận -> chữ ký MinHash, lưu trong LSH index (BANDS bucket / câu)
+    - Câu mới chỉ so với các câu chung bucket (không quét hết) -> ước lượng Jaccard
+    - Cụm câu gần trùng trong window_seconds gần nhất đạt min_cluster_size -> spam
+    - Câu cũ hơn window_seconds bị xoá khỏi index
+
+    Câu quá ngắn (< min_chars) không xét: "hay quá", "phim hay" trùng nhau là bình thường.
+
+    Chống đếm khống:
+    - cùng comment_id (hoặc cùng tác giả + đúng câu đó) gửi lại -> không thêm vào index lần nữa
+    - kích thước cụm = số NGUỒN khác nhau (source: tác giả / IP...) có câu gần trùng;
+      không có source thì mỗi câu giống hệt nhau chỉ tính 1 nguồn
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 3600.0,
+        min_cluster_size: int = 3,
+        similarity: float = 0.5,
+        min_chars: int = 30,
+        max_entries: int = 100000,
+    ):
+        self.window_seconds = window_seconds
+        self.min_cluster_size = max(2, min_cluster_size)
+        self.similarity = similarity
+        self.min_chars = min_chars
+        self.max_entries = max_entries
+
+        self._entries = {}        # id -> (signature, band keys, nguồn, identity)
+        self._identities = {}     # identity (comment_id / nguồn + hash câu) -> id
+        self._order = deque()     # (timestamp, id) theo thời gian thêm vào
+        self._buckets = {}        # band key -> set id
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+        self.checked = 0
+        self.flagged = 0
+        self.candidates = 0
+        self.repeats = 0
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray):
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def _evict(self, now: float) -> None:
+        # gọi khi đang giữ self._lock
+        while self._order and (
+            now - self._order[0][0] > self.window_seconds or len(self._order) > self.max_entries
+        ):
+            _, entry_id = self._order.popleft()
+            _, keys, _, identity = self._entries.pop(entry_id)
+            if self._identities.get(identity) == entry_id:
+                del self._identities[identity]
+            for key in keys:
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(entry_id)
+                    if not bucket:
+                        del self._buckets[key]
+
+    def observe(self, text: str, source=None, comment_id=None, now=None) -> int:
+        """
+        Ghi nhận 1 bình luận mới đăng, trả kích thước cụm gần trùng (số nguồn khác nhau,
+        tính cả câu này) trong cửa sổ thời gian; 0 nếu câu quá ngắn để xét.
+
+        source    : tác giả / nguồn đăng (user id, IP...), None = không rõ
+        comment_id: id bình luận; gửi lại cùng id (retry) không làm cụm lớn thêm
+        """
+        normalized = normalize_text(text)
+        if len(normalized) < self.min_chars:
+            return 0
+
+        text_hash = hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+        origin = f"src:{source}" if source is not None else f"text:{text_hash}"
+        identity = f"id:{comment_id}" if comment_id is not None else f"{origin}:{text_hash}"
+
+        signature = minhash(shingles(normalized))
+        keys = self._band_keys(signature)
+        now = time.time() if now is None else now
+
+        with self._lock:
+            self._evict(now)
+            self.checked += 1
+
+            candidates = set()
+            for key in keys:
+                candidates |= self._buckets.get(key, set())
+            self.candidates += len(candidates)
+
+            # ước lượng Jaccard = tỉ lệ vị trí chữ ký trùng nhau, so 1 lượt với mọi ứng viên
+            origins = {origin}
+            if candidates:
+                candidates = list(candidates)
+                others = np.stack([self._entries[entry_id][0] for entry_id in candidates])
+                close = np.flatnonzero((others == signature).mean(axis=1) >= self.similarity)
+                origins.update(self._entries[candidates[j]][2] for j in close)
+            cluster = len(origins)
+
+            if identity in self._identities:
+                self.repeats += 1
+            else:
+                entry_id = next(self._ids)
+                self._entries[entry_id] = (signature, keys, origin, identity)
+                self._identities[identity] = entry_id
+                self._order.append((now, entry_id))
+                for key in keys:
+                    self._buckets.setdefault(key, set()).add(entry_id)
+
+            if cluster >= self.min_cluster_size:
+                self.flagged += 1
+            return cluster
+
+    def is_campaign(self, cluster_size: int) -> bool:
+        return cluster_size >= self.min_cluster_size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "buckets": len(self._buckets),
+                "checked": self.checked,
+                "flagged": self.flagged,
+                "repeats": self.repeats,
+                "avg_candidates": self.candidates / self.checked if self.checked else 0.0,
+                "window_seconds": self.window_seconds,
+                "min_cluster_size": self.min_cluster_size,
+                "similarity": self.similarity,
+            }
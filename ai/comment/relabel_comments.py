@@ -0,0 +1,178 @@
+"""
+Gán nhãn bình luận mới (output_comment.csv, cột "Bình luận") bằng model hiện tại
+rồi gộp với comments_train.csv để train lại.
+
+- B1: gán nhãn bằng AI: encode theo batch lớn (câu sắp theo độ dài, câu trùng chỉ encode 1 lần)
+- B2: refine bằng keyword: regex biên dịch 1 lần, khớp trên cả cột (pandas str.contains)
+- B3: gộp với file train gốc, ghi dần từng chunk ra file (không giữ toàn bộ dữ liệu trong RAM)
+
+Ví dụ:
+    python ai/comment/relabel_comments.py
+    python ai/comment/relabel_comments.py --input output_comment.csv --output comments_train_merged_v2.csv
+    python ai/comment/relabel_comments.py --chunk-size 20000 --encode-batch-size 256
+"""
+from collections import Counter
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from comment_filter_engine import CommentFilterEngine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TEXT_COLUMN = "Bình luận"
+
+# ====== KEYWORD REFINE (mặc định, ghi đè bằng --keywords file JSON {"spam": [...], "toxic": [...]}) ======
+REFINE_TOXIC_KEYWORDS = [
+    "ngu", "óc chó", "óc cho", "đần", "địt", "đéo", "deo", "cút",
+    "cmm", "clm", "đm", "dm", "vcl", "cặc", "cac", "lồn", "lon",
+    "đụ", "rác", "rác rưởi", "trash"
+]
+
+REFINE_SPAM_KEYWORDS = [
+    "zalo", "facebook.com", "fb.com", "http://", "https://",
+    "theo dõi", "follow", "sub cho", "vào nhóm", "group",
+    "kiếm tiền onl", "kiếm tiền online", "ib mình",
+    "inbox", "like page", "đăng ký kênh", "link này"
+]
+
+
+def compile_keywords(keywords):
+    """
+    1 regex cho cả list keyword (khớp chuỗi con, giống `kw in text`).
+    Keyword dài đặt trước để alternation không dừng sớm ở keyword ngắn hơn.
+    """
+    keywords = sorted({kw.lower() for kw in keywords if kw}, key=len, reverse=True)
+    if not keywords:
+        return None
+    return re.compile("|".join(re.escape(kw) for kw in keywords))
+
+
+def refine_labels(texts: pd.Series, base_labels: pd.Series, spam_re, toxic_re) -> np.ndarray:
+    """
+    Refine nhãn AI bằng keyword cho cả cột:
+    - có keyword spam                      -> spam
+    - có keyword toxic (và AI không ra spam) -> toxic
+    - còn lại                              -> giữ nhãn AI
+    """
+    lowered = texts.astype(str).str.lower()
+    no_match = pd.Series(False, index=texts.index)
+    has_spam = lowered.str.contains(spam_re, regex=True) if spam_re else no_match
+    has_toxic = lowered.str.contains(toxic_re, regex=True) if toxic_re else no_match
+
+    return np.select(
+        [has_spam.to_numpy(), (has_toxic & (base_labels != "spam")).to_numpy()],
+        ["spam", "toxic"],
+        default=base_labels.to_numpy(dtype=object),
+    )
+
+
+def ai_labels(engine: CommentFilterEngine, texts, encode_batch_size: int):
+    """
+    Nhãn model (argmax, không áp rule) cho list câu.
+    Câu trùng chỉ encode 1 lần, encode theo thứ tự độ dài để batch ít padding.
+    """
+    unique_texts, inverse = np.unique(np.asarray(texts, dtype=object), return_inverse=True)
+    unique_texts = unique_texts.tolist()
+
+    order = np.argsort([len(t) for t in unique_texts], kind="stable")
+    emb_sorted = engine.encoder.encode(
+        [unique_texts[i] for i in order],
+        batch_size=encode_batch_size,
+        show_progress_bar=False,
+    )
+    emb = np.empty_like(emb_sorted)
+    emb[order] = emb_sorted
+
+    probs = engine.clf.predict_proba(emb)
+    class_ids = engine.clf.classes_[probs.argmax(axis=1)]
+    labels = np.asarray([engine.id2label[cid] for cid in class_ids], dtype=object)
+    return labels[inverse.ravel()]
+
+
+def clean_rows(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["text"] = df["text"].astype(str).str.strip()
+    df = df[df["text"] != ""]
+    return df[df["text"].str.len() >= 3]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gán nhãn bình luận mới + gộp với dữ liệu train")
+    parser.add_argument("--input", default=os.path.join(BASE_DIR, "output_comment.csv"))
+    parser.add_argument("--train", default=os.path.join(BASE_DIR, "data", "comments_train.csv"))
+    parser.add_argument("--model", default="models/comment_filter.joblib")
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "comments_train_merged_v2.csv"))
+    parser.add_argument("--keywords", default=None, help='File JSON {"spam": [...], "toxic": [...]} thay cho keyword mặc định')
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Số dòng đọc / gán nhãn / ghi mỗi lần")
+    parser.add_argument("--encode-batch-size", type=int, default=128)
+    args = parser.parse_args()
+
+    spam_keywords, toxic_keywords = REFINE_SPAM_KEYWORDS, REFINE_TOXIC_KEYWORDS
+    if args.keywords:
+        with open(args.keywords, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        spam_keywords = config.get("spam", spam_keywords)
+        toxic_keywords = config.get("toxic", toxic_keywords)
+    spam_re = compile_keywords(spam_keywords)
+    toxic_re = compile_keywords(toxic_keywords)
+
+    print("🔹 Load CommentFilterEngine...")
+    engine = CommentFilterEngine(model_path=args.model, cache_size=0)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    started = time.perf_counter()
+    new_counts, merged_counts = Counter(), Counter()
+
+    # utf-8-sig: BOM chỉ ghi 1 lần ở đầu file, các chunk sau ghi nối tiếp
+    with open(args.output, "w", encoding="utf-8-sig", newline="") as out:
+        # ====== B3a: CHÉP FILE TRAIN GỐC (theo chunk) ======
+        print(f"🔹 Đọc {args.train} ...")
+        columns = None
+        for chunk in pd.read_csv(args.train, sep=";", engine="python", chunksize=args.chunk_size):
+            if columns is None:
+                columns = list(chunk.columns)
+                for col in ("text", "label"):
+                    if col not in columns:
+                        columns.append(col)
+            chunk = clean_rows(chunk.reindex(columns=columns))
+            chunk.to_csv(out, sep=";", index=False, header=out.tell() == 0)
+            merged_counts.update(chunk["label"].astype(str))
+
+        # ====== B1 + B2: GÁN NHÃN BÌNH LUẬN MỚI (theo chunk) ======
+        print(f"🔹 Gán nhãn {args.input} ...")
+        done = 0
+        for chunk in pd.read_csv(
+            args.input, sep=";", engine="python", on_bad_lines="skip", chunksize=args.chunk_size
+        ):
+            if TEXT_COLUMN not in chunk.columns:
+                raise ValueError(f"Không tìm thấy cột '{TEXT_COLUMN}'. Cột hiện có: {list(chunk.columns)}")
+
+            texts = chunk[TEXT_COLUMN].astype(str)
+            base = pd.Series(ai_labels(engine, texts.tolist(), args.encode_batch_size), index=chunk.index)
+            labels = refine_labels(texts, base, spam_re, toxic_re)
+
+            df_new = pd.DataFrame({"text": texts, "label": labels.astype(str)})
+            new_counts.update(df_new["label"])
+
+            df_new = clean_rows(df_new).reindex(columns=columns)
+            df_new.to_csv(out, sep=";", index=False, header=out.tell() == 0)
+            merged_counts.update(df_new["label"])
+
+            done += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(f"   ✅ {done} bình luận ({done / elapsed if elapsed else 0:.0f}/s)", flush=True)
+
+    print("📊 Thống kê nhãn mới:", dict(new_counts))
+    print(f"✅ DONE trong {time.perf_counter() - started:.1f}s! File cuối cùng lưu tại:")
+    print(args.output)
+    print("📊 Thống kê sau khi gộp:", dict(merged_counts))
+
+
+if __name__ == "__main__":
+    main()
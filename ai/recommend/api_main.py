@@ -1,23 +1,70 @@
 from pathlib import Path
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import List, Optional
+import hmac
 import os
+import threading
+import time
 
 import pandas as pd
 from pymongo import MongoClient
-from fastapi import FastAPI, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
 
 from recommender.trainer import train_recommender
 from recommender.service import RecommendationService
+from recommender.cache import RecommendationCache, FileCacheStore, MongoCacheStore
+from recommender.content import ContentIndex
+from recommender.trending import TrendingStore, WINDOWS as TRENDING_WINDOWS
+from recommender.refresher import MovieMetaRefresher
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
-MODEL_PATH = BASE_DIR / "models" / "recommender.joblib"
+# .joblib (mặc định) | .npz | thư mục -> artifact gọn dạng mảng numpy (load bằng mmap)
+MODEL_PATH = Path(os.getenv("AI_RECOMMEND_MODEL_PATH", str(BASE_DIR / "models" / "recommender.joblib")))
 
 # 🔧 cấu hình MongoDB: sửa cho đúng với project của bạn
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "lumi_ai")  # tên database Mongo
 
+# Loại model khi retrain: "item_cosine" (mặc định) | "als"
+MODEL_TYPE = os.getenv("AI_RECOMMEND_MODEL_TYPE", "item_cosine")
+
+# item_cosine: > 0 -> similarity tính song song theo block, chỉ giữ top-N / phim (csr)
+SIMILARITY_TOP_N = int(os.getenv("AI_RECOMMEND_SIMILARITY_TOP_N", "0")) or None
+SIMILARITY_BLOCK_SIZE = int(os.getenv("AI_RECOMMEND_SIMILARITY_BLOCK_SIZE", "1024"))
+TRAIN_WORKERS = int(os.getenv("AI_RECOMMEND_TRAIN_WORKERS", "0")) or None
+
+# Trọng số content-based (movie_embeddings) khi trộn với CF, 0 = tắt
+CONTENT_WEIGHT = float(os.getenv("AI_RECOMMEND_CONTENT_WEIGHT", "0.3"))
+
+# Cache gợi ý theo user:
+# - AI_RECOMMEND_CACHE_SIZE : số entry tối đa trong RAM
+# - AI_RECOMMEND_CACHE_STORE: "" (chỉ RAM) | "mongo" | "file" (lưu bền thêm 1 tầng)
+# - AI_RECOMMEND_RETRAIN_ON_MISS: "1" = cache miss thì retrain từ Mongo trước khi gợi ý (mặc định tắt:
+#   model_version = hash dữ liệu tương tác nên mỗi lần retrain gần như luôn xoá cache của MỌI user)
+CACHE_SIZE = int(os.getenv("AI_RECOMMEND_CACHE_SIZE", "10000"))
+CACHE_STORE = os.getenv("AI_RECOMMEND_CACHE_STORE", "").strip().lower()
+CACHE_DIR = BASE_DIR / "data" / "recommendation_cache"
+RETRAIN_ON_MISS = os.getenv("AI_RECOMMEND_RETRAIN_ON_MISS", "0").lower() in {"1", "true", "yes"}
+
+# Retrain định kỳ từ Mongo (giây), 0 = tắt (chỉ retrain qua POST /ai/retrain)
+RETRAIN_INTERVAL_SECONDS = float(os.getenv("AI_RECOMMEND_RETRAIN_INTERVAL_SECONDS", "21600"))
+
+# Khoá chung cho endpoint quản trị (/ai/retrain, /ai/recommendations/invalidate):
+# gửi kèm header X-AI-Token. Chưa cấu hình -> các endpoint này bị khoá (403)
+ADMIN_TOKEN = os.getenv("AI_RECOMMEND_ADMIN_TOKEN", "")
+
+# Trending theo cửa sổ trượt (nạp từ watchhistories + favorites, không cần retrain):
+# - AI_RECOMMEND_TRENDING_POLL_SECONDS: chu kỳ poll Mongo, 0 = tắt
+# - AI_RECOMMEND_TRENDING_WINDOW      : "day" (mặc định) | "hour" cho fallback / guest
+TRENDING_POLL_SECONDS = float(os.getenv("AI_RECOMMEND_TRENDING_POLL_SECONDS", "60"))
+TRENDING_WINDOW = os.getenv("AI_RECOMMEND_TRENDING_WINDOW", "day")
+
+# Đồng bộ metadata phim (ẩn / hiện, sửa thông tin) theo movies.updatedAt, không retrain. 0 = tắt
+META_POLL_SECONDS = float(os.getenv("AI_RECOMMEND_META_POLL_SECONDS", "30"))
+
 app = FastAPI(
     title="Movie Recommender API",
     description="API gợi ý phim dựa trên lịch sử xem + favorites",
@@ -73,8 +120,43 @@ def export_csv_from_mongo() -> None:
     print(f"   ✅ Ghi {len(hist_df)} dòng vào {hist_path}")
 
 
+def build_recommendation_cache() -> RecommendationCache:
+    store = None
+    if CACHE_STORE == "mongo":
+        store = MongoCacheStore(MongoClient(MONGO_URI)[MONGO_DB_NAME]["recommendation_cache"])
+    elif CACHE_STORE == "file":
+        store = FileCacheStore(str(CACHE_DIR))
+    return RecommendationCache(max_size=CACHE_SIZE, store=store)
+
+
+def load_content_index() -> Optional[ContentIndex]:
+    """
+    Đọc movie_embeddings (do ai/chatbot/sync_db.py ghi) để gợi ý được cả phim mới.
+    Mongo lỗi / chưa có embedding -> None, service chỉ dùng CF.
+    """
+    if CONTENT_WEIGHT <= 0:
+        return None
+    try:
+        return ContentIndex.from_mongo(MongoClient(MONGO_URI)[MONGO_DB_NAME])
+    except Exception as exc:
+        print(f"⚠ Không load được movie_embeddings: {exc}")
+        return None
+
+
 # khởi tạo service bằng model hiện có (nếu có sẵn file joblib)
 service = RecommendationService(str(MODEL_PATH))
+service.attach_content_index(load_content_index(), CONTENT_WEIGHT)
+
+trending_store = TrendingStore()
+if TRENDING_POLL_SECONDS > 0:
+    service.attach_trending(trending_store, TRENDING_WINDOW)
+
+recommendation_cache = build_recommendation_cache()
+recommendation_cache.on_model_loaded(service.model_version)
+
+
+# 1 lần retrain tại 1 thời điểm (định kỳ / thủ công / cache miss)
+retrain_lock = threading.Lock()
 
 
 def retrain_from_mongo() -> None:
@@ -83,6 +165,11 @@ def retrain_from_mongo() -> None:
     2) Train lại model từ 3 CSV
     3) Reload RecommendationService với model mới
     """
+    with retrain_lock:
+        _retrain_from_mongo()
+
+
+def _retrain_from_mongo() -> None:
     global service
 
     print("🔁 Retrain model từ MongoDB...")
@@ -97,13 +184,103 @@ def retrain_from_mongo() -> None:
         str(favorites_csv),
         str(watch_csv),
         str(MODEL_PATH),
+        model_type=MODEL_TYPE,
+        n_jobs=TRAIN_WORKERS,
+        similarity_top_n=SIMILARITY_TOP_N,
+        similarity_block_size=SIMILARITY_BLOCK_SIZE,
     )
 
     service = RecommendationService(str(MODEL_PATH))
+    service.attach_content_index(load_content_index(), CONTENT_WEIGHT)
+    if TRENDING_POLL_SECONDS > 0:
+        service.attach_trending(trending_store, TRENDING_WINDOW)
+    # model mới (khác version) => bỏ toàn bộ cache gợi ý cũ
+    recommendation_cache.on_model_loaded(service.model_version)
     print("✅ Retrain xong, đã load model mới")
 
 
-@app.post("/ai/retrain")
+def poll_trending_forever() -> None:
+    """
+    Thread nền: định kỳ nạp sự kiện xem / yêu thích mới vào trending_store.
+    Có sự kiện mới -> bỏ cache của guest (gợi ý guest lấy thẳng từ trending).
+    """
+    since = None
+    while True:
+        try:
+            before = trending_store.events
+            since = trending_store.poll_mongo(MongoClient(MONGO_URI)[MONGO_DB_NAME], since)
+            if trending_store.events != before:
+                recommendation_cache.invalidate_user("guest")
+        except Exception as exc:
+            print(f"⚠ Poll trending lỗi: {exc}")
+        time.sleep(TRENDING_POLL_SECONDS)
+
+
+meta_refresher = MovieMetaRefresher()
+
+
+def poll_movie_meta_forever() -> None:
+    """
+    Thread nền: định kỳ đọc phim vừa sửa (updatedAt) và cập nhật catalog của service
+    tại chỗ -> ẩn / hiện phim có hiệu lực sau vài giây, không cần retrain.
+    """
+    while True:
+        try:
+            meta_refresher.poll(MongoClient(MONGO_URI)[MONGO_DB_NAME], service)
+        except Exception as exc:
+            print(f"⚠ Poll metadata phim lỗi: {exc}")
+        time.sleep(META_POLL_SECONDS)
+
+
+def retrain_forever() -> None:
+    """
+    Thread nền: retrain định kỳ thay cho retrain mỗi lần cache miss.
+    """
+    while True:
+        time.sleep(RETRAIN_INTERVAL_SECONDS)
+        try:
+            retrain_from_mongo()
+        except Exception as exc:
+            print(f"⚠ Retrain định kỳ lỗi: {exc}")
+
+
+def require_admin_token(x_ai_token: Optional[str] = Header(None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Chưa cấu hình AI_RECOMMEND_ADMIN_TOKEN")
+    if not hmac.compare_digest((x_ai_token or "").encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Sai hoặc thiếu X-AI-Token")
+
+
+@app.on_event("startup")
+def start_retrain_scheduler() -> None:
+    if RETRAIN_INTERVAL_SECONDS > 0:
+        threading.Thread(target=retrain_forever, name="retrain-scheduler", daemon=True).start()
+
+
+@app.on_event("startup")
+def start_trending_poller() -> None:
+    if TRENDING_POLL_SECONDS > 0:
+        threading.Thread(target=poll_trending_forever, name="trending-poller", daemon=True).start()
+
+
+@app.on_event("startup")
+def start_movie_meta_poller() -> None:
+    if META_POLL_SECONDS > 0:
+        threading.Thread(target=poll_movie_meta_forever, name="movie-meta-poller", daemon=True).start()
+
+
+@app.get("/ai/catalog/stats")
+def catalog_stats():
+    with service.reading():
+        movies, available = len(service.catalog), int(service.catalog.available.sum())
+    return {
+        "movies": movies,
+        "available": available,
+        "refresher": meta_refresher.stats(),
+    }
+
+
+@app.post("/ai/retrain", dependencies=[Depends(require_admin_token)])
 def manual_retrain():
     """
     Endpoint phụ: nếu muốn test train thủ công.
@@ -119,17 +296,39 @@ def get_recommendations(
 ):
     """
     MỖI LẦN GỌI:
+      0) Có trong cache (cùng user, cùng limit, cùng model_version) -> trả luôn
+      Nếu cache miss (lần đầu, user vừa thêm favorite / lịch sử xem, model đổi):
       1) Lấy lại dữ liệu mới từ MongoDB (movies, favorites, watchhistories)
-      2) Train lại model collaborative filtering
-      3) Gợi ý phim cho user_id với model vừa train
+      2) Train lại model collaborative filtering (chỉ khi bật AI_RECOMMEND_RETRAIN_ON_MISS=1,
+         mặc định model được retrain định kỳ / qua /ai/retrain)
+      3) Gợi ý phim cho user_id với model vừa train rồi ghi vào cache
     """
 
-    # 1) Train lại model từ Mongo (dùng CSV trung gian)
-    retrain_from_mongo()
-
     raw_user_id = user_id or "guest"
     model_user_id = raw_user_id  # nếu sau này cần map thì sửa chỗ này
 
+    # 0) Thử cache trước
+    cached = recommendation_cache.get(model_user_id, limit, service.model_version)
+    if cached is not None:
+        # metadata có thể đã đổi sau lúc cache (refresher): phim vừa bị ẩn -> tính lại
+        # (không retrain), còn lại trả payload mới nhất từ catalog
+        with service.reading():
+            fresh = (
+                [service.catalog.payload(item["id"]) for item in cached]
+                if all(service.catalog.is_available(item["id"]) for item in cached)
+                else None
+            )
+        if fresh is not None:
+            return {
+                "items": fresh,
+                "playlists": [],
+            }
+
+    # 1) Train lại model từ Mongo (dùng CSV trung gian)
+    #    (cache hit nhưng chỉ vướng phim vừa bị ẩn thì không cần retrain)
+    if RETRAIN_ON_MISS and cached is None:
+        retrain_from_mongo()
+
     known = model_user_id in service.user_items
 
     print("📥 /ai/recommendations called")
@@ -139,8 +338,200 @@ def get_recommendations(
 
     # 2) Gợi ý với model mới
     items = service.recommend_for_user(user_id=model_user_id, top_k=limit)
+    recommendation_cache.set(model_user_id, limit, service.model_version, items)
+
+    return {
+        "items": items,
+        "playlists": [],
+    }
+
+
+class BatchRecommendationRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1, description="Danh sách user_id cần gợi ý")
+    limit: int = Field(10, ge=1, le=50)
+    chunk_size: int = Field(512, ge=1, le=10000)
+
+
+@app.post("/ai/recommendations/batch")
+def get_recommendations_batch(body: BatchRecommendationRequest):
+    """
+    Gợi ý cho nhiều user trong 1 lần gọi (job đêm, precompute homepage...).
+
+    KHÔNG retrain: dùng model đang load (retrain qua /ai/retrain nếu cần).
+    """
+    results = service.recommend_for_users(
+        body.user_ids,
+        top_k=body.limit,
+        chunk_size=body.chunk_size,
+    )
+
+    return {
+        "count": len(results),
+        "results": results,
+    }
+
+
+class InvalidateRecommendationRequest(BaseModel):
+    user_id: str = Field(..., min_length=1)
+
+
+@app.post("/ai/recommendations/invalidate", dependencies=[Depends(require_admin_token)])
+def invalidate_recommendations(body: InvalidateRecommendationRequest):
+    """
+    Backend gọi khi user thêm / xoá favorite hoặc lịch sử xem (kèm header X-AI-Token)
+    -> lần gọi /ai/recommendations tiếp theo của user đó sẽ tính lại.
+    """
+    recommendation_cache.invalidate_user(body.user_id)
+    return {"message": "invalidated", "user_id": body.user_id}
+
+
+class WarmupRecommendationRequest(BaseModel):
+    user_ids: Optional[List[str]] = Field(None, description="Bỏ trống = lấy user hoạt động gần đây từ Mongo")
+    limit: int = Field(10, ge=1, le=50)
+    active_days: int = Field(7, ge=1, le=365)
+    max_users: int = Field(10000, ge=1, le=1000000)
+
+
+def list_active_user_ids(active_days: int, max_users: int) -> List[str]:
+    """
+    User có xem phim / thêm yêu thích trong `active_days` ngày gần nhất.
+    """
+    client = MongoClient(MONGO_URI)
+    db = client[MONGO_DB_NAME]
+    since = datetime.now() - timedelta(days=active_days)
+
+    user_ids = set(db.watchhistories.distinct("user_id", {"last_watched_at": {"$gte": since}}))
+    user_ids |= set(db.favorites.distinct("user_id", {"createdAt": {"$gte": since}}))
+    return sorted(uid for uid in user_ids if uid)[:max_users]
+
+
+@app.post("/ai/recommendations/warmup")
+def warmup_recommendations(body: WarmupRecommendationRequest):
+    """
+    Pre-fill cache cho nhiều user 1 lần (chạy batch, không retrain).
+    Luôn kèm "guest" vì đa số lượt vào homepage là khách.
+    """
+    user_ids = body.user_ids or list_active_user_ids(body.active_days, body.max_users)
+    user_ids = list(dict.fromkeys(["guest", *user_ids]))
+
+    results = service.recommend_for_users(user_ids, top_k=body.limit)
+    for uid, items in results.items():
+        recommendation_cache.set(uid, body.limit, service.model_version, items)
+
+    return {
+        "count": len(results),
+        "model_version": service.model_version,
+    }
+
+
+class SessionRecommendationRequest(BaseModel):
+    user_id: Optional[str] = Field("guest", description="ID user từ front-end")
+    recent_movie_ids: List[str] = Field(
+        default_factory=list,
+        max_length=50,
+        description="Phim vừa xem trong phiên / WatchHistory mới nhất, mới nhất trước",
+    )
+    limit: int = Field(10, ge=1, le=50)
+    decay: float = Field(0.8, gt=0, le=1, description="Trọng số phim thứ i = decay^i")
+    session_weight: float = Field(0.7, ge=0, le=1, description="Tỉ trọng phiên so với profile đã train")
+
+
+@app.post("/ai/recommendations/session")
+def get_session_recommendations(body: SessionRecommendationRequest):
+    """
+    Gợi ý theo phiên: phim vừa xem (chưa có trong model) + profile đã train.
+
+    KHÔNG retrain, KHÔNG cache (phiên đổi liên tục): chỉ dùng hàng xóm tính sẵn trong RAM.
+    """
+    items = service.recommend_for_session(
+        body.user_id,
+        body.recent_movie_ids,
+        top_k=body.limit,
+        decay=body.decay,
+        session_weight=body.session_weight,
+    )
 
     return {
         "items": items,
         "playlists": [],
     }
+
+
+@app.get("/ai/recommendations/cache/stats")
+def recommendation_cache_stats():
+    return recommendation_cache.stats()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match có chứa etag không (hỗ trợ "*", danh sách cách nhau dấu phẩy, W/ weak).
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+@app.get("/ai/similar/{movie_id}")
+def get_similar_movies(
+    movie_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Phim tương tự (hàng "vì bạn đã xem X" ở trang chi tiết phim).
+
+    Lấy từ danh sách hàng xóm tính sẵn khi load model -> thời gian trả lời cố định,
+    không retrain, không phụ thuộc user nên cache được ở CDN / trình duyệt.
+    """
+    if movie_id not in service.catalog:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy phim: {movie_id}")
+
+    # model / metadata phim (ẩn, sửa) đổi -> ETag đổi
+    with service.reading():
+        etag = f'"{service.model_version}-m{service.meta_version}-{movie_id}-{limit}"'
+    cache_headers = {"Cache-Control": "public, max-age=300", "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    items = service.similar_movies(movie_id, limit=limit)
+    response.headers.update(cache_headers)
+
+    return {
+        "movie_id": movie_id,
+        "items": items,
+    }
+
+
+@app.get("/ai/trending")
+def get_trending(
+    window: str = Query("day", description="Cửa sổ trượt: " + " | ".join(TRENDING_WINDOWS)),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Phim đang hot theo lượt xem + yêu thích gần đây (đếm theo bucket giờ / ngày,
+    điểm giảm dần theo tuổi bucket). Không retrain, cập nhật theo chu kỳ poll.
+    """
+    if window not in TRENDING_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"window phải là 1 trong {list(TRENDING_WINDOWS)}")
+
+    items = []
+    with service.reading():
+        for mid, score in trending_store.ranking(window):
+            if not service.catalog.is_available(mid):
+                continue
+            items.append({**service.catalog.payload(mid), "trending_score": round(score, 4)})
+            if len(items) >= limit:
+                break
+
+    return {
+        "window": window,
+        "items": items,
+        "stats": trending_store.stats(),
+    }
@@ -0,0 +1,173 @@
+"""
+Đánh giá chất lượng + chi phí của recommender, xuất JSON để so sánh các loại model.
+
+Ví dụ:
+    # dữ liệu giả lập 5k user x 2k phim, so sánh item_cosine vs als
+    python ai/recommend/evaluate_recommender.py --users 5000 --items 2000 --model-types item_cosine,als
+
+    # dữ liệu thật đã export từ Mongo (ai/recommend/data/*.csv)
+    python ai/recommend/evaluate_recommender.py --data-dir ai/recommend/data
+"""
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any
+
+from recommender.evaluation import (
+    generate_synthetic_data,
+    time_split,
+    evaluate_service,
+    latency_stats,
+    time_call,
+    peak_rss_mb,
+    artifact_size_bytes,
+)
+
+
+def run_one(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Train + đánh giá 1 loại model. Chạy trong process riêng để peak RSS không lẫn giữa các model.
+    """
+    import contextlib
+    import io
+    from recommender.trainer import train_recommender
+    from recommender.service import RecommendationService
+
+    model_type = config["model_type"]
+    model_path = config["model_path"]
+    k = config["k"]
+    test = {uid: set(mids) for uid, mids in config["test"].items()}
+
+    _, train_seconds = time_call(
+        train_recommender,
+        config["movies_csv"],
+        config["favorites_csv"],
+        config["watch_csv"],
+        model_path,
+        model_type=model_type,
+        n_jobs=config.get("n_jobs"),
+    )
+    rss_after_train = peak_rss_mb()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        service, load_seconds = time_call(RecommendationService, model_path)
+
+    quality = evaluate_service(service, test, k=k)
+
+    sample = sorted(test)[: config["latency_users"]]
+    latency = latency_stats(service, sample, k=k)
+    _, guest_seconds = time_call(service.recommend_for_user, None, k)
+
+    batch_users = sorted(test)
+    _, batch_seconds = time_call(service.recommend_for_users, batch_users, k)
+
+    return {
+        "model_type": model_type,
+        "artifact": os.path.basename(model_path),
+        "artifact_bytes": artifact_size_bytes(model_path),
+        "train_seconds": train_seconds,
+        "load_seconds": load_seconds,
+        "quality": quality,
+        "recommend_for_user": latency,
+        "guest_ms": guest_seconds * 1000.0,
+        "batch": {
+            "users": len(batch_users),
+            "seconds": batch_seconds,
+            "users_per_second": len(batch_users) / batch_seconds if batch_seconds else None,
+        },
+        "peak_rss_mb": {
+            "after_train": rss_after_train,
+            "total": peak_rss_mb(),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline evaluation + benchmark cho recommender")
+    parser.add_argument("--data-dir", default=None, help="Thư mục có 3 CSV export từ Mongo. Bỏ trống = sinh dữ liệu giả lập")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--interactions-per-user", type=int, default=20)
+    parser.add_argument("--model-types", default="item_cosine,als")
+    parser.add_argument("--artifact-format", default="joblib", choices=["joblib", "npz", "dir"])
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--latency-users", type=int, default=200)
+    parser.add_argument("--n-jobs", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="File JSON kết quả (mặc định in ra màn hình)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="recommender_eval_")
+
+    if args.data_dir:
+        data_dir = Path(args.data_dir)
+        paths = {
+            "movies": str(data_dir / "lumi_ai.movies.csv"),
+            "favorites": str(data_dir / "lumi_ai.favorites.csv"),
+            "watch": str(data_dir / "lumi_ai.watchhistories.csv"),
+        }
+        dataset = {"source": str(data_dir)}
+    else:
+        print(f"🔹 Sinh dữ liệu giả lập: {args.users} user x {args.items} phim ...")
+        paths = generate_synthetic_data(
+            work_dir,
+            n_users=args.users,
+            n_items=args.items,
+            interactions_per_user=args.interactions_per_user,
+            seed=args.seed,
+        )
+        dataset = {
+            "source": "synthetic",
+            "users": args.users,
+            "items": args.items,
+            "interactions_per_user": args.interactions_per_user,
+            "seed": args.seed,
+        }
+
+    train_paths, test = time_split(paths["favorites"], paths["watch"], work_dir, test_ratio=args.test_ratio)
+    print(f"🔹 Chia theo thời gian: {len(test)} user có phim trong tập test")
+
+    suffix = {"joblib": ".joblib", "npz": ".npz", "dir": ""}[args.artifact_format]
+    results = []
+    for model_type in [m.strip() for m in args.model_types.split(",") if m.strip()]:
+        print(f"🔹 Đánh giá model_type={model_type} ...")
+        config = {
+            "model_type": model_type,
+            "model_path": os.path.join(work_dir, f"recommender_{model_type}{suffix}"),
+            "movies_csv": paths["movies"],
+            "favorites_csv": train_paths["favorites"],
+            "watch_csv": train_paths["watch"],
+            "test": {uid: sorted(mids) for uid, mids in test.items()},
+            "k": args.k,
+            "latency_users": args.latency_users,
+            "n_jobs": args.n_jobs,
+        }
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run_one, config).result())
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "dataset": dataset,
+        "split": {"test_ratio": args.test_ratio, "test_users": len(test)},
+        "k": args.k,
+        "artifact_format": args.artifact_format,
+        "results": results,
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+        print(f"✅ Đã ghi kết quả vào {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
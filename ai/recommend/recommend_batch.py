@@ -0,0 +1,82 @@
+"""
+Gợi ý hàng loạt cho nhiều user bằng model đã train (không retrain, không gọi HTTP).
+
+Ví dụ:
+    python ai/recommend/recommend_batch.py                       # tất cả user có trong model
+    python ai/recommend/recommend_batch.py --users users.txt     # mỗi dòng 1 user_id
+    python ai/recommend/recommend_batch.py --top-k 20 --output data/recommendations.jsonl
+    python ai/recommend/recommend_batch.py --content-weight 0                # chỉ CF, không đọc movie_embeddings
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+from pymongo import MongoClient
+
+from recommender.content import ContentIndex
+from recommender.service import RecommendationService
+
+
+def main() -> None:
+    base_dir = Path(__file__).resolve().parent
+
+    parser = argparse.ArgumentParser(description="Batch recommendations cho nhiều user")
+    # cùng artifact với API (api_main.py đọc AI_RECOMMEND_MODEL_PATH)
+    parser.add_argument(
+        "--model",
+        default=os.getenv("AI_RECOMMEND_MODEL_PATH", str(base_dir / "models" / "recommender.joblib")),
+    )
+    parser.add_argument("--users", default=None, help="File user_id (mỗi dòng 1 id). Bỏ trống = tất cả user trong model")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=512)
+    parser.add_argument("--output", default=str(base_dir / "data" / "recommendations.jsonl"))
+    # trộn content-based giống API (api_main.py): cùng trọng số, cùng movie_embeddings trong Mongo
+    parser.add_argument(
+        "--content-weight",
+        type=float,
+        default=float(os.getenv("AI_RECOMMEND_CONTENT_WEIGHT", "0.3")),
+        help="0 = chỉ CF (khác với /recommendations nếu API đang bật content-based)",
+    )
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.getenv("MONGO_DB_NAME", "lumi_ai"))
+    args = parser.parse_args()
+
+    service = RecommendationService(args.model)
+
+    content_index = None
+    if args.content_weight > 0:
+        try:
+            content_index = ContentIndex.from_mongo(MongoClient(args.mongo_uri)[args.db])
+        except Exception as exc:
+            print(f"⚠ Không load được movie_embeddings: {exc}")
+        if content_index is None:
+            print("⚠ Không có content index → chỉ dùng CF, kết quả có thể khác /recommendations")
+    service.attach_content_index(content_index, args.content_weight)
+
+    if args.users:
+        with open(args.users, "r", encoding="utf-8") as f:
+            user_ids = [line.strip() for line in f if line.strip()]
+    else:
+        user_ids = sorted(set(service.user_items) | set(service.user_favorites))
+
+    print(f"🔹 Gợi ý cho {len(user_ids)} user (top_k={args.top_k}, chunk_size={args.chunk_size})")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+
+    # ghi từng chunk ra file để không giữ toàn bộ kết quả trong RAM
+    written = 0
+    with open(output, "w", encoding="utf-8") as f:
+        for start in range(0, len(user_ids), args.chunk_size):
+            chunk = user_ids[start : start + args.chunk_size]
+            results = service.recommend_for_users(chunk, top_k=args.top_k, chunk_size=args.chunk_size)
+            for uid, items in results.items():
+                f.write(json.dumps({"user_id": uid, "items": items}, ensure_ascii=False, default=str) + "\n")
+                written += 1
+
+    print(f"✅ Đã ghi {written} dòng vào {output}")
+
+
+if __name__ == "__main__":
+    main()
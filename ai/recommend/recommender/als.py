@@ -0,0 +1,104 @@
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def train_als(
+    user_item_mat: csr_matrix,
+    factors: int = 64,
+    regularization: float = 0.1,
+    alpha: float = 40.0,
+    iterations: int = 15,
+    n_jobs: Optional[int] = None,
+    block_size: int = 256,
+    random_state: int = 42,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Implicit ALS (Hu, Koren, Volinsky 2008) trên ma trận user-item có trọng số.
+
+    - confidence c_ui = 1 + alpha * weight, preference p_ui = 1 nếu có tương tác
+    - Xen kẽ giải user factors rồi item factors, mỗi bước là các hệ k x k độc lập
+      -> chia theo block, mỗi block giải batched bằng np.linalg.solve trong thread pool
+      (numpy nhả GIL khi giải nên các thread chạy song song thật)
+
+    Trả về (user_factors (n_users, factors), item_factors (n_items, factors)).
+    """
+    user_item_mat = csr_matrix(user_item_mat, dtype=np.float64)
+    item_user_mat = user_item_mat.T.tocsr()
+    n_users, n_items = user_item_mat.shape
+
+    rng = np.random.default_rng(random_state)
+    user_factors = rng.normal(scale=0.01, size=(n_users, factors))
+    item_factors = rng.normal(scale=0.01, size=(n_items, factors))
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+        for it in range(iterations):
+            user_factors = _solve_side(user_item_mat, item_factors, regularization, alpha, pool, block_size)
+            item_factors = _solve_side(item_user_mat, user_factors, regularization, alpha, pool, block_size)
+            print(f"   🔁 ALS iteration {it + 1}/{iterations}")
+
+    return user_factors, item_factors
+
+
+def fold_in_user(
+    item_factors: np.ndarray,
+    item_indices: np.ndarray,
+    weights: np.ndarray,
+    regularization: float,
+    alpha: float,
+    gram: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Tính vector user từ item factors cố định (user không có trong lúc train).
+    `gram` = item_factors.T @ item_factors tính sẵn để khỏi tính lại mỗi request.
+    """
+    k = item_factors.shape[1]
+    if gram is None:
+        gram = item_factors.T @ item_factors
+
+    Y = item_factors[item_indices]
+    conf = 1.0 + alpha * weights
+    A = gram + (Y.T * (conf - 1.0)) @ Y + regularization * np.eye(k)
+    b = Y.T @ conf
+    return np.linalg.solve(A, b)
+
+
+def _solve_side(
+    R: csr_matrix,
+    Y: np.ndarray,
+    regularization: float,
+    alpha: float,
+    pool: ThreadPoolExecutor,
+    block_size: int,
+) -> np.ndarray:
+    """
+    Giải X cho 1 phía: với mỗi hàng r của R,
+        (YᵀY + Yᵀ(C_r - I)Y + λI) x_r = Yᵀ C_r p_r
+    """
+    n_rows = R.shape[0]
+    k = Y.shape[1]
+    base = Y.T @ Y + regularization * np.eye(k)
+    X = np.zeros((n_rows, k))
+
+    def solve_block(start: int) -> None:
+        end = min(start + block_size, n_rows)
+        A = np.repeat(base[None, :, :], end - start, axis=0)
+        b = np.zeros((end - start, k))
+
+        for r in range(start, end):
+            lo, hi = R.indptr[r], R.indptr[r + 1]
+            if lo == hi:
+                continue
+            Yr = Y[R.indices[lo:hi]]
+            conf = 1.0 + alpha * R.data[lo:hi]
+            A[r - start] += (Yr.T * (conf - 1.0)) @ Yr
+            b[r - start] = Yr.T @ conf
+
+        X[start:end] = np.linalg.solve(A, b[:, :, None])[:, :, 0]
+
+    list(pool.map(solve_block, range(0, n_rows, block_size)))
+    return X
@@ -0,0 +1,160 @@
+from collections.abc import Mapping
+from typing import List, Dict, Any, Iterator
+import json
+import os
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from .catalog import Catalog
+
+# Artifact gọn: thư mục các file .npy (memory-map được) hoặc 1 file .npz
+COMPACT_FORMAT_VERSION = 1
+META_FILE = "meta.json"
+
+
+def is_compact_artifact(path: str) -> bool:
+    """
+    .npz hoặc thư mục (đã có, hoặc đường dẫn không có đuôi file) -> artifact gọn.
+    """
+    path = str(path)
+    return path.endswith(".npz") or os.path.isdir(path) or not os.path.splitext(path)[1]
+
+
+class CsrUserItems(Mapping):
+    """
+    user_id -> list index phim (seed), đọc thẳng từ cấu trúc CSR
+    thay cho dict-of-lists. Row của user chính là index trong user_factors (ALS).
+    """
+
+    def __init__(self, user_ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray) -> None:
+        self.indptr = indptr
+        self.indices = indices
+        self.row_index: Dict[str, int] = {str(uid): i for i, uid in enumerate(user_ids.tolist())}
+
+    def __getitem__(self, user_id: str) -> List[int]:
+        row = self.row_index[user_id]
+        return self.indices[self.indptr[row] : self.indptr[row + 1]].tolist()
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self.row_index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.row_index)
+
+    def __len__(self) -> int:
+        return len(self.row_index)
+
+
+def save_compact_artifact(path: str, artifact: Dict[str, Any]) -> None:
+    """
+    Ghi artifact (dạng dict như recommender.joblib) sang dạng mảng numpy + CSR.
+
+    - path kết thúc bằng .npz -> 1 file .npz (không nén)
+    - ngược lại               -> thư mục các file .npy + meta.json (load bằng mmap)
+    """
+    movie2idx: Dict[str, int] = artifact["movie2idx"]
+    user2idx: Dict[str, int] = artifact["user2idx"]
+    user_items: Dict[str, List[int]] = artifact["user_items"]
+
+    movie_ids = [""] * len(movie2idx)
+    for mid, idx in movie2idx.items():
+        movie_ids[idx] = str(mid)
+
+    # user theo đúng thứ tự user2idx (khớp với hàng của user_factors)
+    user_ids = [""] * len(user2idx)
+    for uid, idx in user2idx.items():
+        user_ids[idx] = str(uid)
+
+    indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+    indices: List[int] = []
+    for row, uid in enumerate(user_ids):
+        indices.extend(sorted(set(user_items.get(uid, []))))
+        indptr[row + 1] = len(indices)
+
+    arrays: Dict[str, np.ndarray] = {
+        "movie_ids": np.asarray(movie_ids, dtype=str),
+        "user_ids": np.asarray(user_ids, dtype=str),
+        "user_seeds_indptr": indptr,
+        "user_seeds_indices": np.asarray(indices, dtype=np.int32),
+    }
+    arrays.update(Catalog.from_meta(artifact.get("movies_meta", {})).to_arrays())
+
+    similarity = artifact.get("similarity")
+    if issparse(similarity):
+        # similarity top-N (csr) -> 3 mảng CSR + shape
+        similarity = csr_matrix(similarity)
+        arrays["similarity_data"] = similarity.data.astype(np.float32)
+        arrays["similarity_indices"] = similarity.indices.astype(np.int32)
+        arrays["similarity_indptr"] = similarity.indptr.astype(np.int64)
+        arrays["similarity_shape"] = np.asarray(similarity.shape, dtype=np.int64)
+    elif similarity is not None:
+        arrays["similarity"] = np.ascontiguousarray(similarity)
+
+    for key in ("user_factors", "item_factors"):
+        if artifact.get(key) is not None:
+            arrays[key] = np.ascontiguousarray(artifact[key])
+
+    meta = {
+        "format_version": COMPACT_FORMAT_VERSION,
+        "model_version": artifact.get("model_version"),
+        "model_type": artifact.get("model_type", "item_cosine"),
+        "als_params": artifact.get("als_params", {}),
+    }
+
+    if str(path).endswith(".npz"):
+        np.savez(path, __meta__=np.asarray(json.dumps(meta)), **arrays)
+        return
+
+    os.makedirs(path, exist_ok=True)
+    # bỏ file của lần lưu trước (vd đổi item_cosine -> als thì không còn similarity.npy)
+    for name in os.listdir(path):
+        if name.endswith(".npy") or name == META_FILE:
+            os.remove(os.path.join(path, name))
+    for key, arr in arrays.items():
+        np.save(os.path.join(path, f"{key}.npy"), arr)
+    with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def load_compact_artifact(path: str, mmap: bool = True) -> Dict[str, Any]:
+    """
+    Đọc artifact gọn. Thư mục -> np.load(mmap_mode="r") từng mảng,
+    chỉ những trang thực sự dùng tới mới được đọc vào RAM.
+    """
+    if str(path).endswith(".npz"):
+        npz = np.load(path, allow_pickle=False)
+        meta = json.loads(str(npz["__meta__"]))
+        arrays = {key: npz[key] for key in npz.files if key != "__meta__"}
+    else:
+        with open(os.path.join(path, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = {
+            name[: -len(".npy")]: np.load(os.path.join(path, name), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in os.listdir(path)
+            if name.endswith(".npy")
+        }
+
+    movie_ids = arrays["movie_ids"].tolist()
+    user_items = CsrUserItems(arrays["user_ids"], arrays["user_seeds_indptr"], arrays["user_seeds_indices"])
+
+    similarity = arrays.get("similarity")
+    if "similarity_indptr" in arrays:
+        similarity = csr_matrix(
+            (arrays["similarity_data"], arrays["similarity_indices"], arrays["similarity_indptr"]),
+            shape=tuple(int(n) for n in arrays["similarity_shape"]),
+        )
+
+    return {
+        "model_version": meta.get("model_version"),
+        "model_type": meta.get("model_type", "item_cosine"),
+        "als_params": meta.get("als_params", {}),
+        "movie2idx": {mid: i for i, mid in enumerate(movie_ids)},
+        "idx2movie": dict(enumerate(movie_ids)),
+        "user2idx": user_items.row_index,
+        "user_items": user_items,
+        "catalog": Catalog.from_arrays(arrays),
+        "similarity": similarity,
+        "user_factors": arrays.get("user_factors"),
+        "item_factors": arrays.get("item_factors"),
+    }
@@ -0,0 +1,222 @@
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime
+import hashlib
+import json
+import os
+import threading
+
+
+class FileCacheStore:
+    """
+    Lớp lưu bền cache gợi ý ra thư mục local: mỗi (user, top_k) là 1 file JSON.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _user_prefix(user_id: str) -> str:
+        return hashlib.sha1(user_id.encode("utf-8")).hexdigest()
+
+    def _path(self, user_id: str, top_k: int) -> str:
+        return os.path.join(self.directory, f"{self._user_prefix(user_id)}_{top_k}.json")
+
+    def load(self, user_id: str, top_k: int, model_version: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            with open(self._path(user_id, top_k), "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if doc.get("model_version") != model_version:
+            return None
+        return doc.get("items")
+
+    def save(self, user_id: str, top_k: int, model_version: str, items: List[Dict[str, Any]]) -> None:
+        path = self._path(user_id, top_k)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_version": model_version, "items": items}, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    def delete_user(self, user_id: str) -> None:
+        prefix = f"{self._user_prefix(user_id)}_"
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def clear(self, keep_version: Optional[str] = None) -> None:
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if keep_version is not None:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        if json.load(f).get("model_version") == keep_version:
+                            continue
+                except (OSError, ValueError):
+                    pass
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class MongoCacheStore:
+    """
+    Lớp lưu bền cache gợi ý trong 1 collection Mongo (mặc định: recommendation_cache).
+    """
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+        self.collection.create_index([("user_id", 1), ("top_k", 1)], unique=True)
+
+    def load(self, user_id: str, top_k: int, model_version: str) -> Optional[List[Dict[str, Any]]]:
+        doc = self.collection.find_one(
+            {"user_id": user_id, "top_k": top_k, "model_version": model_version},
+            {"_id": 0, "items": 1},
+        )
+        return doc.get("items") if doc else None
+
+    def save(self, user_id: str, top_k: int, model_version: str, items: List[Dict[str, Any]]) -> None:
+        self.collection.update_one(
+            {"user_id": user_id, "top_k": top_k},
+            {
+                "$set": {
+                    "model_version": model_version,
+                    "items": items,
+                    "updated_at": datetime.now(),
+                }
+            },
+            upsert=True,
+        )
+
+    def delete_user(self, user_id: str) -> None:
+        self.collection.delete_many({"user_id": user_id})
+
+    def clear(self, keep_version: Optional[str] = None) -> None:
+        if keep_version is None:
+            self.collection.delete_many({})
+        else:
+            self.collection.delete_many({"model_version": {"$ne": keep_version}})
+
+
+class RecommendationCache:
+    """
+    Cache kết quả gợi ý theo user:
+
+    - Tầng 1: LRU trong RAM (OrderedDict), tối đa `max_size` entry
+    - Tầng 2 (tuỳ chọn): `store` lưu bền (FileCacheStore / MongoCacheStore)
+
+    Key = (user_id, top_k), mỗi entry gắn model_version: khác version => coi như miss.
+    Invalidate khi user thêm favorite / lịch sử xem (invalidate_user)
+    hoặc khi load model mới (on_model_loaded).
+    """
+
+    def __init__(self, max_size: int = 10000, store=None) -> None:
+        self.max_size = max(1, int(max_size))
+        self.store = store
+        self.model_version: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._user_keys: Dict[str, set] = {}
+
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    # -------------------- ĐỌC / GHI --------------------
+    def get(self, user_id: str, top_k: int, model_version: str) -> Optional[List[Dict[str, Any]]]:
+        key = (user_id, top_k)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == model_version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        items = None
+        if self.store is not None:
+            try:
+                items = self.store.load(user_id, top_k, model_version)
+            except Exception as exc:
+                print(f"⚠ Lỗi đọc cache gợi ý lưu bền: {exc}")
+
+        with self._lock:
+            if items is None:
+                self.misses += 1
+                return None
+            self.store_hits += 1
+            self._put(key, model_version, items)
+        return items
+
+    def set(self, user_id: str, top_k: int, model_version: str, items: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._put((user_id, top_k), model_version, items)
+
+        if self.store is not None:
+            try:
+                self.store.save(user_id, top_k, model_version, items)
+            except Exception as exc:
+                print(f"⚠ Lỗi ghi cache gợi ý lưu bền: {exc}")
+
+    def _put(self, key: Tuple[str, int], model_version: str, items: List[Dict[str, Any]]) -> None:
+        self._entries[key] = (model_version, items)
+        self._entries.move_to_end(key)
+        self._user_keys.setdefault(key[0], set()).add(key)
+
+        while len(self._entries) > self.max_size:
+            old_key, _ = self._entries.popitem(last=False)
+            keys = self._user_keys.get(old_key[0])
+            if keys is not None:
+                keys.discard(old_key)
+                if not keys:
+                    del self._user_keys[old_key[0]]
+
+    # -------------------- INVALIDATE --------------------
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            for key in self._user_keys.pop(user_id, set()):
+                self._entries.pop(key, None)
+
+        if self.store is not None:
+            try:
+                self.store.delete_user(user_id)
+            except Exception as exc:
+                print(f"⚠ Lỗi xoá cache gợi ý lưu bền của {user_id}: {exc}")
+
+    def on_model_loaded(self, model_version: str) -> None:
+        """
+        Gọi mỗi khi load model: nếu version đổi thì bỏ toàn bộ entry cũ.
+        """
+        if model_version == self.model_version:
+            return
+
+        with self._lock:
+            self.model_version = model_version
+            self._entries.clear()
+            self._user_keys.clear()
+
+        if self.store is not None:
+            try:
+                self.store.clear(keep_version=model_version)
+            except Exception as exc:
+                print(f"⚠ Lỗi dọn cache gợi ý lưu bền: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.store_hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "store_hits": self.store_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.store_hits) / lookups if lookups else 0.0,
+                "store": type(self.store).__name__ if self.store is not None else None,
+            }
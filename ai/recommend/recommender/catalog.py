@@ -0,0 +1,326 @@
+from typing import List, Dict, Any, Optional
+import math
+import numpy as np
+
+# các tên field lượt xem có thể gặp (theo thứ tự ưu tiên)
+VIEW_COUNT_FIELDS = ("view_count", "views", "totalViews", "watch_count")
+
+
+# -------------------- LOGIC TRÊN 1 DÒNG METADATA PHIM --------------------
+def movie_available(meta: Optional[Dict[str, Any]]) -> bool:
+    """
+    True nếu phim còn tồn tại để gợi ý.
+
+    - Không có meta -> coi như không tồn tại.
+    - Có cờ xóa mềm 'is_deleted' hoặc 'status' deleted / inactive -> không gợi ý.
+    - Phim đang ẩn ('isHidden', 'status' hidden / premiere) -> không gợi ý
+      (cùng điều kiện với các danh sách phim ở backend).
+    """
+    if not meta:
+        return False
+
+    if meta.get("is_deleted") is True:
+        return False
+
+    if _flag(meta.get("isHidden")):
+        return False
+
+    if meta.get("status") in {"deleted", "inactive", "hidden", "premiere"}:
+        return False
+
+    return True
+
+
+def _flag(value: Any) -> bool:
+    # bool từ Mongo, hoặc "True" / "true" khi đọc lại từ CSV
+    if isinstance(value, str):
+        return value.strip().lower() == "true"
+    return isinstance(value, (bool, np.bool_)) and bool(value)
+
+
+# field của movies cần cho catalog (projection khi đọc thẳng từ Mongo)
+MOVIE_META_FIELDS = (
+    "id", "title", "poster", "thumbnail", "tags", "moods", "rating",
+    *VIEW_COUNT_FIELDS,
+    "isHidden", "status", "is_deleted", "updatedAt",
+)
+
+
+def movie_meta_from_mongo(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Document movies (Mongo) -> metadata cùng dạng với 1 dòng CSV export:
+    list tags / moods được làm phẳng thành tags[0..] / moods[0..].
+    """
+    meta: Dict[str, Any] = {}
+    for key, value in doc.items():
+        if key in {"_id", "id"}:
+            continue
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                meta[f"{key}[{i}]"] = item
+        else:
+            meta[key] = value
+    return meta
+
+
+def popularity_score(meta: Optional[Dict[str, Any]]) -> float:
+    """
+    Điểm kết hợp RATING + VIEW_COUNT:
+    - rating: [0,5] (ưu tiên chính)
+    - views: scale log để tránh phim quá lớn đè hết.
+    """
+    meta = meta or {}
+
+    # rating
+    r = meta.get("rating")
+    try:
+        rating = float(r) if r is not None else 0.0
+    except (TypeError, ValueError):
+        rating = 0.0
+
+    # views: thử nhiều field khác nhau
+    view_raw = next((meta.get(key) for key in VIEW_COUNT_FIELDS if meta.get(key)), 0)
+    try:
+        views = float(view_raw) if view_raw is not None else 0.0
+    except (TypeError, ValueError):
+        views = 0.0
+
+    # scale views: dùng log1p để bớt chênh lệch
+    views_score = math.log1p(max(views, 0.0))
+
+    # trọng số: rating vẫn là chính
+    return rating * 3.0 + views_score
+
+
+def _non_empty_str(value: Any) -> bool:
+    return isinstance(value, str) and bool(value)
+
+
+def _rating_value(value: Any) -> Optional[float]:
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(rating) else rating
+
+
+def result_payload(movie_id: str, meta: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Payload 1 phần tử kết quả gợi ý, đã làm phẳng sẵn từ metadata CSV
+    (tags[0..] -> genres, moods[0..] -> moods).
+    """
+    poster = next(
+        (meta.get(key) for key in ("poster", "thumbnail") if _non_empty_str(meta.get(key))),
+        "",
+    )
+
+    # moods[0..] -> list moods
+    moods = [
+        value
+        for key, value in meta.items()
+        if key.startswith("moods[") and _non_empty_str(value)
+    ]
+
+    # tags[0..] -> genres string
+    tags = [
+        value
+        for key, value in meta.items()
+        if key.startswith("tags[") and _non_empty_str(value)
+    ]
+
+    title = meta.get("title")
+    return {
+        "id": movie_id,
+        "title": title if _non_empty_str(title) else str(movie_id),
+        "poster": poster,
+        "moods": moods,
+        "genres": ", ".join(tags),
+        "rating": _rating_value(meta.get("rating")),
+    }
+
+
+# -------------------- CATALOG DẠNG MẢNG --------------------
+class Catalog:
+    """
+    Metadata phim dạng mảng theo dòng (row), tính sẵn 1 lần:
+
+    - ids / row       : movie_id <-> row
+    - available       : mask phim còn tồn tại
+    - popularity      : điểm độ hot (rating + lượt xem)
+    - titles, posters, genres, moods, ratings: payload kết quả đã làm phẳng
+
+    Các mảng có thể là memmap read-only (artifact dạng thư mục); lần cập nhật
+    đầu tiên sẽ copy sang mảng thường.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        titles: np.ndarray,
+        posters: np.ndarray,
+        genres: np.ndarray,
+        moods_indptr: np.ndarray,
+        moods_values: np.ndarray,
+        ratings: np.ndarray,
+        available: np.ndarray,
+        popularity: np.ndarray,
+    ) -> None:
+        self.ids = ids
+        self.titles = titles
+        self.posters = posters
+        self.genres = genres
+        self.moods_indptr = moods_indptr
+        self.moods_values = moods_values
+        self.ratings = ratings
+        self.available = available
+        self.popularity = popularity
+
+        self.row: Dict[str, int] = {str(mid): i for i, mid in enumerate(ids.tolist())}
+        # moods đã bị sửa sau khi load (row -> list), ưu tiên hơn moods_indptr/values
+        self._moods_override: Dict[int, List[str]] = {}
+        self._mutable = False
+
+    @classmethod
+    def from_meta(cls, movies_meta: Dict[str, Dict[str, Any]]) -> "Catalog":
+        ids = list(movies_meta.keys())
+        payloads = [result_payload(mid, movies_meta[mid]) for mid in ids]
+
+        moods_indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+        moods_values: List[str] = []
+        for i, p in enumerate(payloads):
+            moods_values.extend(p["moods"])
+            moods_indptr[i + 1] = len(moods_values)
+
+        return cls(
+            ids=np.asarray(ids, dtype=object),
+            titles=np.asarray([p["title"] for p in payloads], dtype=object),
+            posters=np.asarray([p["poster"] for p in payloads], dtype=object),
+            genres=np.asarray([p["genres"] for p in payloads], dtype=object),
+            moods_indptr=moods_indptr,
+            moods_values=np.asarray(moods_values, dtype=object),
+            ratings=np.asarray(
+                [np.nan if p["rating"] is None else p["rating"] for p in payloads],
+                dtype=float,
+            ),
+            available=np.asarray([movie_available(movies_meta[mid]) for mid in ids], dtype=bool),
+            popularity=np.asarray([popularity_score(movies_meta[mid]) for mid in ids], dtype=float),
+        )
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    def __contains__(self, movie_id: str) -> bool:
+        return movie_id in self.row
+
+    def is_available(self, movie_id: str) -> bool:
+        row = self.row.get(movie_id)
+        return row is not None and bool(self.available[row])
+
+    def payload(self, movie_id: str) -> Dict[str, Any]:
+        row = self.row.get(movie_id)
+        if row is None:
+            # Không có meta -> không nên gọi, raise để dễ debug
+            raise KeyError(f"Movie id {movie_id} không có trong catalog")
+
+        moods = self._moods_override.get(row)
+        if moods is None:
+            lo, hi = int(self.moods_indptr[row]), int(self.moods_indptr[row + 1])
+            moods = [str(m) for m in self.moods_values[lo:hi]]
+
+        rating = float(self.ratings[row])
+        return {
+            "id": movie_id,
+            "title": str(self.titles[row]),
+            "poster": str(self.posters[row]),
+            "moods": list(moods),
+            "genres": str(self.genres[row]),
+            "rating": None if math.isnan(rating) else rating,
+        }
+
+    # -------------------- CẬP NHẬT TẠI CHỖ --------------------
+    def _ensure_mutable(self) -> None:
+        if self._mutable:
+            return
+        self.ids = np.asarray(self.ids.tolist(), dtype=object)
+        self.titles = np.asarray(self.titles.tolist(), dtype=object)
+        self.posters = np.asarray(self.posters.tolist(), dtype=object)
+        self.genres = np.asarray(self.genres.tolist(), dtype=object)
+        self.ratings = np.array(self.ratings, dtype=float)
+        self.available = np.array(self.available, dtype=bool)
+        self.popularity = np.array(self.popularity, dtype=float)
+        self._mutable = True
+
+    def upsert(self, movie_id: str, meta: Dict[str, Any]) -> int:
+        """
+        Cập nhật (hoặc thêm) 1 phim từ metadata mới. Trả về row của phim.
+        """
+        self._ensure_mutable()
+        payload = result_payload(movie_id, meta)
+
+        row = self.row.get(movie_id)
+        is_new = row is None
+        if is_new:
+            row = len(self.ids)
+            self.ids = np.append(self.ids, np.asarray([movie_id], dtype=object))
+            self.titles = np.append(self.titles, np.asarray([""], dtype=object))
+            self.posters = np.append(self.posters, np.asarray([""], dtype=object))
+            self.genres = np.append(self.genres, np.asarray([""], dtype=object))
+            self.ratings = np.append(self.ratings, np.nan)
+            self.available = np.append(self.available, False)
+            self.popularity = np.append(self.popularity, 0.0)
+            self.moods_indptr = np.append(self.moods_indptr, self.moods_indptr[-1])
+            # row chỉ lộ ra sau khi mọi mảng đã có chỗ cho phim mới
+            self.row[movie_id] = row
+
+        self.titles[row] = payload["title"]
+        self.posters[row] = payload["poster"]
+        self.genres[row] = payload["genres"]
+        self._moods_override[row] = payload["moods"]
+        old_rating = self.ratings[row]
+        self.ratings[row] = np.nan if payload["rating"] is None else payload["rating"]
+        self.available[row] = movie_available(meta)
+
+        if is_new or any(key in meta for key in VIEW_COUNT_FIELDS):
+            self.popularity[row] = popularity_score(meta)
+        else:
+            # meta không có lượt xem (vd document movies trên Mongo) -> giữ phần điểm lượt xem cũ
+            views_part = self.popularity[row] - 3.0 * (0.0 if math.isnan(old_rating) else old_rating)
+            self.popularity[row] = popularity_score(meta) + views_part
+        return row
+
+    # -------------------- DẠNG LƯU TRỮ --------------------
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Các mảng numpy (chuỗi dạng unicode cố định) để ghi vào artifact gọn.
+        """
+        moods_indptr = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        moods_values: List[str] = []
+        for row in range(len(self.ids)):
+            moods_values.extend(self.payload(str(self.ids[row]))["moods"])
+            moods_indptr[row + 1] = len(moods_values)
+
+        return {
+            "catalog_ids": np.asarray([str(m) for m in self.ids.tolist()], dtype=str),
+            "catalog_titles": np.asarray([str(t) for t in self.titles.tolist()], dtype=str),
+            "catalog_posters": np.asarray([str(p) for p in self.posters.tolist()], dtype=str),
+            "catalog_genres": np.asarray([str(g) for g in self.genres.tolist()], dtype=str),
+            "catalog_moods_indptr": moods_indptr,
+            "catalog_moods_values": np.asarray(moods_values, dtype=str),
+            "catalog_ratings": np.asarray(self.ratings, dtype=np.float64),
+            "catalog_available": np.asarray(self.available, dtype=bool),
+            "catalog_popularity": np.asarray(self.popularity, dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "Catalog":
+        return cls(
+            ids=arrays["catalog_ids"],
+            titles=arrays["catalog_titles"],
+            posters=arrays["catalog_posters"],
+            genres=arrays["catalog_genres"],
+            moods_indptr=arrays["catalog_moods_indptr"],
+            moods_values=arrays["catalog_moods_values"],
+            ratings=arrays["catalog_ratings"],
+            available=arrays["catalog_available"],
+            popularity=arrays["catalog_popularity"],
+        )
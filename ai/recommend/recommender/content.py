@@ -0,0 +1,76 @@
+from typing import List, Optional
+import hashlib
+import numpy as np
+
+
+class ContentIndex:
+    """
+    Ma trận embedding nội dung phim (từ collection movie_embeddings do
+    ai/chatbot/sync_db.py ghi), đã L2-normalize sẵn:
+
+    - movie_ids: row -> movie_id (cùng kiểu id với recommender: field `id` của movies)
+    - matrix   : (n_movies, dim) float32, mỗi hàng có norm = 1
+
+    Phủ cả những phim chưa có tương tác nào (không có trong movie2idx).
+    """
+
+    def __init__(self, movie_ids: List[str], vectors: np.ndarray) -> None:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        self.movie_ids: List[str] = list(movie_ids)
+        self.matrix: np.ndarray = matrix / norms
+        self.row = {mid: i for i, mid in enumerate(self.movie_ids)}
+
+        digest = hashlib.sha1("\n".join(self.movie_ids).encode("utf-8"))
+        digest.update(self.matrix.tobytes())
+        self.version = digest.hexdigest()[:12]
+
+    def __len__(self) -> int:
+        return len(self.movie_ids)
+
+    @classmethod
+    def from_mongo(cls, db) -> Optional["ContentIndex"]:
+        """
+        Đọc movie_embeddings từ Mongo. movie_embeddings.movie_id là _id của movies
+        nên map qua movies._id -> movies.id.
+        """
+        id_by_oid = {
+            doc["_id"]: doc.get("id")
+            for doc in db.movies.find({}, {"_id": 1, "id": 1})
+        }
+
+        movie_ids: List[str] = []
+        vectors: List[List[float]] = []
+        for doc in db.movie_embeddings.find({}, {"_id": 0, "movie_id": 1, "vector_embedding": 1}):
+            mid = id_by_oid.get(doc.get("movie_id"))
+            vector = doc.get("vector_embedding")
+            if not mid or not vector:
+                continue
+            if vectors and len(vector) != len(vectors[0]):
+                # embedding của model khác (khác số chiều) -> bỏ qua
+                continue
+            movie_ids.append(str(mid))
+            vectors.append(vector)
+
+        if not movie_ids:
+            print("⚠ Không có movie_embeddings nào map được sang phim → bỏ qua content-based")
+            return None
+
+        print(f"🔹 Load content embeddings: {len(movie_ids)} phim, dim={len(vectors[0])}")
+        return cls(movie_ids, np.asarray(vectors, dtype=np.float32))
+
+    def user_profiles(self, rows_per_user: List[np.ndarray]) -> np.ndarray:
+        """
+        Vector profile cho từng user = trung bình embedding các phim seed, normalize lại.
+        User không có seed nào được embed -> vector 0 (điểm content = 0).
+        """
+        profiles = np.zeros((len(rows_per_user), self.matrix.shape[1]), dtype=np.float32)
+        for i, rows in enumerate(rows_per_user):
+            if len(rows):
+                profiles[i] = self.matrix[rows].mean(axis=0)
+
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return profiles / norms
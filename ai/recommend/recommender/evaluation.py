@@ -0,0 +1,234 @@
+from typing import List, Dict, Any, Optional, Set, Tuple
+from datetime import datetime, timedelta
+import contextlib
+import io
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+
+try:
+    import resource  # chỉ có trên Linux / macOS
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+
+# -------------------- DỮ LIỆU GIẢ LẬP --------------------
+def generate_synthetic_data(
+    out_dir: str,
+    n_users: int = 1000,
+    n_items: int = 500,
+    interactions_per_user: int = 20,
+    n_clusters: int = 20,
+    favorite_ratio: float = 0.3,
+    seed: int = 42,
+) -> Dict[str, str]:
+    """
+    Sinh 3 CSV cùng schema với dữ liệu export từ Mongo (movies, favorites, watchhistories).
+
+    - Mỗi phim thuộc 1 cụm thể loại, độ phổ biến theo phân phối Zipf
+    - Mỗi user thích 1-2 cụm, ~80% tương tác rơi vào cụm yêu thích
+      => CF có tín hiệu thật để đo recall / NDCG
+    - Thời điểm tương tác rải trong 180 ngày để chia train/test theo thời gian
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    item_cluster = rng.integers(0, n_clusters, size=n_items)
+    popularity = 1.0 / np.arange(1, n_items + 1) ** 0.8
+    rng.shuffle(popularity)
+
+    cluster_items = [np.flatnonzero(item_cluster == c) for c in range(n_clusters)]
+    cluster_probs = [
+        popularity[items] / popularity[items].sum() if len(items) else None
+        for items in cluster_items
+    ]
+    global_probs = popularity / popularity.sum()
+
+    movie_ids = [f"movie-{i}" for i in range(n_items)]
+    movies = pd.DataFrame({
+        "id": movie_ids,
+        "slug": movie_ids,
+        "title": [f"Movie {i}" for i in range(n_items)],
+        "rating": np.round(rng.uniform(2.5, 5.0, size=n_items), 1),
+        "poster": [f"/posters/{mid}.jpg" for mid in movie_ids],
+        "tags[0]": [f"genre-{c}" for c in item_cluster],
+        "moods[0]": [f"mood-{c % 5}" for c in item_cluster],
+        "view_count": (popularity * 100000).astype(int),
+    })
+
+    start = datetime(2025, 1, 1)
+    rows: List[Tuple[str, str, datetime, bool]] = []
+    for u in range(n_users):
+        uid = f"user-{u}"
+        liked = rng.choice(n_clusters, size=rng.integers(1, 3), replace=False)
+        n = max(1, int(rng.poisson(interactions_per_user)))
+        for _ in range(n):
+            if rng.random() < 0.8:
+                c = int(rng.choice(liked))
+                if cluster_probs[c] is None:
+                    continue
+                item = int(rng.choice(cluster_items[c], p=cluster_probs[c]))
+            else:
+                item = int(rng.choice(n_items, p=global_probs))
+            ts = start + timedelta(seconds=int(rng.integers(0, 180 * 24 * 3600)))
+            rows.append((uid, movie_ids[item], ts, bool(rng.random() < favorite_ratio)))
+
+    inter = pd.DataFrame(rows, columns=["user_id", "movie_id", "ts", "is_favorite"])
+    inter = inter.drop_duplicates(["user_id", "movie_id", "is_favorite"])
+
+    favorites = inter[inter["is_favorite"]].rename(columns={"ts": "createdAt"})
+    watch = inter[~inter["is_favorite"]].rename(columns={"ts": "last_watched_at"})
+    watch = watch.assign(createdAt=watch["last_watched_at"])
+
+    paths = {
+        "movies": os.path.join(out_dir, "lumi_ai.movies.csv"),
+        "favorites": os.path.join(out_dir, "lumi_ai.favorites.csv"),
+        "watch": os.path.join(out_dir, "lumi_ai.watchhistories.csv"),
+    }
+    movies.to_csv(paths["movies"], index=False)
+    favorites[["user_id", "movie_id", "createdAt"]].to_csv(paths["favorites"], index=False)
+    watch[["user_id", "movie_id", "last_watched_at", "createdAt"]].to_csv(paths["watch"], index=False)
+    return paths
+
+
+# -------------------- CHIA TRAIN / TEST THEO THỜI GIAN --------------------
+def time_split(
+    favorites_csv: str,
+    watch_csv: str,
+    out_dir: str,
+    test_ratio: float = 0.2,
+) -> Tuple[Dict[str, str], Dict[str, Set[str]]]:
+    """
+    Chia favorites + watchhistories theo 1 mốc thời gian chung:
+    (1 - test_ratio) tương tác cũ nhất -> train, phần còn lại -> test.
+
+    Trả về (đường dẫn 2 CSV train, test = user_id -> set movie_id mới chưa có trong train).
+    """
+    favorites = pd.read_csv(favorites_csv)
+    watch = pd.read_csv(watch_csv)
+
+    fav_ts = pd.to_datetime(favorites.get("createdAt"), errors="coerce", utc=True)
+    watch_ts = pd.to_datetime(
+        watch.get("last_watched_at", watch.get("createdAt")), errors="coerce", utc=True
+    )
+
+    all_ts = pd.concat([fav_ts, watch_ts]).dropna()
+    cutoff = all_ts.quantile(1.0 - test_ratio)
+
+    fav_train, fav_test = favorites[~(fav_ts > cutoff)], favorites[fav_ts > cutoff]
+    watch_train, watch_test = watch[~(watch_ts > cutoff)], watch[watch_ts > cutoff]
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        "favorites": os.path.join(out_dir, "train.favorites.csv"),
+        "watch": os.path.join(out_dir, "train.watchhistories.csv"),
+    }
+    fav_train.to_csv(paths["favorites"], index=False)
+    watch_train.to_csv(paths["watch"], index=False)
+
+    seen: Dict[str, Set[str]] = {}
+    for df in (fav_train, watch_train):
+        for uid, mid in zip(df["user_id"].astype(str), df["movie_id"].astype(str)):
+            seen.setdefault(uid, set()).add(mid)
+
+    test: Dict[str, Set[str]] = {}
+    for df in (fav_test, watch_test):
+        for uid, mid in zip(df["user_id"].astype(str), df["movie_id"].astype(str)):
+            if mid not in seen.get(uid, set()):
+                test.setdefault(uid, set()).add(mid)
+
+    return paths, test
+
+
+# -------------------- METRIC --------------------
+def recall_at_k(recommended: List[str], relevant: Set[str], k: int) -> float:
+    if not relevant:
+        return 0.0
+    hits = sum(1 for mid in recommended[:k] if mid in relevant)
+    return hits / min(len(relevant), k)
+
+
+def ndcg_at_k(recommended: List[str], relevant: Set[str], k: int) -> float:
+    if not relevant:
+        return 0.0
+    dcg = sum(
+        1.0 / math.log2(rank + 2)
+        for rank, mid in enumerate(recommended[:k])
+        if mid in relevant
+    )
+    ideal = sum(1.0 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return dcg / ideal
+
+
+def evaluate_service(service, test: Dict[str, Set[str]], k: int = 10, chunk_size: int = 512) -> Dict[str, Any]:
+    """
+    recall@k / NDCG@k trung bình trên các user có ít nhất 1 phim trong tập test.
+    Dùng recommend_for_users (cùng kết quả với recommend_for_user, nhanh hơn).
+    """
+    user_ids = sorted(test)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = service.recommend_for_users(user_ids, top_k=k, chunk_size=chunk_size)
+
+    recalls, ndcgs = [], []
+    for uid in user_ids:
+        recommended = [item["id"] for item in results.get(uid, [])]
+        recalls.append(recall_at_k(recommended, test[uid], k))
+        ndcgs.append(ndcg_at_k(recommended, test[uid], k))
+
+    return {
+        "users": len(user_ids),
+        f"recall@{k}": float(np.mean(recalls)) if recalls else 0.0,
+        f"ndcg@{k}": float(np.mean(ndcgs)) if ndcgs else 0.0,
+    }
+
+
+# -------------------- ĐO THỜI GIAN / BỘ NHỚ --------------------
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak RSS của process hiện tại (MB). None nếu hệ điều hành không hỗ trợ.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả KB, macOS trả byte
+    return peak / (1024 * 1024) if peak > 1 << 32 else peak / 1024
+
+
+def time_call(fn, *args, **kwargs) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def latency_stats(service, user_ids: List[str], k: int = 10) -> Dict[str, float]:
+    """
+    Đo latency recommend_for_user từng user (ms): mean / p50 / p95 / p99.
+    """
+    timings = []
+    for uid in user_ids:
+        _, seconds = time_call(service.recommend_for_user, uid, k)
+        timings.append(seconds * 1000.0)
+
+    if not timings:
+        return {}
+    arr = np.asarray(timings)
+    return {
+        "calls": len(timings),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+    }
+
+
+def artifact_size_bytes(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(path, name))
+            for name in os.listdir(path)
+            if os.path.isfile(os.path.join(path, name))
+        )
+    return os.path.getsize(path)
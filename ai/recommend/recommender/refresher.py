@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from .catalog import MOVIE_META_FIELDS, movie_meta_from_mongo
+
+
+class MovieMetaRefresher:
+    """
+    Đồng bộ metadata phim (ẩn / hiện, sửa tiêu đề, poster, rating...) từ collection
+    movies vào service đang chạy, KHÔNG retrain:
+
+    - Mỗi lần poll chỉ đọc các phim có updatedAt > mốc lần trước, chỉ project
+      các field catalog cần (MOVIE_META_FIELDS)
+    - Gọi service.update_movies_meta -> sửa tại chỗ mask còn tồn tại, payload kết quả,
+      bảng xếp hạng độ hot; similarity / hàng xóm giữ nguyên
+
+    Lần poll đầu (since=None) đọc toàn bộ movies để bắt kịp thay đổi sau lúc train.
+    """
+
+    def __init__(self, since: Optional[datetime] = None) -> None:
+        self.since = since
+        self.updated = 0
+        self.last_poll_at: Optional[datetime] = None
+
+    def poll(self, db, service) -> int:
+        query: Dict[str, Any] = {"updatedAt": {"$gt": self.since}} if self.since else {}
+        projection = {"_id": 0, **{field: 1 for field in MOVIE_META_FIELDS}}
+
+        updates: Dict[str, Dict[str, Any]] = {}
+        latest = self.since
+        for doc in db.movies.find(query, projection):
+            mid = doc.get("id")
+            if not mid:
+                continue
+            updates[str(mid)] = movie_meta_from_mongo(doc)
+            updated_at = doc.get("updatedAt")
+            if isinstance(updated_at, datetime) and (latest is None or updated_at > latest):
+                latest = updated_at
+
+        if updates:
+            service.update_movies_meta(updates)
+            print(f"🔄 Cập nhật metadata {len(updates)} phim (không retrain)")
+
+        self.since = latest
+        self.updated += len(updates)
+        self.last_poll_at = datetime.now()
+        return len(updates)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "since": self.since.isoformat() if self.since else None,
+            "updated": self.updated,
+            "last_poll_at": self.last_poll_at.isoformat(timespec="seconds") if self.last_poll_at else None,
+        }
@@ -1,8 +1,78 @@
-from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from functools import wraps
+from typing import List, Dict, Any, Optional, Iterable, Iterator
+import itertools
 import os
-import math
+import threading
 import joblib
 import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from .als import fold_in_user
+from .artifact import is_compact_artifact, load_compact_artifact
+from .catalog import Catalog
+from .content import ContentIndex
+from .trending import TrendingStore
+
+
+class _ReadWriteLock:
+    """
+    Nhiều request đọc song song, cập nhật catalog (thread refresher) chạy 1 mình:
+
+    - read(): chờ nếu đang / sắp có writer (writer không bị đói), lồng nhau được trong 1 thread
+    - write(): chờ hết reader đang chạy; thread đang giữ write gọi read() không bị khoá
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        depth = getattr(self._local, "depth", 0)
+        owns = depth == 0 and self._writer != threading.get_ident()
+        if owns:
+            with self._cond:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            if owns:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = None
+                self._cond.notify_all()
+
+
+def _reads_catalog(method):
+    # đọc catalog / mảng theo index CF -> không chạy xen với update_movies_meta
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._catalog_lock.read():
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class RecommendationService:
@@ -10,6 +80,11 @@ class RecommendationService:
     Service gom toàn bộ logic gợi ý phim cho user.
     """
 
+    # số phim hàng xóm tính sẵn cho mỗi phim (dùng cho /ai/similar)
+    NEIGHBORS_TOP_N = 50
+    # số hàng item xử lý mỗi lần khi tính hàng xóm (chặn bộ nhớ block x n_items)
+    NEIGHBORS_BLOCK_SIZE = 1024
+
     def __init__(
         self,
         model_path: Optional[str] = None,
@@ -21,13 +96,22 @@ class RecommendationService:
         user_favorites: Optional[Dict[str, List[str]]] = None,
     ) -> None:
 
+        # catalog + mảng theo index CF đổi khi refresher cập nhật metadata -> khoá đọc / ghi
+        self._catalog_lock = _ReadWriteLock()
+
         # Trường hợp đang dùng trong api_main: truyền mỗi model_path
         if model_path is not None and movies_meta is None and movie2idx is None and idx2movie is None:
-            if not os.path.isfile(model_path):
+            if not os.path.exists(model_path):
                 raise FileNotFoundError(f"❌ Không tìm thấy model: {model_path}")
 
             print(f"🔹 Load recommender model từ: {model_path}")
-            data = joblib.load(model_path)
+            if is_compact_artifact(model_path):
+                # artifact gọn (.npz / thư mục .npy): mảng + CSR, catalog đã làm phẳng sẵn
+                data = load_compact_artifact(model_path)
+                self.catalog: Catalog = data["catalog"]
+            else:
+                data = joblib.load(model_path)
+                self.catalog = Catalog.from_meta(data.get("movies_meta", {}))
 
             # ⚠️ Nếu train_recommender lưu key khác thì sửa tên key ở đây
             self.movies_meta: Dict[str, Dict[str, Any]] = data.get("movies_meta", {})
@@ -37,8 +121,19 @@ class RecommendationService:
             self.user_items: Dict[str, List[int]] = data.get("user_items", {})
             self.user_favorites: Dict[str, List[str]] = data.get("user_favorites", {})
 
+            # loại model: "item_cosine" (artifact cũ không có key này) hoặc "als"
+            self.model_type: str = data.get("model_type", "item_cosine")
+            self.user2idx: Dict[str, int] = data.get("user2idx", {})
+            self.user_factors: Optional[np.ndarray] = data.get("user_factors", None)
+            self.item_factors: Optional[np.ndarray] = data.get("item_factors", None)
+            self.als_params: Dict[str, Any] = data.get("als_params", {})
+
+            # version của model: artifact cũ không có thì lấy theo mtime + size file
+            stat = os.stat(model_path)
+            self.model_version: str = data.get("model_version") or f"{int(stat.st_mtime)}-{stat.st_size}"
+
             print(
-                f"   ✅ movies_meta: {len(self.movies_meta)} phim, "
+                f"   ✅ model_type={self.model_type}, catalog: {len(self.catalog)} phim, "
                 f"len(movie2idx)={len(self.movie2idx)}, "
                 f"len(user_items)={len(self.user_items)}, "
                 f"len(user_favorites)={len(self.user_favorites)}"
@@ -47,107 +142,556 @@ class RecommendationService:
         else:
             # Trường hợp inject thủ công
             self.movies_meta = movies_meta or {}
+            self.catalog = Catalog.from_meta(self.movies_meta)
             self.movie2idx = movie2idx or {}
             self.idx2movie = idx2movie or {}
             self.similarity = similarity
             self.user_items = user_items or {}
             self.user_favorites = user_favorites or {}
+            self.model_version = "in-memory"
+            self.model_type = "item_cosine"
+            self.user2idx = {}
+            self.user_factors = None
+            self.item_factors = None
+            self.als_params = {}
+
+        # ALS: tính sẵn YᵀY để fold-in user không có trong lúc train
+        self._item_gram: Optional[np.ndarray] = None
+        if self.model_type == "als" and self.item_factors is not None:
+            self._item_gram = self.item_factors.T @ self.item_factors
+
+        # Content-based (embedding phim) — gắn sau bằng attach_content_index
+        self.content_index: Optional[ContentIndex] = None
+        self.content_weight: float = 0.0
+        self.base_model_version: str = self.model_version
+
+        # Tăng mỗi lần update_movies_meta (ẩn / hiện / sửa phim) -> ETag, cache HTTP đổi theo
+        self.meta_version: int = 0
+
+        # Trending theo cửa sổ trượt — gắn sau bằng attach_trending
+        self.trending: Optional[TrendingStore] = None
+        self.trending_window: str = "day"
+
+        # Tính sẵn bảng xếp hạng độ hot cho guest / fallback
+        self._build_popularity_index()
+        # Tính sẵn mask phim còn tồn tại theo index CF
+        self._build_item_index()
+        # Tính sẵn top-N phim hàng xóm của từng phim (CF)
+        self._build_neighbors()
 
     # -------------------- CHECK PHIM CÒN TỒN TẠI / ACTIVE --------------------
     def _is_movie_available(self, movie_id: str) -> bool:
         """
-        Trả về True nếu phim còn tồn tại để gợi ý.
+        Trả về True nếu phim còn tồn tại để gợi ý (mask tính sẵn trong catalog,
+        xem catalog.movie_available).
+        """
+        return self.catalog.is_available(movie_id)
+
+    # -------------------- HÀM TÍNH ĐIỂM POPULARITY --------------------
+    def _score_by_rating_and_views(self, mid: str) -> float:
+        """
+        Điểm kết hợp RATING + VIEW_COUNT (tính sẵn trong catalog, xem catalog.popularity_score).
+        """
+        row = self.catalog.row.get(mid)
+        return float(self.catalog.popularity[row]) if row is not None else 0.0
 
-        Hiện tại:
-        - Nếu không có trong movies_meta -> coi như không tồn tại.
-        - Nếu sau này bạn có field 'is_deleted' hoặc 'status' thì check thêm ở đây.
+    # -------------------- BẢNG XẾP HẠNG ĐỘ HOT (TÍNH SẴN) --------------------
+    def _build_popularity_index(self) -> None:
         """
-        meta = self.movies_meta.get(movie_id)
-        if not meta:
-            return False
+        Tính sẵn 1 lần khi load model (và mỗi khi metadata phim đổi):
+        - popular_movie_ids: toàn bộ movie_id sắp theo rating + lượt xem giảm dần
+        - popular_available: mask phim còn tồn tại, cùng thứ tự với popular_movie_ids
 
-        # Nếu sau này bạn thêm cờ xóa mềm trong DB/model thì bật logic này:
-        if meta.get("is_deleted") is True:
-            return False
+        Guest và fallback chỉ việc duyệt từ đầu mảng, không phải sort lại cả catalog.
+        """
+        scores = np.asarray(self.catalog.popularity, dtype=float)
 
-        if meta.get("status") in {"deleted", "inactive"}:
-            return False
+        # stable + điểm âm => giữ đúng thứ tự như list.sort(reverse=True) trước đây
+        order = np.argsort(-scores, kind="stable")
+        self._catalog_ids = np.asarray(self.catalog.ids.tolist(), dtype=object)
+        self.popular_movie_ids = self._catalog_ids[order]
+        self.popular_available = np.asarray(self.catalog.available, dtype=bool)[order]
+        self._popular_ranked: List[str] = self.popular_movie_ids[self.popular_available].tolist()
 
-        return True
+    def update_movies_meta(
+        self,
+        updates: Dict[str, Dict[str, Any]],
+        replace: bool = False,
+    ) -> None:
+        """
+        Cập nhật metadata phim (catalog) rồi tính lại bảng xếp hạng độ hot + mask CF.
+        Không đụng tới similarity / ALS factors / hàng xóm tính sẵn.
 
-    # -------------------- HÀM TÍNH ĐIỂM POPULARITY --------------------
-    def _score_by_rating_and_views(self, mid: str) -> float:
+        - replace=False: chỉ ghi đè các movie_id có trong updates
+          (chỉ sửa mask CF của đúng các phim đó nếu catalog không thêm phim mới)
+        - replace=True : thay toàn bộ movies_meta
         """
-        Tính điểm kết hợp RATING + VIEW_COUNT cho 1 movie_id.
-        - rating: [0,5] (ưu tiên chính)
-        - views: scale log để tránh phim quá lớn đè hết.
+        with self._catalog_lock.write():
+            self._update_movies_meta(updates, replace)
+
+    def reading(self):
         """
-        meta = self.movies_meta.get(mid, {})
+        Khoá đọc cho code ngoài service đọc trực tiếp catalog (vd api_main render payload).
+        """
+        return self._catalog_lock.read()
 
-        # rating
-        r = meta.get("rating")
-        try:
-            rating = float(r) if r is not None else 0.0
-        except (TypeError, ValueError):
-            rating = 0.0
-
-        # views: thử nhiều field khác nhau
-        view_raw = (
-            meta.get("view_count")
-            or meta.get("views")
-            or meta.get("totalViews")
-            or meta.get("watch_count")
-            or 0
+    def _update_movies_meta(self, updates: Dict[str, Dict[str, Any]], replace: bool) -> None:
+        grew = replace or any(mid not in self.catalog for mid in updates)
+        if replace:
+            self.movies_meta = dict(updates)
+            self.catalog = Catalog.from_meta(self.movies_meta)
+        else:
+            self.movies_meta.update(updates)
+            for mid, meta in updates.items():
+                self.catalog.upsert(mid, meta)
+        self._build_popularity_index()
+
+        if grew:
+            self._build_item_index()
+        else:
+            for mid in updates:
+                idx = self.movie2idx.get(mid)
+                if idx is not None and 0 <= idx < len(self.item_available):
+                    self.item_available[idx] = self._is_movie_available(mid)
+        self.meta_version += 1
+
+    def _popular_movie_ids(self, limit: int, exclude: Optional[set] = None) -> List[str]:
+        """
+        Lấy tối đa `limit` phim hot nhất còn tồn tại, bỏ qua các phim trong `exclude`.
+        """
+        if limit <= 0:
+            return []
+
+        if not exclude and self.trending is None:
+            return self._popular_ranked[:limit]
+
+        # phim đang trending (cửa sổ trượt) trước, rồi tới bảng xếp hạng rating + lượt xem
+        exclude = set(exclude or ())
+        picked: List[str] = []
+        for mid in itertools.chain(self._trending_movie_ids(), self._popular_ranked):
+            if mid in exclude:
+                continue
+            exclude.add(mid)
+            picked.append(mid)
+            if len(picked) >= limit:
+                break
+        return picked
+
+    # -------------------- TRENDING (CỬA SỔ TRƯỢT, CẬP NHẬT LIÊN TỤC) --------------------
+    def attach_trending(self, store: Optional[TrendingStore], window: str = "day") -> None:
+        """
+        Gắn bộ đếm trending: fallback / guest ưu tiên phim đang hot theo lượt xem +
+        yêu thích gần đây, hết thì mới tới điểm tĩnh rating + view_count.
+        store = None -> bỏ trending, chỉ dùng bảng xếp hạng tĩnh như cũ.
+        """
+        self.trending = store
+        self.trending_window = window
+
+    def _trending_movie_ids(self) -> Iterator[str]:
+        """
+        Duyệt lazily bảng xếp hạng trending (đã tính sẵn), chỉ phim còn tồn tại.
+        """
+        if self.trending is None:
+            return
+        for mid, _ in self.trending.ranking(self.trending_window):
+            if self.catalog.is_available(mid):
+                yield mid
+
+    # -------------------- MASK PHIM THEO INDEX CF (TÍNH SẴN) --------------------
+    def _build_item_index(self) -> None:
+        """
+        Chuẩn bị mảng theo index CF (0..n_items-1):
+        - item_movie_ids: index -> movie_id (None nếu không map được)
+        - item_available: True nếu index map được sang phim còn tồn tại
+        """
+        num_items = self._num_items()
+
+        # dựng xong trong biến cục bộ rồi mới gán (không để lộ mảng đang điền dở)
+        item_movie_ids = np.full(num_items, None, dtype=object)
+        item_available = np.zeros(num_items, dtype=bool)
+
+        # index CF -> row trong catalog (-1 nếu phim không có trong catalog)
+        cf_catalog_rows = np.full(num_items, -1, dtype=np.int64)
+
+        for idx, mid in self.idx2movie.items():
+            if 0 <= idx < num_items and mid:
+                item_movie_ids[idx] = mid
+                item_available[idx] = self._is_movie_available(mid)
+                cf_catalog_rows[idx] = self.catalog.row.get(mid, -1)
+
+        self.item_movie_ids = item_movie_ids
+        self.item_available = item_available
+        self._cf_catalog_rows = cf_catalog_rows
+
+        self._build_content_mapping()
+
+    # -------------------- PHIM TƯƠNG TỰ (HÀNG XÓM TÍNH SẴN) --------------------
+    def _build_neighbors(self) -> None:
+        """
+        Tính 1 lần khi load model: với mỗi phim (index CF) giữ top-N phim giống nhất.
+        - item_cosine: theo hàng similarity
+        - als        : cosine giữa các item factors
+        Lưu dạng mảng (n_items, N): neighbor_indices + neighbor_scores (giảm dần).
+        """
+        num_items = self._num_items()
+        top_n = min(self.NEIGHBORS_TOP_N, max(num_items - 1, 0))
+
+        self.neighbor_indices = np.zeros((num_items, top_n), dtype=np.int32)
+        self.neighbor_scores = np.zeros((num_items, top_n), dtype=np.float32)
+        if top_n == 0 or not self._has_cf_model():
+            self.neighbor_indices = self.neighbor_indices[:, :0]
+            self.neighbor_scores = self.neighbor_scores[:, :0]
+            return
+
+        factors = None
+        if self.model_type == "als":
+            norms = np.linalg.norm(self.item_factors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            factors = np.asarray(self.item_factors / norms, dtype=np.float32)
+
+        for start in range(0, num_items, self.NEIGHBORS_BLOCK_SIZE):
+            end = min(start + self.NEIGHBORS_BLOCK_SIZE, num_items)
+            if factors is not None:
+                block = factors[start:end] @ factors.T
+            else:
+                block = self.similarity[start:end]
+                block = block.toarray() if hasattr(block, "toarray") else block
+            block = np.array(block, dtype=np.float32)
+
+            # bỏ chính nó
+            block[np.arange(end - start), np.arange(start, end)] = -np.inf
+
+            top = np.argpartition(-block, top_n - 1, axis=1)[:, :top_n]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            self.neighbor_indices[start:end] = np.take_along_axis(top, order, axis=1)
+            self.neighbor_scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+
+    @_reads_catalog
+    def similar_movies(self, movie_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Phim tương tự 1 phim ("vì bạn đã xem X"), không phụ thuộc user:
+        lấy từ danh sách hàng xóm tính sẵn, lọc theo trạng thái còn tồn tại hiện tại,
+        thiếu thì bù bằng phim hot.
+        """
+        picked: List[str] = []
+        idx = self.movie2idx.get(movie_id)
+        if idx is not None and 0 <= idx < len(self.neighbor_indices):
+            neighbors = self.neighbor_indices[idx]
+            scores = self.neighbor_scores[idx]
+            keep = neighbors[(scores > 0) & self.item_available[neighbors]]
+            picked = self.item_movie_ids[keep[:limit]].tolist()
+
+        if len(picked) < limit:
+            picked.extend(
+                self._popular_movie_ids(limit - len(picked), exclude=set(picked) | {movie_id})
+            )
+
+        return [self._build_result_item(mid) for mid in picked]
+
+    # -------------------- GỢI Ý THEO PHIÊN (PHIM VỪA XEM, KHÔNG RETRAIN) --------------------
+    @_reads_catalog
+    def recommend_for_session(
+        self,
+        user_id: Optional[str],
+        recent_movie_ids: List[str],
+        top_k: int = 10,
+        decay: float = 0.8,
+        session_weight: float = 0.7,
+    ) -> List[Dict[str, Any]]:
+        """
+        Gợi ý theo những phim user vừa xem trong phiên (chưa có trong model đã train):
+
+        1) recent_movie_ids: mới nhất trước, phim thứ i có trọng số decay^i
+        2) Điểm phiên = cộng dồn điểm hàng xóm tính sẵn của từng phim vừa xem x trọng số
+        3) Trộn với profile đã train (CF từ seed của user), cả 2 chuẩn hoá theo max:
+               score = session_weight * phiên + (1 - session_weight) * profile
+        4) Loại phim đã xem / yêu thích / vừa xem + phim không còn tồn tại,
+           thiếu thì bù bằng phim hot
+
+        Chỉ dùng mảng hàng xóm trong RAM: vài phép cộng numpy, không retrain.
+        """
+        user_id = user_id or "__guest__"
+        recent_movie_ids = list(dict.fromkeys(str(mid) for mid in recent_movie_ids if mid))
+        session_weight = min(max(float(session_weight), 0.0), 1.0)
+        num_items = self._num_items()
+
+        # 1-2) điểm phiên từ hàng xóm của các phim vừa xem
+        session_scores = np.zeros(num_items, dtype=float)
+        recent_indices: List[int] = []
+        for pos, mid in enumerate(recent_movie_ids):
+            idx = self.movie2idx.get(mid)
+            if idx is None or not 0 <= idx < len(self.neighbor_indices):
+                continue
+            recent_indices.append(idx)
+            # mỗi hàng neighbor_indices không trùng index -> cộng trực tiếp được
+            neighbors = self.neighbor_indices[idx]
+            session_scores[neighbors] += (decay ** pos) * np.maximum(self.neighbor_scores[idx], 0.0)
+
+        # 3) profile đã train của user
+        seeds = self._valid_seeds(self._seed_indices(user_id), num_items)
+        profile_scores = np.zeros(num_items, dtype=float)
+        if seeds.size and self._has_cf_model():
+            profile_scores = np.maximum(self._cf_scores(user_id, seeds), 0.0)
+
+        scores = np.zeros(num_items, dtype=float)
+        for part, weight in ((session_scores, session_weight), (profile_scores, 1.0 - session_weight)):
+            peak = part.max() if part.size else 0.0
+            if peak > 0:
+                scores += weight * part / peak
+
+        # 4) mask: không có tín hiệu, không còn tồn tại, đã xem / yêu thích, vừa xem
+        scores[scores <= 0] = -np.inf
+        scores[~self.item_available] = -np.inf
+        scores[seeds] = -np.inf
+        scores[recent_indices] = -np.inf
+
+        top = self._top_k_rows(scores[None, :], top_k)[0]
+        final_movie_ids: List[str] = self.item_movie_ids[top].tolist()
+
+        if len(final_movie_ids) < top_k:
+            block_set = set(final_movie_ids) | set(recent_movie_ids)
+            block_set |= {self.idx2movie[idx] for idx in seeds.tolist() if idx in self.idx2movie}
+            final_movie_ids.extend(
+                self._popular_movie_ids(top_k - len(final_movie_ids), exclude=block_set)
+            )
+
+        print(f"⚡ Gợi ý theo phiên cho {user_id} ({len(recent_indices)}/{len(recent_movie_ids)} phim vừa xem có trong model): {final_movie_ids}")
+        return [self._build_result_item(mid) for mid in final_movie_ids]
+
+    # -------------------- CONTENT-BASED (EMBEDDING PHIM) --------------------
+    def attach_content_index(self, content_index: Optional[ContentIndex], weight: float = 0.3) -> None:
+        """
+        Gắn ma trận embedding phim để trộn điểm content với CF:
+
+            score = (1 - weight) * CF (chuẩn hoá theo max của user) + weight * cosine(profile, phim)
+
+        Phim mới chưa có tương tác vẫn được gợi ý nhờ phần content.
+        weight = 0 hoặc content_index = None -> chỉ dùng CF như cũ.
+        """
+        with self._catalog_lock.write():
+            self.content_index = content_index
+            self.content_weight = min(max(float(weight), 0.0), 1.0)
+            self._build_content_mapping()
+
+            # điểm thay đổi => version đổi theo (cache gợi ý dựa vào version)
+            if self._use_hybrid():
+                self.model_version = f"{self.base_model_version}+content-{content_index.version}"
+            else:
+                self.model_version = self.base_model_version
+
+    def _use_hybrid(self) -> bool:
+        return self.content_index is not None and self.content_weight > 0
+
+    def _build_content_mapping(self) -> None:
+        """
+        Map giữa row của content_index và row của catalog (2 chiều).
+        """
+        n_catalog = len(self._catalog_ids)
+        self._catalog_content_rows = np.full(n_catalog, -1, dtype=np.int64)
+        if self.content_index is None:
+            self._content_catalog_rows = np.zeros(0, dtype=np.int64)
+            return
+
+        self._content_catalog_rows = np.fromiter(
+            (self.catalog.row.get(mid, -1) for mid in self.content_index.movie_ids),
+            dtype=np.int64,
+            count=len(self.content_index),
         )
-        try:
-            views = float(view_raw) if view_raw is not None else 0.0
-        except (TypeError, ValueError):
-            views = 0.0
+        valid = np.flatnonzero(self._content_catalog_rows >= 0)
+        self._catalog_content_rows[self._content_catalog_rows[valid]] = valid
 
-        # scale views: dùng log1p để bớt chênh lệch
-        views_score = math.log1p(max(views, 0.0))
+    def _hybrid_scores(self, seeds_per_user: List[np.ndarray], cf_scores: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Điểm trộn CF + content trên toàn bộ catalog, shape (n_users, n_catalog).
+        Phim không có điểm nào / không còn tồn tại / đã là seed -> -inf.
+        """
+        w = self.content_weight
+        n_users = len(seeds_per_user)
+        n_catalog = len(self._catalog_ids)
+
+        scores = np.zeros((n_users, n_catalog))
+        covered = np.zeros(n_catalog, dtype=bool)
+
+        # seed (index CF) -> row catalog
+        seed_rows = [self._cf_catalog_rows[seeds] for seeds in seeds_per_user]
+        seed_rows = [rows[rows >= 0] for rows in seed_rows]
+
+        if cf_scores is not None:
+            items = np.flatnonzero(self._cf_catalog_rows >= 0)
+            cf = cf_scores[:, items]
+            peak = np.abs(cf).max(axis=1, keepdims=True)
+            peak[peak == 0] = 1.0
+            scores[:, self._cf_catalog_rows[items]] += (1.0 - w) * (cf / peak)
+            covered[self._cf_catalog_rows[items]] = True
+
+        content_rows = [self._catalog_content_rows[rows] for rows in seed_rows]
+        profiles = self.content_index.user_profiles([rows[rows >= 0] for rows in content_rows])
+        content_scores = profiles @ self.content_index.matrix.T
+
+        movies = np.flatnonzero(self._content_catalog_rows >= 0)
+        scores[:, self._content_catalog_rows[movies]] += w * content_scores[:, movies]
+        covered[self._content_catalog_rows[movies]] = True
+
+        scores[:, ~(covered & np.asarray(self.catalog.available, dtype=bool))] = -np.inf
+        for row, rows in enumerate(seed_rows):
+            scores[row, rows] = -np.inf
+        return scores
+
+    def _hybrid_top_movie_ids(
+        self,
+        user_ids: List[str],
+        seeds_per_user: List[List[int]],
+        top_k: int,
+    ) -> List[List[str]]:
+        num_items = self._num_items()
+        seeds_arrays = [self._valid_seeds(seeds, num_items) for seeds in seeds_per_user]
+
+        cf_scores = None
+        if self._has_cf_model():
+            cf_scores = self._cf_score_matrix(user_ids, seeds_arrays)
+
+        scores = self._hybrid_scores(seeds_arrays, cf_scores)
+        return [self._catalog_ids[top].tolist() for top in self._top_k_rows(scores, top_k)]
+
+    # -------------------- MODEL CF (ITEM COSINE / ALS) --------------------
+    def _has_cf_model(self) -> bool:
+        if self.model_type == "als":
+            return isinstance(self.item_factors, np.ndarray)
+        return isinstance(self.similarity, np.ndarray) or issparse(self.similarity)
+
+    def _num_items(self) -> int:
+        if self.model_type == "als" and isinstance(self.item_factors, np.ndarray):
+            return self.item_factors.shape[0]
+        if isinstance(self.similarity, np.ndarray) or issparse(self.similarity):
+            return self.similarity.shape[0]
+        return len(self.idx2movie)
+
+    def _user_vector(self, user_id: str, seeds: np.ndarray) -> np.ndarray:
+        """
+        ALS: vector user đã train, hoặc fold-in từ seed nếu user chưa có lúc train.
+        """
+        uidx = self.user2idx.get(user_id)
+        if uidx is not None and self.user_factors is not None and 0 <= uidx < len(self.user_factors):
+            return self.user_factors[uidx]
+
+        return fold_in_user(
+            self.item_factors,
+            seeds,
+            np.ones(len(seeds)),
+            regularization=float(self.als_params.get("regularization", 0.1)),
+            alpha=float(self.als_params.get("alpha", 40.0)),
+            gram=self._item_gram,
+        )
 
-        # trọng số: rating vẫn là chính
-        score = rating * 3.0 + views_score
-        return score
+    @staticmethod
+    def _valid_seeds(seeds: List[int], num_items: int) -> np.ndarray:
+        arr = np.asarray(seeds, dtype=np.int64)
+        return arr[(arr >= 0) & (arr < num_items)]
+
+    def _cf_scores(self, user_id: str, seeds: np.ndarray) -> np.ndarray:
+        """
+        Điểm CF cho toàn bộ item (shape: n_items):
+        - item_cosine: cộng các hàng similarity của seed (1 phép indexed reduction)
+        - als        : user factor · item factors
+        """
+        if self.model_type == "als":
+            return np.asarray(self.item_factors @ self._user_vector(user_id, seeds), dtype=float)
+        if issparse(self.similarity):
+            # similarity top-N (csr): đi chung đường với batch để điểm khớp tuyệt đối
+            return self._cf_score_matrix([user_id], [seeds])[0]
+        return np.asarray(self.similarity[seeds].sum(axis=0), dtype=float).ravel()
+
+    def _cf_score_matrix(self, user_ids: List[str], seeds_per_user: List[np.ndarray]) -> np.ndarray:
+        """
+        Điểm CF (chưa mask) cho nhiều user, shape (n_users, n_items):
+        - item_cosine: ma trận sparse user x seed @ similarity (sparse-dense, hoặc sparse-sparse
+                       nếu similarity là csr top-N)
+        - als        : user factors @ item factorsᵀ
+        """
+        num_items = self._num_items()
+
+        if self.model_type == "als":
+            user_mat = np.zeros((len(user_ids), self.item_factors.shape[1]))
+            for row, (uid, seeds) in enumerate(zip(user_ids, seeds_per_user)):
+                if seeds.size:
+                    user_mat[row] = self._user_vector(uid, seeds)
+            return np.asarray(user_mat @ self.item_factors.T, dtype=float)
+
+        rows = np.repeat(np.arange(len(seeds_per_user)), [len(seeds) for seeds in seeds_per_user])
+        cols = np.concatenate(seeds_per_user) if seeds_per_user else np.zeros(0, dtype=np.int64)
+        seed_mat = csr_matrix(
+            (np.ones(len(rows), dtype=float), (rows, cols)),
+            shape=(len(user_ids), num_items),
+        )
+        scores = seed_mat @ self.similarity
+        if issparse(scores):
+            scores = scores.toarray()
+        return np.asarray(scores, dtype=float)
+
+    @staticmethod
+    def _top_k_rows(scores: np.ndarray, top_k: int) -> List[np.ndarray]:
+        """
+        Top-k cột theo từng hàng (argpartition rồi chỉ sort k phần tử),
+        bỏ các cột -inf. Hoà điểm thì cột nhỏ trước.
+        """
+        n_rows, n_cols = scores.shape
+        k = min(top_k, n_cols)
+        if k <= 0:
+            return [np.zeros(0, dtype=np.int64) for _ in range(n_rows)]
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top.sort(axis=1)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [top[row][np.isfinite(top_scores[row])] for row in range(n_rows)]
+
+    def _cf_candidate_movie_ids(self, user_id: str, seed_indices: List[int], top_k: int) -> List[str]:
+        """
+        Chấm điểm CF bằng numpy, không lặp từng seed / từng phim:
+
+        1) Tính điểm cho toàn bộ item (_cf_scores)
+        2) Loại phim đã xem / yêu thích và phim không còn tồn tại bằng mask
+        3) argpartition lấy top_k rồi chỉ sort top_k đó
+        """
+        seeds = self._valid_seeds(seed_indices, self._num_items())
+        if seeds.size == 0:
+            return []
+
+        scores = self._cf_scores(user_id, seeds)
+
+        # blocked = phim không còn tồn tại + phim đã dùng làm seed
+        scores[~self.item_available] = -np.inf
+        scores[seeds] = -np.inf
+
+        top = self._top_k_rows(scores[None, :], top_k)[0]
+        return self.item_movie_ids[top].tolist()
 
     # -------------------- HÀM BUILD MỘT PHẦN TỬ KẾT QUẢ --------------------
     def _build_result_item(self, movie_id: str) -> Dict[str, Any]:
-        meta = self.movies_meta.get(movie_id)
-        if not meta:
-            # Không có meta -> không nên gọi, raise để dễ debug
-            raise KeyError(f"Movie id {movie_id} không có trong movies_meta")
-
-        poster = (
-            meta.get("poster")
-            or meta.get("thumbnail")
-            or ""
-        )
+        # payload đã làm phẳng sẵn trong catalog (title, poster, genres, moods, rating)
+        return self.catalog.payload(movie_id)
 
-        # moods[0..] -> list moods
-        moods: List[str] = []
-        for key, value in meta.items():
-            if key.startswith("moods[") and isinstance(value, str) and value:
-                moods.append(value)
-
-        # tags[0..] -> genres string
-        tags = [
-            value
-            for key, value in meta.items()
-            if key.startswith("tags[") and isinstance(value, str) and value
-        ]
-        genres = ", ".join(tags)
-
-        return {
-            "id": movie_id,
-            "title": meta.get("title", str(movie_id)),
-            "poster": poster,
-            "moods": moods,
-            "genres": genres,
-            "rating": meta.get("rating", None),
-        }
+    # -------------------- HẠT GIỐNG CỦA 1 USER --------------------
+    def _seed_indices(self, user_id: str) -> List[int]:
+        """
+        seed = union(lịch sử xem, favorites) dưới dạng index CF, đã sort + unique.
+        """
+        seeds = set(self.user_items.get(user_id, []))
+
+        # đổi favorites -> index (nếu có trong movie2idx)
+        for mid in self.user_favorites.get(user_id, []):
+            idx = self.movie2idx.get(mid)
+            if idx is not None:
+                seeds.add(idx)
+
+        return sorted(seeds)
 
     # -------------------- HÀM CHÍNH: GỢI Ý CHO USER --------------------
+    @_reads_catalog
     def recommend_for_user(self, user_id: Optional[str], top_k: int = 10) -> List[Dict[str, Any]]:
         """
         Logic đầy đủ:
@@ -165,8 +709,8 @@ class RecommendationService:
                 -> gợi ý theo độ hot (rating + views)
            - Nếu seed có:
                 -> CASE: có lịch sử xem và/hoặc favorites
-                -> Nếu self.similarity tồn tại:
-                        dùng CF item-item từ seed_indices
+                -> Nếu có model CF (similarity hoặc ALS factors):
+                        dùng CF từ seed_indices
                    Ngược lại:
                         bỏ qua CF, dùng fallback popularity
                 -> Luôn loại bỏ phim đã xem / đã yêu thích khỏi gợi ý.
@@ -175,21 +719,10 @@ class RecommendationService:
         if not user_id:
             user_id = "__guest__"
 
-        # 1. Lấy history & favorites
+        # 1. Lấy history & favorites -> seed = union(history, favorites)
         history_indices = list(set(self.user_items.get(user_id, [])))  # unique index
         fav_movie_ids = self.user_favorites.get(user_id, [])          # list movie_id
-
-        # đổi favorites -> index (nếu có trong movie2idx)
-        fav_indices: List[int] = []
-        for mid in fav_movie_ids:
-            idx = self.movie2idx.get(mid)
-            if idx is not None:
-                fav_indices.append(idx)
-
-        fav_indices = list(set(fav_indices))
-
-        # seed = union(history, favorites)
-        seed_indices: List[int] = sorted(set(history_indices + fav_indices))
+        seed_indices = self._seed_indices(user_id)
 
         # -------------------- BUILD BLOCKLIST (KHÔNG GỢI Ý LẠI) --------------------
         seed_movie_ids = {
@@ -202,15 +735,8 @@ class RecommendationService:
         if not seed_indices:
             print(f"👀 User {user_id} là user mới (không history, không favorites) → gợi ý theo rating + lượt xem")
 
-            # chỉ lấy phim còn tồn tại
-            all_movie_ids = [
-                mid for mid in self.movies_meta.keys()
-                if self._is_movie_available(mid)
-            ]
-
-            # sort toàn bộ theo độ hot
-            all_movie_ids.sort(key=self._score_by_rating_and_views, reverse=True)
-            final_movie_ids = all_movie_ids[:top_k]
+            # lấy thẳng từ bảng xếp hạng đã tính sẵn (chỉ gồm phim còn tồn tại)
+            final_movie_ids = self._popular_movie_ids(top_k)
 
             results = [self._build_result_item(mid) for mid in final_movie_ids]
             print(f"✨ Gợi ý cho {user_id}: {final_movie_ids}")
@@ -222,55 +748,15 @@ class RecommendationService:
             f"và {len(fav_movie_ids)} phim yêu thích → tổng seed: {len(seed_indices)}"
         )
 
-        use_cf = self.similarity is not None and isinstance(self.similarity, np.ndarray)
+        use_cf = self._has_cf_model()
 
         cf_candidate_movie_ids: List[str] = []
 
-        if use_cf:
-            sim = self.similarity
-            num_items = sim.shape[0]
-            scores = np.zeros(num_items, dtype=float)
-
-            # Cộng dồn similarity từ tất cả hạt giống
-            for idx in seed_indices:
-                if 0 <= idx < num_items:
-                    scores += sim[idx]
-
-            # Sắp xếp theo điểm similarity giảm dần
-            candidate_indices = list(np.argsort(scores)[::-1])
-
-            seen_seed_set = set(seed_indices)
-            used_movie_ids: set[str] = set()
-
-            for idx in candidate_indices:
-                # bỏ qua index không hợp lệ
-                if idx < 0 or idx >= num_items:
-                    continue
-
-                # bỏ những phim dùng làm seed (đã xem / đã yêu thích)
-                if idx in seen_seed_set:
-                    continue
-
-                mid = self.idx2movie.get(idx)
-                if not mid:
-                    continue
-
-                # skip phim đã bị xóa / không còn tồn tại
-                if not self._is_movie_available(mid):
-                    continue
-
-                if mid in seed_movie_ids:
-                    # đã nằm trong history hoặc favorites
-                    continue
-
-                if mid in used_movie_ids:
-                    continue
-
-                cf_candidate_movie_ids.append(mid)
-                used_movie_ids.add(mid)
-
-                if len(cf_candidate_movie_ids) >= top_k:
-                    break
+        if self._use_hybrid():
+            # CF + content embedding trên toàn catalog (phủ cả phim mới chưa có tương tác)
+            cf_candidate_movie_ids = self._hybrid_top_movie_ids([user_id], [seed_indices], top_k)[0]
+        elif use_cf:
+            cf_candidate_movie_ids = self._cf_candidate_movie_ids(user_id, seed_indices, top_k)
 
         # -------------------- Fallback: nếu CF không đủ hoặc không có similarity --------------------
         final_movie_ids: List[str] = []
@@ -293,19 +779,10 @@ class RecommendationService:
             # set để tránh trùng lặp
             block_set = set(final_movie_ids) | set(seed_movie_ids)
 
-            all_movie_ids = list(self.movies_meta.keys())
-            cold_candidates = [
-                mid for mid in all_movie_ids
-                if mid not in block_set and self._is_movie_available(mid)
-            ]
-
-            # sort theo độ hot
-            cold_candidates.sort(key=self._score_by_rating_and_views, reverse=True)
-
-            for mid in cold_candidates:
-                final_movie_ids.append(mid)
-                if len(final_movie_ids) >= top_k:
-                    break
+            # bổ sung theo bảng xếp hạng độ hot đã tính sẵn
+            final_movie_ids.extend(
+                self._popular_movie_ids(top_k - len(final_movie_ids), exclude=block_set)
+            )
 
         # -------------------- XÂY KẾT QUẢ --------------------
 
@@ -314,3 +791,74 @@ class RecommendationService:
 
         print(f"✨ Gợi ý cho {user_id}: {final_movie_ids}")
         return results
+
+    # -------------------- GỢI Ý HÀNG LOẠT CHO NHIỀU USER --------------------
+    @_reads_catalog
+    def recommend_for_users(
+        self,
+        user_ids: Iterable[str],
+        top_k: int = 10,
+        chunk_size: int = 512,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Gợi ý cho nhiều user cùng lúc (job đêm, precompute homepage, email...).
+
+        Cho từng chunk `chunk_size` user:
+        1) Dựng ma trận sparse user x seed (1 nếu phim là seed của user)
+        2) scores = seeds @ similarity  (1 phép nhân sparse-dense cho cả chunk)
+           (ALS: scores = user factors @ item factorsᵀ)
+        3) Mask phim không còn tồn tại + phim đã xem / yêu thích
+        4) argpartition theo từng hàng lấy top_k, thiếu thì bù bằng độ hot
+
+        Kết quả giống recommend_for_user nhưng không in log cho từng user.
+        Bộ nhớ bị chặn bởi chunk_size x n_items.
+        """
+        user_ids = [uid or "__guest__" for uid in user_ids]
+        chunk_size = max(1, int(chunk_size))
+        results: Dict[str, List[Dict[str, Any]]] = {}
+
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start : start + chunk_size]
+            for uid, movie_ids in zip(chunk, self._recommend_chunk(chunk, top_k)):
+                results[uid] = [self._build_result_item(mid) for mid in movie_ids]
+
+        print(f"✨ Đã gợi ý hàng loạt cho {len(results)} user (top_k={top_k})")
+        return results
+
+    def _recommend_chunk(self, user_ids: List[str], top_k: int) -> List[List[str]]:
+        """
+        Trả về list movie_id gợi ý cho từng user trong chunk (cùng thứ tự user_ids).
+        """
+        seeds_per_user = [self._seed_indices(uid) for uid in user_ids]
+        cf_ids: List[List[str]] = [[] for _ in user_ids]
+
+        if self._use_hybrid() and any(seeds_per_user):
+            cf_ids = self._hybrid_top_movie_ids(user_ids, seeds_per_user, top_k)
+        elif self._has_cf_model() and any(seeds_per_user):
+            num_items = self._num_items()
+            seeds_arrays = [self._valid_seeds(seeds, num_items) for seeds in seeds_per_user]
+
+            # (n_users, n_items) — 1 phép nhân cho cả chunk
+            scores = self._cf_score_matrix(user_ids, seeds_arrays)
+            scores[:, ~self.item_available] = -np.inf
+            for row, seeds in enumerate(seeds_arrays):
+                scores[row, seeds] = -np.inf
+
+            for row, top in enumerate(self._top_k_rows(scores, top_k)):
+                cf_ids[row] = self.item_movie_ids[top].tolist()
+
+        # user không có seed -> không lấy điểm CF, chỉ dùng độ hot
+        cf_ids = [ids if seeds else [] for ids, seeds in zip(cf_ids, seeds_per_user)]
+
+        final: List[List[str]] = []
+        for seeds, movie_ids in zip(seeds_per_user, cf_ids):
+            movie_ids = list(movie_ids)
+            if len(movie_ids) < top_k:
+                block_set = set(movie_ids) | {
+                    self.idx2movie[idx] for idx in seeds if idx in self.idx2movie
+                }
+                movie_ids.extend(
+                    self._popular_movie_ids(top_k - len(movie_ids), exclude=block_set)
+                )
+            final.append(movie_ids)
+        return final
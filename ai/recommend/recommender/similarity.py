@@ -0,0 +1,82 @@
+from typing import Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
+
+# ma trận item đã normalize, dùng chung cho các worker process (set trong initializer)
+_ITEMS: Optional[csr_matrix] = None
+
+
+def _init_worker(items: csr_matrix) -> None:
+    global _ITEMS
+    _ITEMS = items
+
+
+def _block_topn(start: int, end: int, top_n: int, items: Optional[csr_matrix] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cosine của các item [start, end) với toàn bộ item, chỉ giữ top_n > 0 mỗi hàng
+    (không tính chính nó: đủ top_n hàng xóm thật, giống đường dense).
+    Trả về (rows, cols, values) dạng COO.
+    """
+    items = items if items is not None else _ITEMS
+    block = (items[start:end] @ items.T).toarray()  # (end - start, n_items)
+    block[np.arange(end - start), np.arange(start, end)] = 0.0
+
+    n_items = block.shape[1]
+    k = min(top_n, n_items)
+    top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(block, top, axis=1)
+
+    keep = values > 0
+    rows = np.repeat(np.arange(start, end), k).reshape(end - start, k)[keep]
+    return rows.astype(np.int32), top[keep].astype(np.int32), values[keep].astype(np.float32)
+
+
+def blocked_topn_similarity(
+    user_item_mat: csr_matrix,
+    top_n: int = 100,
+    block_size: int = 1024,
+    n_jobs: Optional[int] = None,
+    executor: str = "process",
+) -> csr_matrix:
+    """
+    Cosine item-item song song theo block, giữ top_n hàng xóm mỗi item:
+
+    1) L2-normalize cột item 1 lần -> tích vô hướng = cosine
+    2) Chia item thành các block hàng, mỗi block tính tích sparse với toàn bộ item
+       trong pool (process hoặc thread), rút về top_n ngay trong worker
+    3) Gộp các block thành 1 csr_matrix (n_items, n_items)
+
+    Bộ nhớ đỉnh ~ block_size x n_items (x số worker) thay vì n_items².
+    """
+    items = normalize(csr_matrix(user_item_mat, dtype=np.float64).T.tocsr(), norm="l2", axis=1)
+    n_items = items.shape[0]
+    n_jobs = n_jobs or os.cpu_count() or 1
+    block_size = max(1, int(block_size))
+    starts = list(range(0, n_items, block_size))
+
+    print(
+        f"🔹 Similarity song song: {n_items} item, top_n={top_n}, "
+        f"block_size={block_size}, {n_jobs} {executor} worker"
+    )
+
+    if n_jobs == 1 or len(starts) == 1:
+        parts = [_block_topn(s, min(s + block_size, n_items), top_n, items) for s in starts]
+    elif executor == "thread":
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            parts = list(pool.map(
+                lambda s: _block_topn(s, min(s + block_size, n_items), top_n, items),
+                starts,
+            ))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(items,)) as pool:
+            futures = [pool.submit(_block_topn, s, min(s + block_size, n_items), top_n) for s in starts]
+            parts = [f.result() for f in futures]
+
+    rows = np.concatenate([p[0] for p in parts]) if parts else np.zeros(0, dtype=np.int32)
+    cols = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0, dtype=np.int32)
+    values = np.concatenate([p[2] for p in parts]) if parts else np.zeros(0, dtype=np.float32)
+
+    return csr_matrix((values, (rows, cols)), shape=(n_items, n_items))
@@ -1,10 +1,17 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import hashlib
 import numpy as np
+import pandas as pd
 import joblib
 from scipy.sparse import csr_matrix
 from sklearn.metrics.pairwise import cosine_similarity
 
 from .data_loader import load_movies, build_interactions
+from .als import train_als
+from .similarity import blocked_topn_similarity
+from .artifact import is_compact_artifact, save_compact_artifact
+
+MODEL_TYPES = ("item_cosine", "als")
 
 
 def train_recommender(
@@ -12,13 +19,34 @@ def train_recommender(
     favorites_csv: str,
     watch_csv: str,
     model_output: str,
+    model_type: str = "item_cosine",
+    als_factors: int = 64,
+    als_regularization: float = 0.1,
+    als_alpha: float = 40.0,
+    als_iterations: int = 15,
+    n_jobs: Optional[int] = None,
+    similarity_top_n: Optional[int] = None,
+    similarity_block_size: int = 1024,
+    similarity_executor: str = "process",
 ) -> None:
     """
-    Train mô hình gợi ý item-item:
+    Train mô hình gợi ý:
 
     - Input: 3 CSV (movies, favorites, watchhistories)
     - Output: 1 file model `recommender.joblib`
+      (model_output là `.npz` hoặc thư mục -> artifact gọn dạng mảng numpy + CSR)
+
+    model_type:
+    - "item_cosine": cosine item-item (ma trận n_items x n_items)
+    - "als"        : implicit ALS, lưu user factors + item factors
+                     (kích thước / chi phí gợi ý tuyến tính theo factors x items)
+
+    similarity_top_n (item_cosine): None -> ma trận cosine đầy đủ như cũ;
+    > 0 -> tính song song theo block (n_jobs worker, similarity_block_size item / block),
+    chỉ giữ top-N hàng xóm mỗi phim, lưu dạng csr (bộ nhớ ~ n_items x N thay vì n_items²).
     """
+    if model_type not in MODEL_TYPES:
+        raise ValueError(f"model_type phải là 1 trong {MODEL_TYPES}, nhận: {model_type}")
 
     # 1. Load dữ liệu
     movies = load_movies(movies_csv)
@@ -42,12 +70,45 @@ def train_recommender(
         shape=(len(unique_users), len(unique_movies)),
     )
 
-    # 4. Item vectors = từng cột (movie) trong user_item_mat
-    # Ma trận (n_items, n_users)
-    item_matrix = user_item_mat.T
+    model_fields: Dict[str, Any] = {"model_type": model_type}
 
-    # 5. Tính cosine similarity giữa các item
-    similarity = cosine_similarity(item_matrix)  # shape: (n_items, n_items)
+    if model_type == "als":
+        # 4-5. Phân rã ma trận user-item (implicit ALS) thay cho cosine item-item
+        print(f"🔹 Train ALS (factors={als_factors}, iterations={als_iterations})...")
+        user_factors, item_factors = train_als(
+            user_item_mat,
+            factors=als_factors,
+            regularization=als_regularization,
+            alpha=als_alpha,
+            iterations=als_iterations,
+            n_jobs=n_jobs,
+        )
+        model_fields.update({
+            "user_factors": user_factors.astype(np.float32),
+            "item_factors": item_factors.astype(np.float32),
+            "als_params": {
+                "factors": als_factors,
+                "regularization": als_regularization,
+                "alpha": als_alpha,
+            },
+        })
+    else:
+        # 4. Item vectors = từng cột (movie) trong user_item_mat
+        # Ma trận (n_items, n_users)
+        item_matrix = user_item_mat.T
+
+        # 5. Tính cosine similarity giữa các item
+        if similarity_top_n:
+            similarity = blocked_topn_similarity(
+                user_item_mat,
+                top_n=similarity_top_n,
+                block_size=similarity_block_size,
+                n_jobs=n_jobs,
+                executor=similarity_executor,
+            )  # csr (n_items, n_items), tối đa top_n phần tử / hàng
+        else:
+            similarity = cosine_similarity(item_matrix)  # shape: (n_items, n_items)
+        model_fields["similarity"] = similarity
 
     # 6. Chuẩn bị dict: user_id -> list index phim đã xem
     user_items: Dict[str, Any] = {}
@@ -58,15 +119,34 @@ def train_recommender(
     # 7. Chuẩn bị metadata phim (key = movie_id)
     movies_meta = movies.set_index("movie_id").to_dict(orient="index")
 
-    # 8. Đóng gói tất cả vào artifact
+    # 8. Version theo nội dung dữ liệu: train lại trên data y hệt => cùng version
+    #    (cache gợi ý theo user dựa vào version này để biết khi nào phải bỏ)
+    model_version = _data_version(movies, interactions, model_type)
+
+    # 9. Đóng gói tất cả vào artifact
     artifact: Dict[str, Any] = {
+        "model_version": model_version,
         "user2idx": user2idx,
         "movie2idx": movie2idx,
         "idx2movie": idx2movie,
         "user_items": user_items,
-        "similarity": similarity,
         "movies_meta": movies_meta,
+        **model_fields,
     }
 
-    joblib.dump(artifact, model_output)
-    print(f"✅ Đã lưu model vào: {model_output}")
+    if is_compact_artifact(model_output):
+        save_compact_artifact(model_output, artifact)
+    else:
+        joblib.dump(artifact, model_output)
+    print(f"✅ Đã lưu model vào: {model_output} (version={model_version})")
+
+
+def _data_version(movies: pd.DataFrame, interactions: pd.DataFrame, model_type: str) -> str:
+    """
+    Hash nội dung movies + interactions (+ loại model) thành chuỗi version ngắn.
+    """
+    digest = hashlib.sha1(model_type.encode("utf-8"))
+    for df in (movies, interactions):
+        digest.update(",".join(map(str, df.columns)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df.astype(str), index=False).values.tobytes())
+    return digest.hexdigest()[:16]
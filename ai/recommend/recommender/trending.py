@@ -0,0 +1,241 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
+import math
+import threading
+
+# trọng số sự kiện, cùng tỉ lệ với build_interactions (favorite cao hơn lượt xem)
+EVENT_WEIGHTS = {"watch": 1.0, "favorite": 2.0}
+
+# 1 người xem chỉ tính 1 lượt xem / phim trong mỗi khoảng này (backend cập nhật
+# watchhistories.last_watched_at ~15 giây / lần khi đang phát, không phải mỗi lần là 1 lượt mới)
+VIEW_DEDUPE_SECONDS = 86400
+
+# window -> (độ dài 1 bucket (giây), số bucket trong vòng, half-life (giờ))
+WINDOWS: Dict[str, Tuple[int, int, float]] = {
+    "hour": (3600, 48, 6.0),
+    "day": (86400, 30, 72.0),
+}
+
+
+def _to_timestamp(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            # pymongo trả datetime UTC dạng naive
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return None
+
+
+class _BucketRing:
+    """
+    Vòng n bucket, mỗi bucket = Counter(movie_id -> điểm) của 1 khoảng thời gian.
+    Slot được tái dùng khi thời gian quay hết vòng (reset lazily khi có sự kiện mới).
+    """
+
+    def __init__(self, bucket_seconds: int, n_buckets: int) -> None:
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = n_buckets
+        self.epochs: List[int] = [-1] * n_buckets
+        self.counts: List[Counter] = [Counter() for _ in range(n_buckets)]
+
+    def add(self, movie_id: str, ts: float, weight: float, now: float) -> bool:
+        epoch = int(ts // self.bucket_seconds)
+        current = int(now // self.bucket_seconds)
+        if epoch > current or epoch <= current - self.n_buckets:
+            return False  # ngoài cửa sổ
+
+        slot = epoch % self.n_buckets
+        if self.epochs[slot] != epoch:
+            if self.epochs[slot] > epoch:
+                return False  # slot đã thuộc về bucket mới hơn
+            self.epochs[slot] = epoch
+            self.counts[slot] = Counter()
+        self.counts[slot][movie_id] += weight
+        return True
+
+    def live_buckets(self, now: float):
+        current = int(now // self.bucket_seconds)
+        for slot in range(self.n_buckets):
+            epoch = self.epochs[slot]
+            if current - self.n_buckets < epoch <= current:
+                yield current - epoch, self.counts[slot]
+
+
+class TrendingStore:
+    """
+    Bộ đếm trending trong RAM theo cửa sổ trượt (giờ / ngày):
+
+    - Mỗi sự kiện xem / yêu thích cộng vào bucket tương ứng ở cả 2 vòng: O(1)
+    - Bảng xếp hạng = Σ điểm bucket x 0.5^(tuổi / half-life), tính lại lazily
+      (tối đa 1 lần / refresh_seconds, chỉ khi có sự kiện mới hoặc bucket trôi)
+
+    Thread-safe: poller ghi, request đọc.
+    """
+
+    def __init__(self, refresh_seconds: float = 30.0) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.rings = {name: _BucketRing(size, n) for name, (size, n, _) in WINDOWS.items()}
+        self.events = 0
+        self.last_event_at: Optional[float] = None
+
+        self._lock = threading.Lock()
+        self._dirty = {name: True for name in WINDOWS}
+        self._rankings: Dict[str, List[Tuple[str, float]]] = {name: [] for name in WINDOWS}
+        self._ranked_at: Dict[str, float] = {name: 0.0 for name in WINDOWS}
+        # (người xem, movie_id) -> khoảng VIEW_DEDUPE_SECONDS gần nhất đã tính lượt xem
+        self._views: Dict[Tuple[str, str], int] = {}
+
+    def add_event(self, movie_id: str, kind: str = "watch", at: Any = None, now: Optional[float] = None) -> bool:
+        """
+        Cộng 1 sự kiện (kind: "watch" | "favorite") vào bucket theo thời điểm `at`
+        (datetime / ISO string / epoch giây, mặc định = bây giờ).
+        """
+        if not movie_id:
+            return False
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        ts = _to_timestamp(at)
+        ts = ts if ts is not None else now
+        weight = EVENT_WEIGHTS.get(kind, 1.0)
+
+        with self._lock:
+            added = False
+            for name, ring in self.rings.items():
+                if ring.add(str(movie_id), ts, weight, now):
+                    self._dirty[name] = True
+                    added = True
+            if added:
+                self.events += 1
+                self.last_event_at = max(self.last_event_at or ts, ts)
+            return added
+
+    def ranking(self, window: str = "day", now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        [(movie_id, điểm)] giảm dần, dùng bản tính sẵn nếu chưa hết hạn.
+        """
+        if window not in WINDOWS:
+            raise ValueError(f"window phải là 1 trong {tuple(WINDOWS)}, nhận: {window}")
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+
+        with self._lock:
+            bucket_seconds, _, half_life_hours = WINDOWS[window]
+            # tuổi bucket chỉ đổi khi sang bucket mới; sự kiện mới thì gom tối đa refresh_seconds
+            same_bucket = int(now // bucket_seconds) == int(self._ranked_at[window] // bucket_seconds)
+            stale = now - self._ranked_at[window] >= self.refresh_seconds
+            if same_bucket and not (self._dirty[window] and stale):
+                return self._rankings[window]
+
+            scores: Counter = Counter()
+            half_life_buckets = half_life_hours * 3600.0 / bucket_seconds
+            for age, counts in self.rings[window].live_buckets(now):
+                decay = math.pow(0.5, age / half_life_buckets)
+                for mid, value in counts.items():
+                    scores[mid] += value * decay
+
+            ranking = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+            self._rankings[window] = ranking
+            self._ranked_at[window] = now
+            self._dirty[window] = False
+            return ranking
+
+    def top_movie_ids(self, limit: Optional[int] = None, window: str = "day") -> List[str]:
+        ranking = self.ranking(window)
+        return [mid for mid, _ in (ranking if limit is None else ranking[:limit])]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "last_event_at": (
+                datetime.fromtimestamp(self.last_event_at, timezone.utc).isoformat()
+                if self.last_event_at else None
+            ),
+            "windows": {
+                name: {
+                    "bucket_seconds": size,
+                    "buckets": n,
+                    "half_life_hours": half_life,
+                    "movies": len(self._rankings[name]),
+                }
+                for name, (size, n, half_life) in WINDOWS.items()
+            },
+        }
+
+    def add_view(self, viewer: Optional[str], movie_id: str, at: Any = None, now: Optional[float] = None) -> bool:
+        """
+        Lượt xem của 1 người: chỉ cộng nếu người này chưa được tính cho phim này
+        trong cùng khoảng VIEW_DEDUPE_SECONDS (tua / đồng bộ tiến độ không thành lượt xem mới).
+        viewer=None (không rõ người xem) -> cộng như sự kiện thường.
+        """
+        if not movie_id:
+            return False
+        if viewer is not None:
+            ts = _to_timestamp(at)
+            ts = ts if ts is not None else (now if now is not None else datetime.now(timezone.utc).timestamp())
+            period = int(ts // VIEW_DEDUPE_SECONDS)
+            key = (str(viewer), str(movie_id))
+            with self._lock:
+                if self._views.get(key, -1) >= period:
+                    return False
+            if not self.add_event(movie_id, "watch", at, now=now):
+                return False
+            with self._lock:
+                self._views[key] = max(period, self._views.get(key, -1))
+            return True
+        return self.add_event(movie_id, "watch", at, now=now)
+
+    def _prune_views(self, now: float) -> None:
+        # bỏ mốc dedupe đã ra khỏi cửa sổ dài nhất
+        longest = max(size * n for size, n, _ in WINDOWS.values())
+        oldest = int((now - longest) // VIEW_DEDUPE_SECONDS)
+        with self._lock:
+            self._views = {key: period for key, period in self._views.items() if period >= oldest}
+
+    # -------------------- NẠP SỰ KIỆN TỪ MONGO --------------------
+    def poll_mongo(self, db, since: Optional[datetime] = None) -> datetime:
+        """
+        Nạp sự kiện mới từ watchhistories.last_watched_at + favorites.createdAt
+        (chỉ lấy các field cần, theo mốc thời gian). Lần đầu (since=None) nạp lại
+        toàn bộ khoảng của cửa sổ dài nhất.
+
+        last_watched_at đổi liên tục khi đang xem -> lượt xem được gộp theo
+        (user_id / viewer_id, movie_id, ngày) bằng add_view, không cộng mỗi lần poll.
+
+        Trả về mốc thời gian cho lần poll tiếp theo.
+        """
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        if since is None:
+            longest = max(size * n for size, n, _ in WINDOWS.values())
+            since = now - timedelta(seconds=longest)
+
+        count = 0
+        cursor = db.watchhistories.find(
+            {"last_watched_at": {"$gt": since, "$lte": now}},
+            {"_id": 0, "id": 1, "user_id": 1, "viewer_id": 1, "movie_id": 1, "last_watched_at": 1},
+        )
+        for doc in cursor:
+            # khách không đăng nhập mỗi lần phát là 1 bản ghi mới: gộp theo viewer_id, thiếu thì theo id bản ghi
+            viewer = doc.get("user_id") or doc.get("viewer_id") or doc.get("id")
+            if self.add_view(viewer, doc.get("movie_id"), doc.get("last_watched_at")):
+                count += 1
+
+        cursor = db.favorites.find(
+            {"createdAt": {"$gt": since, "$lte": now}},
+            {"_id": 0, "movie_id": 1, "createdAt": 1},
+        )
+        for doc in cursor:
+            if self.add_event(doc.get("movie_id"), "favorite", doc.get("createdAt")):
+                count += 1
+        self._prune_views(now.replace(tzinfo=timezone.utc).timestamp())
+
+        if count:
+            print(f"🔥 Trending: nạp {count} sự kiện mới (từ {since.isoformat()})")
+        return now
@@ -1,4 +1,5 @@
 from pathlib import Path
+import os
 
 from recommender.trainer import train_recommender
 
@@ -9,7 +10,8 @@ if __name__ == "__main__":
     movies_csv = base_dir / "data" / "lumi_ai.movies.csv"
     favorites_csv = base_dir / "data" / "lumi_ai.favorites.csv"
     watch_csv = base_dir / "data" / "lumi_ai.watchhistories.csv"
-    model_output = base_dir / "models" / "recommender.joblib"
+    # .joblib (mặc định) | .npz | thư mục -> artifact gọn dạng mảng numpy + CSR
+    model_output = Path(os.getenv("AI_RECOMMEND_MODEL_PATH", str(base_dir / "models" / "recommender.joblib")))
 
     # Tạo thư mục models nếu chưa có
     model_output.parent.mkdir(parents=True, exist_ok=True)
@@ -19,4 +21,10 @@ if __name__ == "__main__":
         str(favorites_csv),
         str(watch_csv),
         str(model_output),
+        # "item_cosine" (mặc định) hoặc "als"
+        model_type=os.getenv("AI_RECOMMEND_MODEL_TYPE", "item_cosine"),
+        n_jobs=int(os.getenv("AI_RECOMMEND_TRAIN_WORKERS", "0")) or None,
+        # > 0 -> similarity song song theo block, chỉ giữ top-N hàng xóm / phim
+        similarity_top_n=int(os.getenv("AI_RECOMMEND_SIMILARITY_TOP_N", "0")) or None,
+        similarity_block_size=int(os.getenv("AI_RECOMMEND_SIMILARITY_BLOCK_SIZE", "1024")),
     )
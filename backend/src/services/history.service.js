@@ -5,6 +5,7 @@ import {
   clearWatchHistory,
   getWatchHistoryByMovie,
 } from "../db.js";
+import { invalidateRecommendations } from "../utils/recommendCache.js";
 
 /**
  * History Service - Business Logic Layer
@@ -39,6 +40,7 @@ class HistoryService {
     }
 
     await addWatchHistory({ userId, movieId });
+    invalidateRecommendations(userId);
     return { success: true };
   }
 
@@ -87,6 +89,7 @@ class HistoryService {
     }
 
     await removeWatchHistory({ userId, historyId });
+    invalidateRecommendations(userId);
     return { success: true };
   }
 
@@ -95,6 +98,7 @@ class HistoryService {
    */
   async clearHistory(userId) {
     await clearWatchHistory(userId);
+    invalidateRecommendations(userId);
     return { success: true };
   }
 }
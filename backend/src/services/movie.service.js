@@ -33,6 +33,7 @@ import {
   promoteTempUploadUrl,
   removeFileIfExists,
 } from "../utils/uploadFiles.js";
+import { invalidateRecommendations } from "../utils/recommendCache.js";
 import { Movie } from "../models/Movie.js";
 import { User } from "../models/User.js";
 import { WalletLedger } from "../models/WalletLedger.js";
@@ -720,6 +721,7 @@ class MovieService {
           ? episodeNumber
           : undefined,
     });
+    invalidateRecommendations(userId);
 
     return { success: true };
   }
@@ -853,6 +855,7 @@ class MovieService {
     }
 
     await addFavorite({ userId, movieId: movie.id });
+    invalidateRecommendations(userId);
     return { message: "Đã lưu vào yêu thích", movieId: movie.id };
   }
 
@@ -866,6 +869,7 @@ class MovieService {
     }
 
     await removeFavorite({ userId, movieId: movie.id });
+    invalidateRecommendations(userId);
     return { message: "Đã xoá khỏi yêu thích", movieId: movie.id };
   }
 
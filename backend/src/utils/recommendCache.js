@@ -0,0 +1,23 @@
+import fetch from "node-fetch";
+
+const getRecommendBaseUrl = () =>
+  (process.env.AI_RECOMMEND_URL || "http://127.0.0.1:5003").replace(/\/+$/, "");
+
+/**
+ * Báo AI recommend bỏ cache gợi ý của user (khi favorite / lịch sử xem thay đổi).
+ * Fire-and-forget: lỗi kết nối không được làm hỏng request chính.
+ */
+export function invalidateRecommendations(userId) {
+  if (!userId) return;
+
+  fetch(`${getRecommendBaseUrl()}/ai/recommendations/invalidate`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      "X-AI-Token": process.env.AI_RECOMMEND_TOKEN || "",
+    },
+    body: JSON.stringify({ user_id: String(userId) }),
+  }).catch((error) => {
+    console.warn("[recommend] invalidate cache failed:", error.message);
+  });
+}